@@ -6,6 +6,9 @@ import os
 import random
 import time
 import tempfile
+import ctypes
+import collections
+import multiprocessing
 import numpy
 import h5py
 import pyscf.lib
@@ -19,7 +22,8 @@ IOBUF_ROW_MIN = 160
 
 def full(mol, mo_coeff, erifile, dataname='eri_mo', tmpdir=None,
          intor='cint2e_sph', aosym='s4', comp=1,
-         max_memory=2000, ioblk_size=256, verbose=logger.WARN, compact=True):
+         max_memory=2000, ioblk_size=256, verbose=logger.WARN, compact=True,
+         nproc=1):
     r'''Transfer arbitrary spherical AO integrals to MO integrals for given orbitals
 
     Args:
@@ -73,6 +77,12 @@ def full(mol, mo_coeff, erifile, dataname='eri_mo', tmpdir=None,
             returned MO integrals has (up to 4-fold) permutation symmetry.
             If it's False, the function will abandon any permutation symmetry,
             and return the "plain" MO integrals
+        nproc : int
+            Number of processes to transform the integrals.  See
+            :func:`half_e1`.  In the second pass, the rows of the
+            half-transformed integrals are distributed over the processes.
+            The row blocks are sized so that all processes together stay
+            within max_memory.
 
     Returns:
         None
@@ -102,12 +112,14 @@ def full(mol, mo_coeff, erifile, dataname='eri_mo', tmpdir=None,
     dataset ['eri_mo', 'new'], shape (3, 100, 55)
     '''
     general(mol, (mo_coeff,)*4, erifile, dataname, tmpdir,
-            intor, aosym, comp, max_memory, ioblk_size, verbose, compact)
+            intor, aosym, comp, max_memory, ioblk_size, verbose, compact,
+            nproc)
     return erifile
 
 def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
             intor='cint2e_sph', aosym='s4', comp=1,
-            max_memory=2000, ioblk_size=256, verbose=logger.WARN, compact=True):
+            max_memory=2000, ioblk_size=256, verbose=logger.WARN, compact=True,
+            nproc=1):
     r'''For the given four sets of orbitals, transfer arbitrary spherical AO
     integrals to MO integrals on the fly.
 
@@ -163,6 +175,12 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
             returned MO integrals has (up to 4-fold) permutation symmetry.
             If it's False, the function will abandon any permutation symmetry,
             and return the "plain" MO integrals
+        nproc : int
+            Number of processes to transform the integrals.  See
+            :func:`half_e1`.  In the second pass, the rows of the
+            half-transformed integrals are distributed over the processes.
+            The row blocks are sized so that all processes together stay
+            within max_memory.
 
     Returns:
         None
@@ -209,37 +227,10 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
     else:
         log = logger.Logger(mol.stdout, verbose)
 
-    ijsame = compact and iden_coeffs(mo_coeffs[0], mo_coeffs[1])
-    klsame = compact and iden_coeffs(mo_coeffs[2], mo_coeffs[3])
-
-    nmoi = mo_coeffs[0].shape[1]
     nmoj = mo_coeffs[1].shape[1]
-    nmok = mo_coeffs[2].shape[1]
     nmol = mo_coeffs[3].shape[1]
-    nao = mo_coeffs[0].shape[0]
     aosym = _stand_sym_code(aosym)
-    if aosym in ('s4', 's2kl'):
-        nao_pair = nao * (nao+1) // 2
-    else:
-        nao_pair = nao * nao
-
-    if compact and ijsame and aosym in ('s4', 's2ij'):
-        nij_pair = nmoi*(nmoi+1) // 2
-    else:
-        nij_pair = nmoi*nmoj
-
-    if compact and klsame and aosym in ('s4', 's2kl'):
-        log.debug('k-mo == l-mo')
-        klmosym = 's2'
-        nkl_pair = nmok*(nmok+1) // 2
-        mokl = numpy.array(mo_coeffs[2], order='F', copy=False)
-        klshape = (0, nmok, 0, nmok)
-    else:
-        klmosym = 's1'
-        nkl_pair = nmok*nmol
-        mokl = numpy.array(numpy.hstack((mo_coeffs[2],mo_coeffs[3])), \
-                           order='F', copy=False)
-        klshape = (0, nmok, nmok, nmol)
+    nij_pair, nkl_pair = _e2_params(mo_coeffs, aosym, compact)[:2]
 
 #    if nij_pair > nkl_pair:
 #        log.warn('low efficiency for AO to MO trans!')
@@ -265,73 +256,209 @@ def general(mol, mo_coeffs, erifile, dataname='eri_mo', tmpdir=None,
     log.debug('num. MO ints = %.8g, require disk %.8g', \
               float(nij_pair)*nkl_pair*comp, nij_pair*nkl_pair*comp*8/1e6)
 
+    for row0, row1, eri in general_iter(mol, mo_coeffs, None, tmpdir, intor,
+                                        aosym, comp, max_memory, ioblk_size,
+                                        log, compact, nproc):
+        if comp == 1:
+            h5d_eri[row0:row1] = eri
+        else:
+            h5d_eri[:,row0:row1] = eri
+    feri.close()
+
+    log.timer('AO->MO eri transformation', *time_0pass)
+    return erifile
+
+def general_iter(mol, mo_coeffs, blksize=None, tmpdir=None,
+                 intor='cint2e_sph', aosym='s4', comp=1,
+                 max_memory=2000, ioblk_size=256, verbose=logger.WARN,
+                 compact=True, nproc=1):
+    r'''Generator of the MO integrals (ij|kl) in blocks of rows.  The
+    integrals are produced by the second half transformation and yielded
+    directly, the transformed integrals are not stored in memory or on disk.
+    Only the half-transformed integrals are saved in a temporary file.
+
+    The arguments are the same to :func:`general`, except
+
+    Kwargs:
+        blksize : int
+            Number of ij-pairs (rows) of each block.  By default, the block
+            size is determined by ioblk_size.
+
+    Yields:
+        (row0, row1, eri), eri is the ndarray of (ij|kl) for ij-pairs in
+        [row0:row1], the shape is (row1-row0,nkl_pair), or
+        (comp,row1-row0,nkl_pair) if comp > 1.
+
+    Examples:
+
+    >>> mol = gto.M(atom='O 0 0 0; H 0 1 0; H 0 0 1', basis='sto3g')
+    >>> mo1 = numpy.random.random((mol.nao_nr(), 10))
+    >>> mo2 = numpy.random.random((mol.nao_nr(), 8))
+    >>> for i0, i1, eri in ao2mo.outcore.general_iter(mol, (mo1,mo2,mo2,mo2), blksize=8):
+    ...     print(i0, i1, eri.shape)
+    0 8 (8, 36)
+    8 16 (8, 36)
+    ...
+    '''
+    time_0pass = (time.clock(), time.time())
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(mol.stdout, verbose)
+
+    aosym = _stand_sym_code(aosym)
+    nij_pair, nkl_pair, nao_pair, mokl, klshape, klmosym = \
+            _e2_params(mo_coeffs, aosym, compact)
+    if klmosym == 's2':
+        log.debug('k-mo == l-mo')
+    if nij_pair == 0 or nkl_pair == 0:
+        return
+
 # transform e1
     swapfile = tempfile.NamedTemporaryFile(dir=tmpdir)
     half_e1(mol, mo_coeffs, swapfile.name, intor, aosym, comp,
-            max_memory, ioblk_size, log, compact)
+            max_memory, ioblk_size, log, compact, nproc=nproc)
 
     time_1pass = log.timer('AO->MO eri transformation 1 pass', *time_0pass)
 
-    mem_words = max_memory * 1e6 / 8
-    iobuf_size = min(float(nkl_pair)/(nkl_pair+nao_pair)*mem_words,
-                     IOBUF_WORDS_PREFER) * 8
     iobuflen = guess_e2bufsize(ioblk_size, nij_pair, nao_pair)[0]
+    if nproc > 1:
+# Each worker holds one input and one output block.  The parent holds at most
+# nproc output blocks in flight
+        mem_words = float(max_memory) * 1e6/8 / nproc
+        iobuflen = min(iobuflen, max(int(mem_words/(nao_pair+nkl_pair*2)), 1))
+    else:
+# Two input buffers in _e2_iter, one is read in the background while the other
+# is being transformed
+        iobuflen = max(iobuflen//2, 1)
+    if blksize is not None:
+        iobuflen = max(iobuflen//blksize, 1) * blksize
 
     log.debug('step2: kl-pair (ao %d, mo %d), mem %.8g MB, ioblock %.8g MB',
               nao_pair, nkl_pair, iobuflen*nao_pair*8/1e6,
               iobuflen*nkl_pair*8/1e6)
 
-    fswap = h5py.File(swapfile.name, 'r')
-    klaoblks = len(fswap['0'])
-    ijmoblks = int(numpy.ceil(float(nij_pair)/iobuflen)) * comp
     ao_loc = numpy.array(mol.ao_loc_nr(), dtype=numpy.int32)
-    ti0 = time_1pass
-    buf = numpy.empty((iobuflen, nao_pair))
-    istep = 0
-    for row0, row1 in prange(0, nij_pair, iobuflen):
-        nrow = row1 - row0
+    tasks = [(icomp, row0, row1)
+             for row0, row1 in prange(0, nij_pair, iobuflen)
+             for icomp in range(comp)]
+    e2args = (mokl, klshape, aosym, klmosym, ao_loc)
+    if nproc > 1 and len(tasks) > 1:
+        e2blks = _e2_iter_parallel(swapfile.name, tasks, e2args, nproc, log)
+    else:
+        e2blks = _e2_iter(swapfile.name, tasks, e2args, iobuflen, nao_pair,
+                          log, time_1pass)
 
-        for icomp in range(comp):
-            istep += 1
-            tioi = 0
-            log.debug('step 2 [%d/%d], [%d,%d:%d], row = %d', \
-                      istep, ijmoblks, icomp, row0, row1, nrow)
-
-            col0 = 0
-            for ic in range(klaoblks):
-                dat = fswap['%d/%d'%(icomp,ic)]
-                col1 = col0 + dat.shape[1]
-                buf[:nrow,col0:col1] = dat[row0:row1]
-                col0 = col1
-            ti2 = log.timer('step 2 [%d/%d], load buf'%(istep,ijmoblks), *ti0)
-            tioi += ti2[1]-ti0[1]
-            pbuf = _ao2mo.nr_e2_(buf[:nrow], mokl, klshape, aosym, klmosym,
-                                 ao_loc=ao_loc)
-
-            tw1 = time.time()
-            if comp == 1:
-                h5d_eri[row0:row1] = pbuf
-            else:
-                h5d_eri[icomp,row0:row1] = pbuf
-            tioi += time.time()-tw1
+    eri = None
+    for (icomp, row0, row1), pbuf in zip(tasks, e2blks):
+        if comp == 1:
+            eri = pbuf
+        else:
+            if icomp == 0:
+                eri = numpy.empty((comp,row1-row0,nkl_pair))
+            eri[icomp] = pbuf
+            if icomp+1 < comp:
+                continue
+        if blksize is None:
+            yield row0, row1, eri
+        else:
+            for p0, p1 in prange(row0, row1, blksize):
+                yield p0, p1, eri[...,p0-row0:p1-row0,:]
+        eri = pbuf = None
 
-            ti1 = (time.clock(), time.time())
-            log.debug('step 2 [%d/%d] CPU time: %9.2f, Wall time: %9.2f, I/O time: %9.2f', \
-                      istep, ijmoblks, ti1[0]-ti0[0], ti1[1]-ti0[1], tioi)
-            ti0 = ti1
-    feri.close()
+    log.timer('AO->MO eri transformation 2 pass', *time_1pass)
+
+def _e2_params(mo_coeffs, aosym, compact):
+    '''Dimensions and the MO coefficients of the second half transformation'''
+    ijsame = compact and iden_coeffs(mo_coeffs[0], mo_coeffs[1])
+    klsame = compact and iden_coeffs(mo_coeffs[2], mo_coeffs[3])
+
+    nmoi = mo_coeffs[0].shape[1]
+    nmoj = mo_coeffs[1].shape[1]
+    nmok = mo_coeffs[2].shape[1]
+    nmol = mo_coeffs[3].shape[1]
+    nao = mo_coeffs[0].shape[0]
+    if aosym in ('s4', 's2kl'):
+        nao_pair = nao * (nao+1) // 2
+    else:
+        nao_pair = nao * nao
+
+    if compact and ijsame and aosym in ('s4', 's2ij'):
+        nij_pair = nmoi*(nmoi+1) // 2
+    else:
+        nij_pair = nmoi*nmoj
+
+    if compact and klsame and aosym in ('s4', 's2kl'):
+        klmosym = 's2'
+        nkl_pair = nmok*(nmok+1) // 2
+        mokl = numpy.array(mo_coeffs[2], order='F', copy=False)
+        klshape = (0, nmok, 0, nmok)
+    else:
+        klmosym = 's1'
+        nkl_pair = nmok*nmol
+        mokl = numpy.array(numpy.hstack((mo_coeffs[2],mo_coeffs[3])), \
+                           order='F', copy=False)
+        klshape = (0, nmok, nmok, nmol)
+    return nij_pair, nkl_pair, nao_pair, mokl, klshape, klmosym
+
+def _e2_iter(swapfile, tasks, e2args, iobuflen, nao_pair, log, ti0):
+    mokl, klshape, aosym, klmosym, ao_loc = e2args
+    fswap = open_swap(swapfile)
+    ijmoblks = len(tasks)
+# Two buffers, the next row block is read in the background while the present
+# one is transformed
+    bufs = [numpy.empty((iobuflen, nao_pair)) for i in range(2)]
+    load = pyscf.lib.call_in_background(fswap.read_rows, tasks[0][0],
+                                        tasks[0][1], tasks[0][2], bufs[0])
+    for istep, (icomp, row0, row1) in enumerate(tasks):
+        nrow = row1 - row0
+        log.debug('step 2 [%d/%d], [%d,%d:%d], row = %d', \
+                  istep+1, ijmoblks, icomp, row0, row1, nrow)
+
+        buf = load()
+        if istep+1 < len(tasks):
+            load = pyscf.lib.call_in_background(fswap.read_rows,
+                                                *(tasks[istep+1] +
+                                                  (bufs[(istep+1)%2],)))
+        ti2 = log.timer('step 2 [%d/%d], load buf'%(istep+1,ijmoblks), *ti0)
+        tioi = ti2[1]-ti0[1]
+        pbuf = _ao2mo.nr_e2_(buf, mokl, klshape, aosym, klmosym,
+                             ao_loc=ao_loc)
+        ti1 = (time.clock(), time.time())
+        log.debug('step 2 [%d/%d] CPU time: %9.2f, Wall time: %9.2f, I/O time: %9.2f', \
+                  istep+1, ijmoblks, ti1[0]-ti0[0], ti1[1]-ti0[1], tioi)
+        yield pbuf
+# The time spent by the consumer is not counted
+        ti0 = (time.clock(), time.time())
     fswap.close()
 
-    log.timer('AO->MO eri transformation 2 pass', *time_1pass)
-    log.timer('AO->MO eri transformation', *time_0pass)
-    return erifile
+def _e2_iter_parallel(swapfile, tasks, e2args, nproc, log):
+    pool = _make_pool(nproc, e2args)
+    try:
+# At most nproc row blocks are in flight.  They are returned in order
+        pending = collections.deque()
+        for task in tasks:
+            if len(pending) >= nproc:
+                task0, result = pending.popleft()
+                log.debug('step 2 [%d,%d:%d]', *task0)
+                yield result.get()
+            pending.append((task, pool.apply_async(_e2_task,
+                                                   ((swapfile,)+task,))))
+        while pending:
+            task, result = pending.popleft()
+            log.debug('step 2 [%d,%d:%d]', *task)
+            yield result.get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
 
 
 # swapfile will be overwritten if exists.
 def half_e1(mol, mo_coeffs, swapfile,
             intor='cint2e_sph', aosym='s4', comp=1,
             max_memory=2000, ioblk_size=256, verbose=logger.WARN, compact=True,
-            ao2mopt=None):
+            ao2mopt=None, nproc=1):
     r'''Half transform arbitrary spherical AO integrals to MO integrals
     for the given two sets of orbitals
 
@@ -341,8 +468,8 @@ def half_e1(mol, mo_coeffs, swapfile,
         mo_coeff : ndarray
             Transform (ij|kl) with the same set of orbitals.
         swapfile : str
-            To store the transformed integrals, in HDF5 format.  The transformed
-            integrals are saved in blocks.
+            To store the transformed integrals in a raw binary file.  The
+            transformed integrals are saved in blocks, see :func:`open_swap`.
 
     Kwargs
         intor : str
@@ -377,7 +504,16 @@ def half_e1(mol, mo_coeffs, swapfile,
             If it's False, the function will abandon any permutation symmetry,
             and return the "plain" MO integrals
         ao2mopt : :class:`AO2MOpt` object
-            Precomputed data to improve perfomance
+            Precomputed data to improve perfomance.  It is not used by the
+            worker processes if nproc > 1.
+        nproc : int
+            Number of processes.  If nproc > 1, the shell ranges are
+            distributed over a process pool.  Each worker writes its blocks
+            into the memory-mapped swap file.  max_memory is shared by the
+            workers, and the OpenMP threads are divided among them.  In
+            Python 3 the workers are started by the 'spawn' method (the GNU
+            OpenMP runtime is not fork-safe), so the main script needs the
+            ``if __name__ == '__main__':`` guard.
 
     Returns:
         None
@@ -413,58 +549,232 @@ def half_e1(mol, mo_coeffs, swapfile,
                            order='F', copy=False)
         ijshape = (0, nmoi, nmoi, nmoj)
 
+    nproc = max(nproc, 1)
+# max_memory is shared by the worker processes
     e1buflen, mem_words, iobuf_words, ioblk_words = \
-            guess_e1bufsize(max_memory, ioblk_size, nij_pair, nao_pair, comp)
+            guess_e1bufsize(float(max_memory)/nproc, ioblk_size, nij_pair,
+                            nao_pair, comp)
+# Two iobufs, one is written to disk while the other is being filled
+    e1buflen = max(e1buflen//2, 1)
 # The buffer to hold AO integrals in C code, see line (@)
     aobuflen = int((mem_words - iobuf_words) // (nao*nao*comp))
     shranges = guess_shell_ranges(mol, e1buflen, aobuflen, aosym)
-    if ao2mopt is None:
-        if intor == 'cint2e_sph':
-            ao2mopt = _ao2mo.AO2MOpt(mol, intor, 'CVHFnr_schwarz_cond',
-                                     'CVHFsetnr_direct_scf')
-        else:
-            ao2mopt = _ao2mo.AO2MOpt(mol, intor)
 
     log.debug('step1: tmpfile %.8g MB', nij_pair*nao_pair*8/1e6)
     log.debug('step1: (ij,kl) = (%d,%d), mem cache %.8g MB, iobuf %.8g MB',
               nij_pair, nao_pair, mem_words*8/1e6, iobuf_words*8/1e6)
 
-    fswap = h5py.File(swapfile, 'w')
-    for icomp in range(comp):
-        g = fswap.create_group(str(icomp)) # for h5py old version
+    fswap = create_swap(swapfile, comp, nij_pair,
+                        [sh_range[2] for sh_range in shranges])
+    e2buflens = [guess_e2bufsize(ioblk_size, nij_pair, sh_range[2])[0]
+                 for sh_range in shranges]
 
     # transform e1
     ti0 = log.timer('Initializing ao2mo.outcore.half_e1', *time0)
     nstep = len(shranges)
+    if nproc > 1 and nstep > 1:
+        fswap.close()
+        env = (mol._atm, mol._bas, mol._env, intor, aosym, comp,
+               moij, ijshape, ijmosym)
+        pool = _make_pool(nproc, env)
+        try:
+            tasks = [(swapfile, istep, sh_range, e2buflens[istep])
+                     for istep, sh_range in enumerate(shranges)]
+            for istep in pool.imap_unordered(_half_e1_task, tasks):
+                log.debug('step 1 [%d/%d] done, AO [%d:%d], len(buf) = %d',
+                          istep+1, nstep, *(shranges[istep][:3]))
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+        log.timer('gen AO/transform MO on %d processes'%nproc, *ti0)
+        return swapfile
+
+    if ao2mopt is None:
+        ao2mopt = _make_ao2mopt(mol, intor)
+    write = None
     for istep,sh_range in enumerate(shranges):
         log.debug('step 1 [%d/%d], AO [%d:%d], len(buf) = %d', \
                   istep+1, nstep, *(sh_range[:3]))
-        buflen = sh_range[2]
-        iobuf = numpy.empty((comp,buflen,nij_pair))
-        nmic = len(sh_range[3])
-        p0 = 0
-        for imic, aoshs in enumerate(sh_range[3]):
-            log.debug1('      fill iobuf micro [%d/%d], AO [%d:%d], len(aobuf) = %d', \
-                       imic+1, nmic, *aoshs)
-            buf = numpy.empty((comp*aoshs[2],nao*nao)) # (@)
-            _ao2mo.nr_e1fill_(intor, aoshs, mol._atm, mol._bas, mol._env,
-                              aosym, comp, ao2mopt, buf)
-            buf = _ao2mo.nr_e1_(buf, moij, ijshape, aosym, ijmosym)
-            iobuf[:,p0:p0+aoshs[2]] = buf.reshape(comp,aoshs[2],-1)
-            p0 += aoshs[2]
+        iobuf = _fill_iobuf(mol._atm, mol._bas, mol._env, intor, aosym, comp,
+                            ao2mopt, moij, ijshape, ijmosym, sh_range, log)
         ti2 = log.timer('gen AO/transform MO [%d/%d]'%(istep+1,nstep), *ti0)
 
-        e2buflen, chunks = guess_e2bufsize(ioblk_size, nij_pair, buflen)
-        for icomp in range(comp):
-            dset = fswap.create_dataset('%d/%d'%(icomp,istep),
-                                        (nij_pair,iobuf.shape[1]), 'f8',
-                                        chunks=None)
-            for col0, col1 in prange(0, nij_pair, e2buflen):
-                dset[col0:col1] = pyscf.lib.transpose(iobuf[icomp,:,col0:col1])
-        ti0 = log.timer('transposing to disk', *ti2)
+# iobuf is written in the background while the next iobuf is filled
+        if write is not None:
+            write()
+        write = pyscf.lib.call_in_background(fswap.write_block, istep, iobuf,
+                                             e2buflens[istep])
+        iobuf = None
+        ti0 = log.timer('waiting for disk', *ti2)
+    write()
     fswap.close()
     return swapfile
 
+def _make_ao2mopt(mol, intor):
+    if intor == 'cint2e_sph':
+        return _ao2mo.AO2MOpt(mol, intor, 'CVHFnr_schwarz_cond',
+                              'CVHFsetnr_direct_scf')
+    else:
+        return _ao2mo.AO2MOpt(mol, intor)
+
+def _fill_iobuf(atm, bas, env, intor, aosym, comp, ao2mopt,
+                moij, ijshape, ijmosym, sh_range, log=None):
+    '''Half-transformed integrals of the AO pairs in sh_range, the shape is
+    (comp,buflen,nij_pair)'''
+    nao = moij.shape[0]
+    buflen = sh_range[2]
+    iobuf = None
+    nmic = len(sh_range[3])
+    p0 = 0
+    for imic, aoshs in enumerate(sh_range[3]):
+        if log is not None:
+            log.debug1('      fill iobuf micro [%d/%d], AO [%d:%d], len(aobuf) = %d', \
+                       imic+1, nmic, *aoshs)
+        buf = numpy.empty((comp*aoshs[2],nao*nao)) # (@)
+        _ao2mo.nr_e1fill_(intor, aoshs, atm, bas, env,
+                          aosym, comp, ao2mopt, buf)
+        buf = _ao2mo.nr_e1_(buf, moij, ijshape, aosym, ijmosym)
+        if iobuf is None:
+            iobuf = numpy.empty((comp,buflen,buf.shape[1]))
+        iobuf[:,p0:p0+aoshs[2]] = buf.reshape(comp,aoshs[2],-1)
+        p0 += aoshs[2]
+    return iobuf
+
+# The data of the worker process, initialized by _init_worker
+_WORKER_ENV = {}
+
+def _make_pool(nproc, env):
+    try:
+        ctx = multiprocessing.get_context('spawn')
+    except AttributeError:  # Python 2
+        ctx = multiprocessing
+    _ao2mo.libao2mo.omp_get_max_threads.restype = ctypes.c_int
+    nthreads = max(_ao2mo.libao2mo.omp_get_max_threads()//nproc, 1)
+    return ctx.Pool(nproc, _init_worker, (env, nthreads))
+
+def _init_worker(env, nthreads):
+    _ao2mo.libao2mo.omp_set_num_threads(ctypes.c_int(nthreads))
+    _WORKER_ENV.clear()
+    _WORKER_ENV['env'] = env
+
+def _half_e1_task(args):
+    swapfile, istep, sh_range, e2buflen = args
+    atm, bas, env, intor, aosym, comp, moij, ijshape, ijmosym = \
+            _WORKER_ENV['env']
+    if 'ao2mopt' not in _WORKER_ENV:
+        import pyscf.gto
+        mol = pyscf.gto.Mole()
+        mol._atm, mol._bas, mol._env = atm, bas, env
+        _WORKER_ENV['ao2mopt'] = _make_ao2mopt(mol, intor)
+    iobuf = _fill_iobuf(atm, bas, env, intor, aosym, comp,
+                        _WORKER_ENV['ao2mopt'], moij, ijshape, ijmosym,
+                        sh_range)
+    fswap = _RawSwap(swapfile, 'r+')
+    fswap.write_block(istep, iobuf, e2buflen)
+    fswap.close()
+    return istep
+
+def _e2_task(args):
+    swapfile, icomp, row0, row1 = args
+    mokl, klshape, aosym, klmosym, ao_loc = _WORKER_ENV['env']
+    fswap = _RawSwap(swapfile, 'r')
+    buf = fswap.read_rows(icomp, row0, row1)
+    fswap.close()
+    return _ao2mo.nr_e2_(buf, mokl, klshape, aosym, klmosym, ao_loc=ao_loc)
+
+
+def create_swap(swapfile, comp, nrow, ncols):
+    '''Allocate the raw swap file for comp x len(ncols) blocks.  Block
+    (icomp,iblk) has the shape (nrow,ncols[iblk]).  Returns a
+    :class:`_RawSwap` object opened for writing.
+    '''
+    header = numpy.hstack((comp, nrow, len(ncols), ncols)).astype(numpy.int64)
+    with open(swapfile, 'wb') as f:
+        header.tofile(f)
+        f.truncate(header.nbytes + comp*nrow*sum(ncols)*8)
+    return _RawSwap(swapfile, 'r+')
+
+def open_swap(swapfile):
+    '''Open the swap file generated by :func:`half_e1`.  The blocks are
+    accessed in the same way as the groups and datasets of an HDF5 file.
+
+    Examples:
+
+    >>> fswap = open_swap(swapfile)
+    >>> nblk = len(fswap['0'])
+    >>> dat = fswap['0/%d' % (nblk-1)]
+    >>> dat.shape
+    (nij_pair, ncol)
+    >>> fswap.close()
+    '''
+    return _RawSwap(swapfile, 'r')
+
+class _RawSwap(object):
+    '''Raw binary swap file.  The file starts with the int64 header
+    (comp, nrow, nblk, ncol_0, ..., ncol_{nblk-1}), followed by the blocks
+    [icomp,iblk] of the shape (nrow,ncol_iblk) in C order.  The blocks are
+    numpy.memmap views.  The data are read and written through the memory map
+    without the extra copy of HDF5 library.
+    '''
+    def __init__(self, swapfile, mode='r'):
+        self.filename = swapfile
+        with open(swapfile, 'rb') as f:
+            comp, nrow, nblk = numpy.fromfile(f, dtype=numpy.int64, count=3)
+            ncols = numpy.fromfile(f, dtype=numpy.int64, count=nblk)
+        self.comp = int(comp)
+        self.nrow = int(nrow)
+        self.ncols = [int(x) for x in ncols]
+        offset = (3 + len(ncols)) * 8
+        size = self.comp * self.nrow * sum(self.ncols)
+        if size > 0:
+            self._data = numpy.memmap(swapfile, numpy.double, mode,
+                                      offset=offset, shape=(size,))
+        else:
+            self._data = numpy.zeros(0)
+        self._blocks = []
+        p0 = 0
+        for icomp in range(self.comp):
+            blks = []
+            for ncol in self.ncols:
+                p1 = p0 + self.nrow * ncol
+                blks.append(self._data[p0:p1].reshape(self.nrow,ncol))
+                p0 = p1
+            self._blocks.append(blks)
+
+    def __getitem__(self, key):
+        key = [int(x) for x in str(key).split('/')]
+        if len(key) == 1:
+            return self._blocks[key[0]]
+        else:
+            return self._blocks[key[0]][key[1]]
+
+    def write_block(self, iblk, iobuf, blksize):
+        '''Transpose iobuf[icomp] of the shape (ncol,nrow) and save it in
+        block (icomp,iblk), blksize rows at a time.'''
+        for icomp in range(self.comp):
+            dat = self._blocks[icomp][iblk]
+            for row0, row1 in prange(0, self.nrow, blksize):
+                dat[row0:row1] = pyscf.lib.transpose(iobuf[icomp,:,row0:row1])
+
+    def read_rows(self, icomp, row0, row1, buf=None):
+        '''Rows [row0:row1] of all blocks of component icomp, concatenated
+        along the columns.'''
+        if buf is None:
+            buf = numpy.empty((row1-row0,sum(self.ncols)))
+        buf = buf[:row1-row0]
+        col0 = 0
+        for dat in self._blocks[icomp]:
+            col1 = col0 + dat.shape[1]
+            buf[:,col0:col1] = dat[row0:row1]
+            col0 = col1
+        return buf
+
+    def close(self):
+        if isinstance(self._data, numpy.memmap) and self._data.mode != 'r':
+            self._data.flush()
+        self._blocks = self._data = None
+
 def full_iofree(mol, mo_coeff, intor='cint2e_sph', aosym='s4', comp=1,
                 verbose=logger.WARN, compact=True):
     r'''Transfer arbitrary spherical AO integrals to MO integrals for given orbitals
@@ -116,6 +116,49 @@ class KnowValues(unittest.TestCase):
         eri1 = eri1.reshape(nao,nao,nao,nao)
         self.assertTrue(numpy.allclose(eri1, eriref))
 
+    def test_half_e1_swap(self):
+        ftmp = tempfile.NamedTemporaryFile()
+        mo1 = mo[:,:4].copy(order='F')
+        ao2mo.outcore.half_e1(mol, (mo1,mo), ftmp.name, max_memory=.5,
+                              ioblk_size=.1, compact=False)
+        fswap = ao2mo.outcore.open_swap(ftmp.name)
+        self.assertTrue(len(fswap['0']) > 1)
+        eri1 = fswap.read_rows(0, 0, 4*nao)
+        fswap.close()
+        from pyscf.scf import _vhf
+        eri_ao = _vhf.int2e_sph(mol._atm, mol._bas, mol._env)
+        eriref = ao2mo.incore.half_e1(eri_ao, (mo1,mo), compact=False)
+        self.assertTrue(numpy.allclose(eri1, eriref))
+
+    def test_nroutcore_nproc(self):
+        ftmp = tempfile.NamedTemporaryFile()
+        mo1 = mo[:,:6].copy(order='F')
+        ao2mo.outcore.general(mol, (mo,mo,mo1,mo1), ftmp.name,
+                              max_memory=4, ioblk_size=.1)
+        with h5py.File(ftmp.name, 'r') as feri:
+            eriref = numpy.array(feri['eri_mo'])
+        ao2mo.outcore.general(mol, (mo,mo,mo1,mo1), ftmp.name,
+                              max_memory=4, ioblk_size=.1, nproc=3)
+        with h5py.File(ftmp.name, 'r') as feri:
+            eri1 = numpy.array(feri['eri_mo'])
+        self.assertTrue(numpy.allclose(eri1, eriref))
+
+    def test_general_iter(self):
+        ftmp = tempfile.NamedTemporaryFile()
+        mo1 = mo[:,:6].copy(order='F')
+        ao2mo.outcore.general(mol, (mo,mo1,mo1,mo1), ftmp.name)
+        with h5py.File(ftmp.name, 'r') as feri:
+            eriref = numpy.array(feri['eri_mo'])
+        nrow = 0
+        for row0, row1, eri1 in ao2mo.outcore.general_iter(mol, (mo,mo1,mo1,mo1),
+                                                           blksize=6,
+                                                           ioblk_size=.1):
+            self.assertEqual(row0, nrow)
+            self.assertTrue(row1-row0 <= 6)
+            self.assertTrue(numpy.allclose(eri1, eriref[row0:row1]))
+            nrow = row1
+        self.assertEqual(nrow, eriref.shape[0])
+
 def s2ij_s1(symmetry, eri, norb):
     idx = numpy.tril_indices(norb)
     eri1 = numpy.empty((norb,norb,norb,norb))
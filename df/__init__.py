@@ -1,6 +1,6 @@
 from pyscf.df import incore
 from pyscf.df import outcore
 from pyscf.df.incore import format_aux_basis
-from pyscf.df.addons import load
+from pyscf.df.addons import load, prefetch_blocks
 
 from pyscf.df import r_incore
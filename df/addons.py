@@ -4,6 +4,11 @@
 #
 
 import time
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 import numpy
 import h5py
 import pyscf.lib
@@ -21,3 +26,69 @@ class load(ao2mo.load):
     '''
     pass
 
+
+def prefetch_blocks(feri, blocks, max_memory=None, nbuf=2):
+    '''Generator of (b0, b1, feri[b0:b1]) for (b0, b1) in blocks.  When feri
+    is an HDF5 dataset, the blocks are read in a background thread, so that
+    the next block is loaded while the present block is being contracted.
+
+    Args:
+        feri : ndarray or h5py dataset
+            The 3-center integrals, e.g. the one returned by :class:`load`
+        blocks : list of (int, int)
+            The ranges of the first (auxiliary) index
+
+    Kwargs:
+        max_memory : float
+            Memory budget (in MB) for the buffered blocks.  If it cannot hold
+            nbuf blocks, the blocks are read synchronously.
+        nbuf : int
+            Number of blocks in memory at the same time, including the one
+            being used by the caller.  Default is 2 (double buffering).
+
+    Examples:
+
+    >>> with df.load(cderi) as feri:
+    ...     for b0, b1, eri1 in df.prefetch_blocks(feri, [(0,100), (100,200)]):
+    ...         print(b0, b1, eri1.shape)
+    '''
+    blocks = list(blocks)
+    if blocks:
+        blkmax = max([b1-b0 for b0, b1 in blocks])
+        blkmem = blkmax * numpy.prod(feri.shape[1:]) * 8 / 1e6
+        if max_memory is not None:
+            nbuf = min(nbuf, int(max_memory/max(blkmem, 1e-9)))
+
+    if isinstance(feri, numpy.ndarray) or nbuf < 2 or len(blocks) < 2:
+        for b0, b1 in blocks:
+            yield b0, b1, numpy.asarray(feri[b0:b1])
+        return
+
+    bufs = queue.Queue()
+    tokens = threading.Semaphore(nbuf)
+    stop = threading.Event()
+    def read():
+        try:
+            for b0, b1 in blocks:
+                tokens.acquire()
+                if stop.is_set():
+                    break
+                bufs.put((b0, b1, numpy.asarray(feri[b0:b1])))
+        except Exception as err:
+            bufs.put(err)
+    reader = threading.Thread(target=read)
+    reader.daemon = True
+    reader.start()
+    try:
+        for k in range(len(blocks)):
+            buf = bufs.get()
+            if isinstance(buf, Exception):
+                raise buf
+            yield buf
+            buf = None
+# The caller finished the block.  Allow the reader to load one more block
+            tokens.release()
+    finally:
+        stop.set()
+        tokens.release()
+        reader.join()
@@ -139,6 +139,24 @@ class KnowValues(unittest.TestCase):
             j3c[:,:,i] = lib.unpack_tril(eri1[:,i])
         self.assertTrue(numpy.allclose(eri0, j3c))
 
+    def test_prefetch_blocks(self):
+        numpy.random.seed(1)
+        a = numpy.random.random((50,7))
+        ftmp = tempfile.NamedTemporaryFile()
+        with h5py.File(ftmp.name, 'w') as f:
+            f['eri_mo'] = a
+        blocks = [(i, min(i+6,50)) for i in reversed(range(0, 50, 6))]
+        with df.load(ftmp) as feri:
+            out = [(b0, b1, x.copy())
+                   for b0, b1, x in df.prefetch_blocks(feri, blocks)]
+            self.assertEqual([x[:2] for x in out], blocks)
+            for b0, b1, x in out:
+                self.assertTrue(numpy.allclose(x, a[b0:b1]))
+            for b0, b1, x in df.prefetch_blocks(feri, blocks):
+                break
+            self.assertEqual(len(list(df.prefetch_blocks(feri, blocks, 1e-6))),
+                             len(blocks))
+
 
 if __name__ == "__main__":
     print("Full Tests for df")
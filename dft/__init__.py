@@ -1,6 +1,7 @@
 import sys
 from pyscf.dft import vxc
 from pyscf.dft import rks
+from pyscf.dft import uks
 from pyscf.dft import gen_grid as grid
 from pyscf.dft import radi
 
@@ -16,3 +17,9 @@ def RKS(mol, *args):
     else:
         raise ValueError('symmetry is not implemented')
         return rks_symm.RKS(mol, *args)
+
+def UKS(mol, *args):
+    if not mol.symmetry or mol.groupname is 'C1':
+        return uks.UKS(mol, *args)
+    else:
+        raise ValueError('symmetry is not implemented')
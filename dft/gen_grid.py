@@ -9,12 +9,17 @@ Generate DFT grids and weights, based on the code provided by Gerald Knizia <>
 
 
 import os
+import copy
 import ctypes
+import hashlib
 from functools import reduce
 import numpy
 import pyscf.lib
+import pyscf.lib.parameters
+import pyscf.lib.intcache
 from pyscf import gto
 from pyscf.dft import radi
+from pyscf.dft import numint
 
 libdft = pyscf.lib.load_library('libdft')
 
@@ -171,6 +176,11 @@ def gen_atomic_grids(mol, mol_grids={}, radi_method=radi.gauss_chebyshev,
             else:
                 n_rad = _default_rad(chg, level)
                 n_ang = _default_ang(chg, level)
+            key = (chg, n_rad, n_ang, radi_method, prune_scheme)
+            if key in _ATOM_GRIDS_CACHE:
+                atom_grids_tab[symb] = _ATOM_GRIDS_CACHE[key]
+                continue
+
             rad, rad_weight = radi_method(n_rad)
             # atomic_scale = 1
             # rad *= atomic_scale
@@ -194,43 +204,151 @@ def gen_atomic_grids(mol, mol_grids={}, radi_method=radi.gauss_chebyshev,
                                            grid[:,:3]).reshape(-1,3))
                 vol.append(numpy.einsum('i,j->ij', rad_weight[angs==n],
                                         grid[:,3]).ravel())
-            atom_grids_tab[symb] = (numpy.vstack(coords), numpy.hstack(vol))
+            coords = numpy.vstack(coords)
+            vol = numpy.hstack(vol)
+# The cached grids are shared by all molecules
+            coords.setflags(write=False)
+            vol.setflags(write=False)
+            atom_grids_tab[symb] = _ATOM_GRIDS_CACHE[key] = (coords, vol)
     return atom_grids_tab
 
+# Atomic grids of (charge, n_rad, n_ang, radi_method, prune_scheme), shared in
+# the process
+_ATOM_GRIDS_CACHE = {}
+
 
 def gen_partition(mol, atom_grids_tab, atomic_radii_adjust=None,
                   becke_scheme=original_becke):
+    '''Becke partition of the atomic grids.  Returns the coordinates and the
+    weights of the molecular grids.
+
+    The partition is computed in C (VXCgen_grid_partition) for the schemes
+    original_becke and stratmann, if atomic_radii_adjust is None or is
+    generated by :func:`radi.becke_atomic_radii_adjust` or
+    :func:`radi.treutler_atomic_radii_adjust`.  Other schemes and adjust
+    functions are evaluated in Python, grid block by grid block.
+    '''
     atm_coords = numpy.array([mol.atom_coord(i) for i in range(mol.natm)])
-    atm_dist = radi._inter_distance(mol)
-    def gen_grid_partition(coords):
-        ngrid = coords.shape[0]
-        grid_dist = numpy.empty((mol.natm,ngrid))
-        for ia in range(mol.natm):
-            dc = coords - atm_coords[ia]
-            grid_dist[ia] = numpy.sqrt(numpy.einsum('ij,ij->i',dc,dc))
-        pbecke = numpy.ones((mol.natm,ngrid))
-        for i in range(mol.natm):
-            for j in range(i):
-                g = 1/atm_dist[i,j] * (grid_dist[i]-grid_dist[j])
-                if atomic_radii_adjust is not None:
-                    g = atomic_radii_adjust(i, j, g)
-                g = becke_scheme(g)
-                pbecke[i] *= .5 * (1-g)
-                pbecke[j] *= .5 * (1+g)
-
-        return pbecke
+    if (becke_scheme in _BECKE_SCHEME_ID and
+        (atomic_radii_adjust is None or hasattr(atomic_radii_adjust, 'a'))):
+        if atomic_radii_adjust is None:
+            radii_adjust = None
+        else:
+            radii_adjust = numpy.asarray(atomic_radii_adjust.a, order='C')
+        def gen_grid_partition(coords, ia):
+            coords = numpy.asarray(coords, order='C')
+            ngrid = coords.shape[0]
+            out = numpy.empty(ngrid)
+            if radii_adjust is None:
+                p_adjust = None
+            else:
+                p_adjust = radii_adjust.ctypes.data_as(ctypes.c_void_p)
+            libdft.VXCgen_grid_partition(out.ctypes.data_as(ctypes.c_void_p),
+                                         coords.ctypes.data_as(ctypes.c_void_p),
+                                         ctypes.c_int(ngrid), ctypes.c_int(ia),
+                                         atm_coords.ctypes.data_as(ctypes.c_void_p),
+                                         p_adjust,
+                                         ctypes.c_int(_BECKE_SCHEME_ID[becke_scheme]),
+                                         ctypes.c_int(mol.natm))
+            return out
+    else:
+        atm_dist = radi._inter_distance(mol)
+        def gen_grid_partition(coords, ia):
+            ngrid = coords.shape[0]
+            out = numpy.empty(ngrid)
+# Bound the size of the temporary arrays grid_dist and pbecke
+            blksize = max(1, int(PARTITION_BLKSIZE/mol.natm))
+            for p0 in range(0, ngrid, blksize):
+                p1 = min(p0+blksize, ngrid)
+                grid_dist = numpy.empty((mol.natm,p1-p0))
+                for i in range(mol.natm):
+                    dc = coords[p0:p1] - atm_coords[i]
+                    grid_dist[i] = numpy.sqrt(numpy.einsum('ij,ij->i',dc,dc))
+                pbecke = numpy.ones((mol.natm,p1-p0))
+                for i in range(mol.natm):
+                    for j in range(i):
+                        g = 1/atm_dist[i,j] * (grid_dist[i]-grid_dist[j])
+                        if atomic_radii_adjust is not None:
+                            g = atomic_radii_adjust(i, j, g)
+                        g = becke_scheme(g)
+                        pbecke[i] *= .5 * (1-g)
+                        pbecke[j] *= .5 * (1+g)
+                out[p0:p1] = pbecke[ia] / pbecke.sum(axis=0)
+            return out
 
     coords_all = []
     weights_all = []
     for ia in range(mol.natm):
         coords, vol = atom_grids_tab[mol.atom_symbol(ia)]
         coords = coords + atm_coords[ia]
-        pbecke = gen_grid_partition(coords)
-        weights = vol * pbecke[ia] / pbecke.sum(axis=0)
+        weights = vol * gen_grid_partition(coords, ia)
         coords_all.append(coords)
         weights_all.append(weights)
     return numpy.vstack(coords_all), numpy.hstack(weights_all)
 
+_BECKE_SCHEME_ID = {original_becke: 0, stratmann: 1}
+# Number of elements of the temporary arrays in the Python partition code
+PARTITION_BLKSIZE = 4000000
+
+def prune_by_weights(coords, weights, cutoff=1e-15):
+    '''Remove the grids whose weights are smaller than cutoff'''
+    idx = abs(weights) > cutoff
+    return coords[idx], weights[idx]
+
+def symmetry_reduce(mol, coords, weights, tol=1e-8):
+    '''Symmetry-unique grids of the point group mol.groupname.  The weight
+    of each remaining grid is multiplied by the number of its symmetry
+    images.  The molecule must be in the standard orientation, i.e. the
+    symmetry operations only flip the signs of the coordinates.
+
+    The reduced grids integrate the totally symmetric functions exactly.
+    The XC matrix evaluated on them needs to be symmetrized, see
+    :func:`numint.symmetrize_mat`.  The image of each grid is matched to the
+    nearest grid.  RuntimeError is raised if it is farther than tol.
+    '''
+    import scipy.spatial
+    from pyscf import symm
+    opdic = symm.geom.symm_ops(mol.groupname)
+    signs = [numpy.diag(numpy.eye(3)*opdic[op])
+             for op in symm.param.OPERATOR_TABLE[mol.groupname]]
+    ngrids = len(weights)
+    tree = scipy.spatial.cKDTree(coords)
+# Among the images, the grid of the smallest index is the representative of
+# the symmetry-equivalent grids
+    rep = numpy.arange(ngrids)
+    nstab = numpy.zeros(ngrids, dtype=int)
+    for s in signs:
+        dist, img = tree.query(coords * s)
+        if ngrids > 0 and dist.max() > tol:
+            raise RuntimeError('Grids are not symmetric under the operations '
+                               'of %s (error %g)' % (mol.groupname, dist.max()))
+        rep = numpy.minimum(rep, img)
+        nstab += img == numpy.arange(ngrids)
+    idx = rep == numpy.arange(ngrids)
+    weights = weights[idx] * (len(signs) // nstab[idx])
+    return coords[idx], weights
+
+def arg_group_grids(coords, blksize=numint.BLKSIZE):
+    '''Order of the grids which puts the spatially close grids in the same
+    block of size blksize.  The grids are recursively bisected along the
+    longest edge of their bounding box.  The first half of each bisection
+    holds a multiple of blksize grids, so that every block (except the last
+    one) is one compact leaf of the bisection tree.
+    '''
+    coords = numpy.asarray(coords)
+    def bisect(idx):
+        n = len(idx)
+        if n <= blksize:
+            return [idx]
+        c = coords[idx]
+        axis = (c.max(axis=0) - c.min(axis=0)).argmax()
+        nblk = (n+blksize-1) // blksize
+        nleft = (nblk+1)//2 * blksize
+        part = numpy.argpartition(c[:,axis], nleft)
+        return bisect(idx[part[:nleft]]) + bisect(idx[part[nleft:]])
+    if len(coords) == 0:
+        return numpy.arange(0)
+    return numpy.hstack(bisect(numpy.arange(len(coords))))
 
 
 class Grids(object):
@@ -248,10 +366,24 @@ class Grids(object):
         self.becke_scheme = original_becke
         self.level = 3
         self.prune_scheme = treutler_prune
-        self.symmetry = mol.symmetry
+# Keep only the symmetry-unique grids, see symmetry_reduce.  It is only valid
+# for the totally symmetric densities.  numint switches to the full grids (see
+# unreduced) for other densities.
+        self.symmetry = False
+# Remove the grids of which the weights are smaller than weight_cutoff
+        self.weight_cutoff = None
+# Reorder the grids so that the grids in each block of numint.BLKSIZE are
+# spatially close.  It improves the screening of AOs in numint
+        self.sort_grids = False
 
         self.coords  = None
         self.weights = None
+# Screening table of the shells for each block of grids, see numint.make_mask
+        self.non0tab = None
+# The symmetry adapted orbitals to symmetrize the matrices integrated on the
+# symmetry-reduced grids
+        self.symm_orb = None
+        self._unreduced = None
 
     def dump_flags(self):
         try:
@@ -260,6 +392,8 @@ class Grids(object):
             pyscf.log.info(self, 'pruning grids: %s', self.prune_scheme.__doc__)
             pyscf.log.info(self, 'grids dens level: %d', self.level)
             pyscf.log.info(self, 'symmetrized grids: %d', self.symmetry)
+            pyscf.log.info(self, 'weight cutoff: %s', self.weight_cutoff)
+            pyscf.log.info(self, 'sort grids: %s', self.sort_grids)
             if self.atomic_radii is not None:
                 pyscf.log.info(self, 'adjust function', self.atomic_radii.__doc__)
         except:
@@ -268,17 +402,86 @@ class Grids(object):
     def setup_grids(self, mol=None):
         return self.setup_grids_(mol)
     def setup_grids_(self, mol=None):
+        '''Generate the grids and weights.  If lib.parameters.INTCACHE_DIR
+        is set, the grids are saved there and reloaded for the same geometry
+        and grids settings.'''
         if mol is None: mol = self.mol
-        atom_grids_tab = self.gen_atomic_grids(mol, mol_grids=mol.grids,
-                                               radi_method=self.radi_method,
-                                               level=self.level,
-                                               prune_scheme=self.prune_scheme)
-        self.coords, self.weights = \
-                self.gen_partition(mol, atom_grids_tab, self.atomic_radii,
-                                   self.becke_scheme)
+        symmetry = (self.symmetry and mol.symmetry and
+                    mol.groupname != 'C1' and mol.symm_orb is not None)
+        def build():
+            atom_grids_tab = self.gen_atomic_grids(mol, mol_grids=mol.grids,
+                                                   radi_method=self.radi_method,
+                                                   level=self.level,
+                                                   prune_scheme=self.prune_scheme)
+            coords, weights = self.gen_partition(mol, atom_grids_tab,
+                                                 self.atomic_radii,
+                                                 self.becke_scheme)
+            if self.weight_cutoff is not None:
+                coords, weights = prune_by_weights(coords, weights,
+                                                   self.weight_cutoff)
+            if symmetry:
+                coords, weights = symmetry_reduce(mol, coords, weights)
+            if self.sort_grids:
+                idx = arg_group_grids(coords)
+                coords = coords[idx]
+                weights = weights[idx]
+            return numpy.hstack((coords, weights.reshape(-1,1)))
+
+        key = self._cache_key(mol)
+        if key is None:
+            grids = build()
+        else:
+            grids = pyscf.lib.intcache.load_or_build(key, build)
+        self.coords = numpy.array(grids[:,:3], order='C')
+        self.weights = numpy.array(grids[:,3])
+        if symmetry:
+            self.symm_orb = mol.symm_orb
+        else:
+            self.symm_orb = None
+        self._unreduced = None
+        self.non0tab = numint.make_mask(mol, self.coords)
         pyscf.lib.logger.info(self, 'tot grids = %d', len(self.weights))
         return self.coords, self.weights
 
+    def unreduced(self):
+        '''The grids without the symmetry reduction.  They are generated on
+        the first call and kept until the grids are set up again.'''
+        if self.symm_orb is None:
+            return self
+        if self._unreduced is None:
+            grids = copy.copy(self)
+            grids.symmetry = False
+            grids.setup_grids()
+            self._unreduced = grids
+        return self._unreduced
+
+    def _cache_key(self, mol):
+        '''Key of the grids in lib.intcache.  None if the grids can not be
+        identified, e.g. when the settings include lambda functions.'''
+        if pyscf.lib.parameters.INTCACHE_DIR is None:
+            return None
+        settings = [self.level, sorted(mol.grids.items()),
+                    self.weight_cutoff, self.sort_grids]
+        if self.symmetry and mol.symmetry:
+            settings.append(mol.groupname)
+        for f in (self.radi_method, self.becke_scheme, self.prune_scheme):
+            if f is None:
+                settings.append(None)
+            elif getattr(f, '__name__', '<lambda>') == '<lambda>':
+                return None
+            else:
+                settings.append((f.__module__, f.__name__))
+        h = hashlib.sha1()
+        if self.atomic_radii is not None:
+            if not hasattr(self.atomic_radii, 'a'):
+                return None
+            h.update(numpy.asarray(self.atomic_radii.a).tostring())
+        coords = numpy.array([mol.atom_coord(i) for i in range(mol.natm)])
+        charges = [mol.atom_charge(i) for i in range(mol.natm)]
+        h.update(coords.tostring())
+        h.update(str((charges, settings)).encode())
+        return 'grids-' + h.hexdigest()
+
     def gen_atomic_grids(self, mol, mol_grids=None, radi_method=None,
                          level=None, prune_scheme=None):
         if mol_grids is None: mol_grids = mol.grids
@@ -4,12 +4,19 @@
 #
 
 import os
+import sys
 import ctypes
 import _ctypes
 import time
+import tempfile
+import threading
+from functools import reduce
 import numpy
 import scipy.linalg
 import pyscf.lib
+import pyscf.lib.parameters
+import pyscf.lib.intcache
+import pyscf.lib.logger
 import pyscf.dft.vxc
 
 libdft = pyscf.lib.load_library('libdft')
@@ -37,14 +44,7 @@ def eval_ao(mol, coords, isgga=False, relativity=0, bastart=0, bascount=None,
         feval = _ctypes.dlsym(libdft._handle, 'VXCeval_nr_gto')
 
     if non0tab is None:
-        non0tab = numpy.empty(((ngrids+BLKSIZE-1)//BLKSIZE,nbas.value),
-                              dtype=numpy.int8)
-    libdft.VXCnr_ao_screen(non0tab.ctypes.data_as(ctypes.c_void_p),
-                           coords.ctypes.data_as(ctypes.c_void_p),
-                           ctypes.c_int(ngrids), ctypes.c_int(BLKSIZE),
-                           c_atm.ctypes.data_as(ctypes.c_void_p), natm,
-                           c_bas.ctypes.data_as(ctypes.c_void_p), nbas,
-                           c_env.ctypes.data_as(ctypes.c_void_p))
+        non0tab = make_mask(mol, coords)
 
     libdft.VXCeval_ao_drv(ctypes.c_void_p(feval),
                           ctypes.c_int(nao), ctypes.c_int(ngrids),
@@ -58,7 +58,80 @@ def eval_ao(mol, coords, isgga=False, relativity=0, bastart=0, bascount=None,
                           c_env.ctypes.data_as(ctypes.c_void_p))
     return ao, non0tab
 
-def eval_rho(mol, ao, dm, non0tab=None, isgga=False, verbose=None):
+def make_mask(mol, coords, non0tab=None):
+    '''Screening table of the shells for the grid blocks of size BLKSIZE.
+    non0tab[i,j] is 0 if shell j vanishes on all grids of block i.  The
+    result is written to the array non0tab if it is given.
+    '''
+    coords = numpy.asarray(coords, order='C')
+    c_atm = numpy.array(mol._atm, dtype=numpy.int32)
+    c_bas = numpy.array(mol._bas, dtype=numpy.int32)
+    c_env = numpy.array(mol._env)
+    natm = ctypes.c_int(c_atm.shape[0])
+    nbas = ctypes.c_int(c_bas.shape[0])
+    ngrids = len(coords)
+    if non0tab is None:
+        non0tab = numpy.empty(((ngrids+BLKSIZE-1)//BLKSIZE,nbas.value),
+                              dtype=numpy.int8)
+    libdft.VXCnr_ao_screen(non0tab.ctypes.data_as(ctypes.c_void_p),
+                           coords.ctypes.data_as(ctypes.c_void_p),
+                           ctypes.c_int(ngrids), ctypes.c_int(BLKSIZE),
+                           c_atm.ctypes.data_as(ctypes.c_void_p), natm,
+                           c_bas.ctypes.data_as(ctypes.c_void_p), nbas,
+                           c_env.ctypes.data_as(ctypes.c_void_p))
+    return non0tab
+
+def eval_rho(mol, ao, dm, non0tab=None, isgga=False, verbose=None,
+             factors=None):
+    '''Density (and the density gradients if isgga) on the grids.  dm can
+    be a density matrix or a list of density matrices.
+
+    Kwargs:
+        factors : (cpos, cneg)
+            The factors of dm = cpos.cpos^T - cneg.cneg^T, see
+            :func:`dm_factors`.  If given, dm is not referenced and the
+            diagonalization of dm is skipped.
+    '''
+    if factors is not None:
+        return _contract_rho(mol, ao, factors[0], factors[1], non0tab, isgga)
+    elif isinstance(dm, numpy.ndarray) and dm.ndim == 2:
+        cpos, cneg = dm_factors(dm)
+        return _contract_rho(mol, ao, cpos, cneg, non0tab, isgga)
+    else:
+        return numpy.array([eval_rho(mol, ao, x, non0tab, isgga, verbose)
+                            for x in dm])
+
+def eval_rho2(mol, ao, mo_coeff, mo_occ, non0tab=None, isgga=False,
+              verbose=None):
+    '''Density on the grids for the density matrix of the given orbitals
+    and occupancies.  It avoids the diagonalization of the density matrix.
+    '''
+    return _contract_rho(mol, ao, mo_factors(mo_coeff, mo_occ), None,
+                         non0tab, isgga)
+
+def dm_factors(dm):
+    '''Factors cpos, cneg of the hermitian density matrix
+    dm = cpos.cpos^T - cneg.cneg^T.  cneg is None if dm has no negative
+    eigenvalues.
+    '''
+    e, c = scipy.linalg.eigh(dm)
+    pos = e > OCCDROP
+    cpos = numpy.asarray(c[:,pos] * numpy.sqrt(e[pos]), order='C')
+    neg = e < -OCCDROP
+    if neg.any():
+        cneg = numpy.asarray(c[:,neg] * numpy.sqrt(-e[neg]), order='C')
+    else:
+        cneg = None
+    return cpos, cneg
+
+def mo_factors(mo_coeff, mo_occ):
+    '''Factor cpos of the density matrix dm = cpos.cpos^T of the occupied
+    orbitals'''
+    pos = mo_occ > OCCDROP
+    return numpy.asarray(mo_coeff[:,pos] * numpy.sqrt(mo_occ[pos]),
+                         order='C')
+
+def _contract_rho(mol, ao, cpos, cneg, non0tab=None, isgga=False):
     c_atm = numpy.array(mol._atm, dtype=numpy.int32)
     c_bas = numpy.array(mol._bas, dtype=numpy.int32)
     c_env = numpy.array(mol._env)
@@ -71,10 +144,11 @@ def eval_rho(mol, ao, dm, non0tab=None, isgga=False, verbose=None):
         ngrids, nao = ao.shape
 
     if non0tab is None:
-        non0tab = numpy.ones(((ngrids+BLKSIZE-1)/BLKSIZE,nbas.value),
+        non0tab = numpy.ones(((ngrids+BLKSIZE-1)//BLKSIZE,nbas.value),
                              dtype=numpy.int8)
     def adot(ao, dm):
         #return pyscf.lib.dot(ao, dm)
+        dm = numpy.asarray(dm, order='C')
         vm = numpy.empty((ngrids,dm.shape[1]))
         libdft.VXCdot_ao_dm(vm.ctypes.data_as(ctypes.c_void_p),
                             ao.ctypes.data_as(ctypes.c_void_p),
@@ -87,42 +161,35 @@ def eval_rho(mol, ao, dm, non0tab=None, isgga=False, verbose=None):
                             c_env.ctypes.data_as(ctypes.c_void_p))
         return vm
 
-    def frho(dm):
-        e, c = scipy.linalg.eigh(dm)
-        pos = e > OCCDROP
-        cpos = numpy.einsum('ij,j->ij', c[:,pos], numpy.sqrt(e[pos]))
+    if isgga:
+        rho = numpy.empty((4,ngrids))
+        c0 = adot(ao[0], cpos)
+        rho[0] = numpy.einsum('pi,pi->p', c0, c0)
+        for i in range(1, 4):
+            c1 = adot(ao[i], cpos)
+            rho[i] = numpy.einsum('pi,pi->p', c0, c1) * 2 # *2 for +c.c.
+    else:
+        c0 = adot(ao, cpos)
+        rho = numpy.einsum('pi,pi->p', c0, c0)
+
+    if cneg is not None and cneg.shape[1] > 0:
         if isgga:
-            rho = numpy.empty((4,ngrids))
-            c0 = adot(ao[0], cpos)
-            rho[0] = numpy.einsum('pi,pi->p', c0, c0)
+            c0 = adot(ao[0], cneg)
+            rho[0] -= numpy.einsum('pi,pi->p', c0, c0)
             for i in range(1, 4):
-                c1 = adot(ao[i], cpos)
-                rho[i] = numpy.einsum('pi,pi->p', c0, c1) * 2 # *2 for +c.c.
+                c1 = adot(ao[i], cneg)
+                rho[i] -= numpy.einsum('pi,pi->p', c0, c1) * 2 # *2 for +c.c.
         else:
-            c0 = adot(ao, cpos)
-            rho = numpy.einsum('pi,pi->p', c0, c0)
-
-        neg = e < -OCCDROP
-        if neg.sum() > 0:
-            cneg = numpy.einsum('ij,j->ij', c[:,neg], numpy.sqrt(-e[neg]))
-            if isgga:
-                c0 = adot(ao[0], cneg)
-                rho[0] -= numpy.einsum('pi,pi->p', c0, c0)
-                for i in range(1, 4):
-                    c1 = adot(ao[i], cpos)
-                    rho[i] -= numpy.einsum('pi,pi->p', c0, c1) * 2 # *2 for +c.c.
-            else:
-                c0 = adot(ao, cneg)
-                rho -= numpy.einsum('pi,pi->p', c0, c0)
-        return rho
-
-    if isinstance(dm, numpy.ndarray) and dm.ndim == 2:
-        return frho(dm)
-    else:
-        return numpy.array([frho(x) for x in dm])
+            c0 = adot(ao, cneg)
+            rho -= numpy.einsum('pi,pi->p', c0, c0)
+    return rho
 
 def eval_mat(mol, ao, weight, rho, vrho, vsigma=None, non0tab=None,
-             isgga=False, verbose=None):
+             isgga=False, verbose=None, spin=0):
+    '''XC potential matrix.  If spin is not 0, it is the potential matrix
+    of spin s, for rho = (rho_s, rho_t) and vsigma = (vsigma_ss, vsigma_st).
+    t is the other spin.  vrho is the derivative wrt rho_s.
+    '''
     c_atm = numpy.array(mol._atm, dtype=numpy.int32)
     c_bas = numpy.array(mol._bas, dtype=numpy.int32)
     c_env = numpy.array(mol._env)
@@ -152,7 +219,15 @@ def eval_mat(mol, ao, weight, rho, vrho, vsigma=None, non0tab=None,
                             c_env.ctypes.data_as(ctypes.c_void_p))
         return vv
 
-    if isgga:
+    if isgga and spin != 0:
+        rho_s, rho_t = rho
+        wv = numpy.empty((4,ngrids))
+        wv[0]  = weight * vrho * .5
+        wv[1:] = rho_s[1:] * (weight * vsigma[0] * 2)
+        wv[1:]+= rho_t[1:] * (weight * vsigma[1])
+        aow = numpy.einsum('npi,np->pi', ao, wv)
+        mat = adot(ao[0], aow)
+    elif isgga:
         assert(vsigma is not None and rho.ndim==2)
         #wv = weight * vsigma * 2
         #aow  = numpy.einsum('pi,p->pi', ao[1], rho[1]*wv)
@@ -178,86 +253,84 @@ def eval_x(x_id, rho, sigma, spin=0, relativity=0, verbose=None):
     For LDA and GGA functional, ec, vcrho, vcsigma are not zero
     For hybrid functional, ec, vcrho, vcsigma are zero
     '''
-    rho = numpy.asarray(rho, order='C')
-    sigma = numpy.asarray(sigma, order='C')
-    ngrids = len(rho)
-    if spin == 0:
-        exc = numpy.empty(ngrids)
-        vrho = numpy.empty(ngrids)
-        vsigma = numpy.empty(ngrids)
-        nspin = 1
-    else:
-        exc = numpy.empty(ngrids)
-        vrho = numpy.empty((2,ngrids))
-        vsigma = numpy.empty((3,ngrids))
-        nspin = 2
-    libdft.VXCnr_eval_x(ctypes.c_int(x_id),
-                        ctypes.c_int(nspin), ctypes.c_int(relativity),
-                        ctypes.c_int(ngrids),
-                        rho.ctypes.data_as(ctypes.c_void_p),
-                        sigma.ctypes.data_as(ctypes.c_void_p),
-                        exc.ctypes.data_as(ctypes.c_void_p),
-                        vrho.ctypes.data_as(ctypes.c_void_p),
-                        vsigma.ctypes.data_as(ctypes.c_void_p))
-    return exc, vrho, vsigma
+    return _eval_xc_drv(libdft.VXCnr_eval_x, (x_id,), rho, sigma,
+                        spin, relativity)
 
 def eval_c(c_id, rho, sigma, spin=0, relativity=0, verbose=None):
-    rho = numpy.asarray(rho, order='C')
-    sigma = numpy.asarray(sigma, order='C')
-    ngrids = len(rho)
-    if spin == 0:
-        exc = numpy.empty(ngrids)
-        vrho = numpy.empty(ngrids)
-        vsigma = numpy.empty(ngrids)
-        nspin = 1
-    else:
-        exc = numpy.empty(ngrids)
-        vrho = numpy.empty((2,ngrids))
-        vsigma = numpy.empty((3,ngrids))
-        nspin = 2
-    libdft.VXCnr_eval_c(ctypes.c_int(c_id),
-                        ctypes.c_int(nspin), ctypes.c_int(relativity),
-                        ctypes.c_int(ngrids),
-                        rho.ctypes.data_as(ctypes.c_void_p),
-                        sigma.ctypes.data_as(ctypes.c_void_p),
-                        exc.ctypes.data_as(ctypes.c_void_p),
-                        vrho.ctypes.data_as(ctypes.c_void_p),
-                        vsigma.ctypes.data_as(ctypes.c_void_p))
-    return exc, vrho, vsigma
+    return _eval_xc_drv(libdft.VXCnr_eval_c, (c_id,), rho, sigma,
+                        spin, relativity)
 
 def eval_xc(x_id, c_id, rho, sigma, spin=0, relativity=0, verbose=None):
     '''
     For LDA and GGA functional, ec, vcrho, vcsigma are not zero
     For hybrid functional, ec, vcrho, vcsigma are zero
+
+    If spin is not 0, rho = (rho_a, rho_b) and sigma = (sigma_aa, sigma_ab,
+    sigma_bb).  The returned vrho has the shape (2,ngrids) for alpha and
+    beta spins and vsigma has the shape (3,ngrids) for aa, ab and bb.
     '''
+    return _eval_xc_drv(libdft.VXCnr_eval_xc, (x_id, c_id), rho, sigma,
+                        spin, relativity)
+
+def eval_fxc(x_id, c_id, rho, sigma, spin=0, relativity=0, verbose=None):
+    '''Second derivatives v2rho2, v2rhosigma and v2sigma2 of the
+    spin-unpolarized XC functional.  For LDA, v2rhosigma and v2sigma2 are 0.
+    '''
+    if spin != 0:
+        raise RuntimeError('fxc of spin-polarized functional is not implemented')
     rho = numpy.asarray(rho, order='C')
     sigma = numpy.asarray(sigma, order='C')
     ngrids = len(rho)
+    v2rho2 = numpy.empty(ngrids)
+    v2rhosigma = numpy.empty(ngrids)
+    v2sigma2 = numpy.empty(ngrids)
+    libdft.VXCnr_eval_fxc(ctypes.c_int(x_id), ctypes.c_int(c_id),
+                          ctypes.c_int(1), ctypes.c_int(relativity),
+                          ctypes.c_int(ngrids),
+                          rho.ctypes.data_as(ctypes.c_void_p),
+                          sigma.ctypes.data_as(ctypes.c_void_p),
+                          v2rho2.ctypes.data_as(ctypes.c_void_p),
+                          v2rhosigma.ctypes.data_as(ctypes.c_void_p),
+                          v2sigma2.ctypes.data_as(ctypes.c_void_p))
+    return v2rho2, v2rhosigma, v2sigma2
+
+def _eval_xc_drv(fn, xc_ids, rho, sigma, spin, relativity):
     if spin == 0:
+        rho = numpy.asarray(rho, order='C')
+        sigma = numpy.asarray(sigma, order='C')
+        ngrids = len(rho)
         exc = numpy.empty(ngrids)
         vrho = numpy.empty(ngrids)
         vsigma = numpy.empty(ngrids)
         nspin = 1
     else:
+# libxc takes the spin components of each grid point contiguously
+        rho = numpy.asarray(numpy.asarray(rho).T, order='C')
+        sigma = numpy.asarray(numpy.asarray(sigma).T, order='C')
+        ngrids = len(rho)
         exc = numpy.empty(ngrids)
-        vrho = numpy.empty((2,ngrids))
-        vsigma = numpy.empty((3,ngrids))
+        vrho = numpy.empty((ngrids,2))
+        vsigma = numpy.empty((ngrids,3))
         nspin = 2
-    libdft.VXCnr_eval_xc(ctypes.c_int(x_id), ctypes.c_int(c_id),
-                         ctypes.c_int(nspin), ctypes.c_int(relativity),
-                         ctypes.c_int(ngrids),
-                         rho.ctypes.data_as(ctypes.c_void_p),
-                         sigma.ctypes.data_as(ctypes.c_void_p),
-                         exc.ctypes.data_as(ctypes.c_void_p),
-                         vrho.ctypes.data_as(ctypes.c_void_p),
-                         vsigma.ctypes.data_as(ctypes.c_void_p))
-    return exc, vrho, vsigma
+    args = [ctypes.c_int(x) for x in xc_ids]
+    fn(*(args + [ctypes.c_int(nspin), ctypes.c_int(relativity),
+                 ctypes.c_int(ngrids),
+                 rho.ctypes.data_as(ctypes.c_void_p),
+                 sigma.ctypes.data_as(ctypes.c_void_p),
+                 exc.ctypes.data_as(ctypes.c_void_p),
+                 vrho.ctypes.data_as(ctypes.c_void_p),
+                 vsigma.ctypes.data_as(ctypes.c_void_p)]))
+    if spin == 0:
+        return exc, vrho, vsigma
+    else:
+        return exc, vrho.T, vsigma.T
 
 def nr_vxc(mol, grids, x_id, c_id, dm, spin=0, relativity=0, hermi=1,
-           max_memory=2000, verbose=None):
+           max_memory=2000, verbose=None, mo_coeff=None, mo_occ=None):
     nao = dm.shape[0]
     ngrids = len(grids.weights)
     blksize = min(int(max_memory/6*1e6/8/nao), ngrids)
+    factors = _get_factors(dm, mo_coeff, mo_occ)
     nelec = 0
     excsum = 0
     vmat = numpy.zeros_like(dm)
@@ -268,14 +341,14 @@ def nr_vxc(mol, grids, x_id, c_id, dm, spin=0, relativity=0, hermi=1,
         if pyscf.dft.vxc._is_lda(x_id) and pyscf.dft.vxc._is_lda(c_id):
             isgga = False
             ao, non0tab = eval_ao(mol, coords, isgga=isgga)
-            rho = eval_rho(mol, ao, dm, non0tab, isgga=isgga)
+            rho = eval_rho(mol, ao, dm, non0tab, isgga=isgga, factors=factors)
             exc, vrho, vsigma = eval_xc(x_id, c_id, rho, rho,
                                         spin, relativity, verbose)
             den = rho*weight
         else:
             isgga = True
             ao, non0tab = eval_ao(mol, coords, isgga=isgga)
-            rho = eval_rho(mol, ao, dm, non0tab, isgga=isgga)
+            rho = eval_rho(mol, ao, dm, non0tab, isgga=isgga, factors=factors)
             sigma = numpy.einsum('ip,ip->p', rho[1:], rho[1:])
             exc, vrho, vsigma = eval_xc(x_id, c_id, rho[0], sigma,
                                         spin, relativity, verbose)
@@ -285,47 +358,466 @@ def nr_vxc(mol, grids, x_id, c_id, dm, spin=0, relativity=0, hermi=1,
         excsum += (den*exc).sum()
         vmat += eval_mat(mol, ao, weight, rho, vrho, vsigma, isgga,
                          non0tab=non0tab, verbose=verbose)
-    return nelec, excsum, vmat
+    return nelec, excsum, _symmetrize_vxc(vmat, grids)
+
+def nr_uks_vxc(mol, grids, x_id, c_id, dms, relativity=0, hermi=1,
+               max_memory=2000, verbose=None, mo_coeff=None, mo_occ=None):
+    '''Spin-polarized XC potential.  See :meth:`_NumInt.nr_uks_vxc`'''
+    ni = _NumInt()
+    ni.max_cache_memory = 0
+    return ni.nr_uks_vxc(mol, grids, x_id, c_id, dms, relativity, hermi,
+                         max_memory, verbose, mo_coeff, mo_occ)
+
+def symmetrize_mat(mat, symm_orb):
+    '''Totally symmetric part of the matrix (or the list of matrices) in AO
+    representation.  The matrix elements between different irreps are
+    removed.  symm_orb is the list of symmetry adapted orbitals (mol.symm_orb).
+    '''
+    mat = numpy.asarray(mat)
+    if mat.ndim == 3:
+        return numpy.array([symmetrize_mat(x, symm_orb) for x in mat])
+    out = numpy.zeros_like(mat)
+    for c in symm_orb:
+        out += reduce(numpy.dot, (c, c.T, mat, c, c.T))
+    return out
+
+def select_grids(grids, dms, tol=1e-9):
+    '''The grids to integrate the density matrices dms.  The symmetry-reduced
+    grids are only valid for the totally symmetric densities.  If any of dms
+    has matrix elements between different irreps (larger than tol), the grids
+    without the symmetry reduction are returned.
+    '''
+    symm_orb = getattr(grids, 'symm_orb', None)
+    if symm_orb is None:
+        return grids
+    dms = numpy.asarray(dms)
+    nao = dms.shape[-1]
+    dms = dms.reshape(-1,nao,nao)
+    if abs(symmetrize_mat(dms, symm_orb) - dms).max() < tol:
+        return grids
+    pyscf.lib.logger.debug(grids, 'density is not totally symmetric, '
+                           'integrate on the unreduced grids')
+    return grids.unreduced()
+
+def _symmetrize_vxc(vmat, grids):
+# The matrices integrated on the symmetry-reduced grids
+    symm_orb = getattr(grids, 'symm_orb', None)
+    if symm_orb is None:
+        return vmat
+    else:
+        return symmetrize_mat(vmat, symm_orb)
+
+def _get_factors(dm, mo_coeff=None, mo_occ=None):
+# Factorize the density matrix once for all grid blocks
+    if mo_coeff is not None:
+        return mo_factors(mo_coeff, mo_occ), None
+    else:
+        return dm_factors(dm)
 
 
 class _NumInt:
+    '''Numerical integration of the XC functional.  The AO values of the grid
+    blocks are cached and reused in the next call of nr_vxc, as long as the
+    molecule and the grids are not changed.  Call :func:`clear_cache` to
+    release the cache explicitly, e.g. after the geometry is updated in place.
+
+    Attributes:
+        max_cache_memory : float
+            Memory (in MB) to hold the cached AO values, in addition to the
+            max_memory of nr_vxc.  Default is
+            lib.parameters.NUMINT_AO_CACHE_MEMORY, which is 0 (no cache).
+        cache_spill : bool
+            Whether to save the AO values which exceed max_cache_memory in a
+            memory-mapped scratch file.
+        tmpdir : str
+            Directory of the scratch file.  Default is
+            lib.parameters.NUMINT_AO_CACHE_TMPDIR.
+        nthreads : int
+            Number of Python threads to integrate the grid blocks.  Default
+            is lib.parameters.NUMINT_THREADS.  The C kernels and BLAS release
+            the GIL, so the blocks are processed concurrently.  Each C call
+            still starts its own OpenMP threads, OMP_NUM_THREADS may need to
+            be reduced accordingly.
+    '''
     def __init__(self):
-        self.non0tab = None
+        self.max_cache_memory = pyscf.lib.parameters.NUMINT_AO_CACHE_MEMORY
+        self.cache_spill = pyscf.lib.parameters.NUMINT_AO_CACHE_SPILL
+        self.tmpdir = pyscf.lib.parameters.NUMINT_AO_CACHE_TMPDIR
+        self.nthreads = pyscf.lib.parameters.NUMINT_THREADS
+        self._ao_cache = None
+        self._cache_lock = threading.Lock()
+
+    def clear_cache(self):
+        '''Invalidate the cached AO values and remove the scratch file'''
+        if self._ao_cache is not None:
+            self._ao_cache.close()
+        self._ao_cache = None
+
+    def block_loop(self, mol, grids, nao, isgga, blksize):
+        '''Generator of (ip0, ip1, ao, non0tab) for the grid blocks.  The AO
+        values are taken from the cache if possible.'''
+        ngrids = len(grids.weights)
+        cache = self._get_cache(mol, grids, isgga, blksize)
+        grids_non0tab = _grids_non0tab(grids, blksize)
+        buf = None  # for non0tab, which is overwritten by make_mask
+        for ip0, ip1 in prange(0, ngrids, blksize):
+            ao, non0tab, buf = self._block_ao(mol, grids, ip0, ip1, nao, isgga,
+                                              cache, grids_non0tab, buf)
+            yield ip0, ip1, ao, non0tab
+
+    def _block_ao(self, mol, grids, ip0, ip1, nao, isgga, cache,
+                  grids_non0tab, buf):
+        if cache is not None and ip0 in cache.blocks:
+            ao, non0tab = cache.blocks[ip0]
+            return ao, non0tab, buf
+        coords = numpy.asarray(grids.coords[ip0:ip1], order='C')
+        if grids_non0tab is None:
+            buf = non0tab = make_mask(mol, coords, buf)
+        else:
+            non0tab = grids_non0tab[ip0//BLKSIZE:]
+        ao = eval_ao(mol, coords, isgga=isgga, non0tab=non0tab)[0]
+        if cache is not None:
+            with self._cache_lock:
+# Size of the blocks which are not cached yet, to allocate the scratch file
+                nleft = len(grids.weights)
+                nleft -= sum([x[0].shape[-2] for x in cache.blocks.values()])
+                if isgga:
+                    nleft *= nao * 4
+                else:
+                    nleft *= nao
+                non0tab = cache.put(ip0, ao, non0tab, nleft)
+        return ao, non0tab, buf
+
+    def block_reduce(self, mol, grids, nao, isgga, blksize, fn, zeros):
+        '''Sum fn(ip0, ip1, ao, non0tab) over all grid blocks.  fn should
+        return a tuple of numbers or arrays, which are summed elementwise.
+        zeros is the tuple of the initial (zero) values of the sums, which is
+        also the result if there are no grid blocks.
+
+        If self.nthreads > 1, the grid blocks are distributed over a pool of
+        threads.  Each thread keeps its own partial sums, which are added up
+        after all blocks are processed.
+        '''
+        ngrids = len(grids.weights)
+        if ngrids == 0:
+            return list(zeros)
+        nthreads = min(self.nthreads, (ngrids+blksize-1)//blksize)
+        if nthreads <= 1:
+            out = list(zeros)
+            for ip0, ip1, ao, non0tab in self.block_loop(mol, grids, nao,
+                                                         isgga, blksize):
+                out = _accumulate(out, fn(ip0, ip1, ao, non0tab))
+            return out
+
+        cache = self._get_cache(mol, grids, isgga, blksize)
+        grids_non0tab = _grids_non0tab(grids, blksize)
+        blocks = prange(0, ngrids, blksize)
+        lock = threading.Lock()
+        partial = []
+        errors = []
+        def worker():
+            out = None
+            buf = None
+            try:
+                while True:
+                    with lock:
+                        if errors:
+                            break
+                        try:
+                            ip0, ip1 = next(blocks)
+                        except StopIteration:
+                            break
+                    ao, non0tab, buf = self._block_ao(mol, grids, ip0, ip1,
+                                                      nao, isgga, cache,
+                                                      grids_non0tab, buf)
+                    out = _accumulate(out, fn(ip0, ip1, ao, non0tab))
+            except Exception:
+                errors.append(sys.exc_info()[1])
+            with lock:
+                partial.append(out)
+        threads = [threading.Thread(target=worker) for i in range(nthreads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+        out = list(zeros)
+        for x in partial:
+            if x is not None:
+                out = _accumulate(out, x)
+        return out
+
+    def _get_cache(self, mol, grids, isgga, blksize):
+        if self.max_cache_memory <= 0:
+            self.clear_cache()
+            return None
+        key = (pyscf.lib.intcache.fingerprint(mol), isgga, blksize,
+               len(grids.weights))
+        cache = self._ao_cache
+# grids.coords is held by the cache, its id cannot be reused by other arrays
+        if (cache is None or cache.key != key or
+            cache.coords is not grids.coords):
+            self.clear_cache()
+            cache = self._ao_cache = _AOCache(key, grids.coords,
+                                              self.max_cache_memory,
+                                              self.cache_spill, self.tmpdir,
+                                              pyscf.lib.logger.Logger(mol.stdout,
+                                                                      mol.verbose))
+        return cache
 
     def nr_vxc(self, mol, grids, x_id, c_id, dm, spin=0, relativity=0, hermi=1,
-               max_memory=2000, verbose=None):
+               max_memory=2000, verbose=None, mo_coeff=None, mo_occ=None):
+        '''XC energy and potential matrix.  If mo_coeff and mo_occ are given,
+        they should generate dm.  The density is then evaluated from the
+        occupied orbitals.  Otherwise dm is factorized once for all grid
+        blocks.'''
+        grids = select_grids(grids, dm)
         nao = dm.shape[0]
         ngrids = len(grids.weights)
-        blksize = min(int(max_memory/6*1e6/8/nao), ngrids)
-        nelec = 0
-        excsum = 0
-        vmat = numpy.zeros_like(dm)
-        for ip0, ip1 in prange(0, ngrids, blksize):
-            coords = grids.coords[ip0:ip1]
+        blksize = max(int(max_memory/6*1e6/8/nao)//BLKSIZE, 1) * BLKSIZE
+        blksize = _thread_blksize(min(blksize, ngrids), ngrids, self.nthreads)
+        isgga = not (pyscf.dft.vxc._is_lda(x_id) and pyscf.dft.vxc._is_lda(c_id))
+        factors = _get_factors(dm, mo_coeff, mo_occ)
+        def kernel(ip0, ip1, ao, non0tab):
             weight = grids.weights[ip0:ip1]
-            if pyscf.dft.vxc._is_lda(x_id) and pyscf.dft.vxc._is_lda(c_id):
-                isgga = False
-                ao, self.non0tab = eval_ao(mol, coords, isgga=isgga,
-                                           non0tab=self.non0tab)
-                rho = eval_rho(mol, ao, dm, non0tab=self.non0tab, isgga=isgga)
+            if not isgga:
+                rho = eval_rho(mol, ao, dm, non0tab=non0tab, isgga=isgga,
+                               factors=factors)
                 exc, vrho, vsigma = eval_xc(x_id, c_id, rho, rho,
                                             spin, relativity, verbose)
                 den = rho*weight
             else:
-                isgga = True
-                ao, self.non0tab = eval_ao(mol, coords, isgga=isgga,
-                                           non0tab=self.non0tab)
-                rho = eval_rho(mol, ao, dm, non0tab=self.non0tab, isgga=isgga)
+                rho = eval_rho(mol, ao, dm, non0tab=non0tab, isgga=isgga,
+                               factors=factors)
                 sigma = numpy.einsum('ip,ip->p', rho[1:], rho[1:])
                 exc, vrho, vsigma = eval_xc(x_id, c_id, rho[0], sigma,
                                             spin, relativity, verbose)
                 den = rho[0]*weight
+            vmat = eval_mat(mol, ao, weight, rho, vrho, vsigma, isgga=isgga,
+                            non0tab=non0tab, verbose=verbose)
+            return den.sum(), (den*exc).sum(), vmat
+        nelec, excsum, vmat = self.block_reduce(mol, grids, nao, isgga,
+                                                blksize, kernel,
+                                                (0, 0, numpy.zeros((nao,nao))))
+        return nelec, excsum, _symmetrize_vxc(vmat, grids)
+
+    def nr_uks_vxc(self, mol, grids, x_id, c_id, dms, relativity=0, hermi=1,
+                   max_memory=2000, verbose=None, mo_coeff=None, mo_occ=None):
+        '''Spin-polarized XC potential for the alpha and beta density
+        matrices dms = (dm_a, dm_b).  The AO values of each grid block are
+        evaluated once for both spins.  mo_coeff = (mo_a, mo_b) and
+        mo_occ = (occ_a, occ_b) can be given as in :meth:`nr_vxc`.
+
+        Returns:
+            nelec = (nelec_a, nelec_b), XC energy and the XC potential matrices
+            (vxc_a, vxc_b)
+        '''
+        dm_a, dm_b = dms
+        grids = select_grids(grids, dms)
+        nao = dm_a.shape[0]
+        ngrids = len(grids.weights)
+        blksize = max(int(max_memory/6*1e6/8/nao)//BLKSIZE, 1) * BLKSIZE
+        blksize = _thread_blksize(min(blksize, ngrids), ngrids, self.nthreads)
+        isgga = not (pyscf.dft.vxc._is_lda(x_id) and pyscf.dft.vxc._is_lda(c_id))
+        if mo_coeff is None:
+            factors_a = _get_factors(dm_a)
+            factors_b = _get_factors(dm_b)
+        else:
+            factors_a = _get_factors(dm_a, mo_coeff[0], mo_occ[0])
+            factors_b = _get_factors(dm_b, mo_coeff[1], mo_occ[1])
+        def kernel(ip0, ip1, ao, non0tab):
+            vmat = numpy.empty((2,nao,nao))
+            weight = grids.weights[ip0:ip1]
+            rho_a = eval_rho(mol, ao, dm_a, non0tab=non0tab, isgga=isgga,
+                             factors=factors_a)
+            rho_b = eval_rho(mol, ao, dm_b, non0tab=non0tab, isgga=isgga,
+                             factors=factors_b)
+            if not isgga:
+                sigma = numpy.zeros((3,ip1-ip0))
+                exc, vrho, vsigma = eval_xc(x_id, c_id, (rho_a, rho_b), sigma,
+                                            1, relativity, verbose)
+                den_a = rho_a * weight
+                den_b = rho_b * weight
+                vmat[0] = eval_mat(mol, ao, weight, rho_a, vrho[0],
+                                   non0tab=non0tab, verbose=verbose, spin=1)
+                vmat[1] = eval_mat(mol, ao, weight, rho_b, vrho[1],
+                                   non0tab=non0tab, verbose=verbose, spin=1)
+            else:
+                sigma = numpy.empty((3,ip1-ip0))
+                sigma[0] = numpy.einsum('ip,ip->p', rho_a[1:], rho_a[1:])
+                sigma[1] = numpy.einsum('ip,ip->p', rho_a[1:], rho_b[1:])
+                sigma[2] = numpy.einsum('ip,ip->p', rho_b[1:], rho_b[1:])
+                exc, vrho, vsigma = eval_xc(x_id, c_id, (rho_a[0], rho_b[0]),
+                                            sigma, 1, relativity, verbose)
+                den_a = rho_a[0] * weight
+                den_b = rho_b[0] * weight
+                vmat[0] = eval_mat(mol, ao, weight, (rho_a, rho_b), vrho[0],
+                                   (vsigma[0], vsigma[1]), non0tab=non0tab,
+                                   isgga=isgga, verbose=verbose, spin=1)
+                vmat[1] = eval_mat(mol, ao, weight, (rho_b, rho_a), vrho[1],
+                                   (vsigma[2], vsigma[1]), non0tab=non0tab,
+                                   isgga=isgga, verbose=verbose, spin=1)
+            nelec = numpy.array((den_a.sum(), den_b.sum()))
+            return nelec, ((den_a+den_b)*exc).sum(), vmat
+        nelec, excsum, vmat = self.block_reduce(mol, grids, nao, isgga,
+                                                blksize, kernel,
+                                                (numpy.zeros(2), 0,
+                                                 numpy.zeros((2,nao,nao))))
+        return nelec, excsum, _symmetrize_vxc(vmat, grids)
+
+    def nr_fxc(self, mol, grids, x_id, c_id, dm0, dms, relativity=0, hermi=1,
+               max_memory=2000, verbose=None, mo_coeff=None, mo_occ=None):
+        '''Contract the XC kernel of the closed-shell ground state density
+        dm0 with the trial density matrices dms.  rho, vxc and fxc are
+        evaluated once per grid block, and all trial densities are contracted
+        together with the AO values of the block.  mo_coeff and mo_occ of
+        dm0 can be given as in :meth:`nr_vxc`.  The response densities are
+        in general not totally symmetric.  They are integrated on the grids
+        without the symmetry reduction unless dm0 and all dms are totally
+        symmetric.
+
+        Returns:
+            The first order XC potential matrices, one for each matrix in dms
+        '''
+        dms = numpy.asarray(dms)
+        if dms.ndim == 2:
+            return self.nr_fxc(mol, grids, x_id, c_id, dm0, dms[None],
+                               relativity, hermi, max_memory, verbose,
+                               mo_coeff, mo_occ)[0]
+        nset, nao = dms.shape[:2]
+# Only the symmetric part of dm contributes to the density
+        if hermi != 1:
+            dms = (dms + dms.transpose(0,2,1)) * .5
+        grids = select_grids(grids, numpy.vstack((dm0[None], dms)))
+        dmcat = numpy.asarray(numpy.hstack(dms), order='C')
+        ngrids = len(grids.weights)
+        blksize = int(max_memory*1e6/8/(nao*(4+nset*6)))
+        blksize = min(max(blksize//BLKSIZE, 1) * BLKSIZE, ngrids)
+        blksize = _thread_blksize(blksize, ngrids, self.nthreads)
+        isgga = not (pyscf.dft.vxc._is_lda(x_id) and pyscf.dft.vxc._is_lda(c_id))
+        factors = _get_factors(dm0, mo_coeff, mo_occ)
+        def kernel(ip0, ip1, ao, non0tab):
+            weight = grids.weights[ip0:ip1]
+            ng = ip1 - ip0
+            rho = eval_rho(mol, ao, dm0, non0tab=non0tab, isgga=isgga,
+                           factors=factors)
+            if not isgga:
+                v2rho2 = eval_fxc(x_id, c_id, rho, rho, 0, relativity,
+                                  verbose)[0]
+                c0 = pyscf.lib.dot(ao, dmcat).reshape(ng,nset,nao)
+                rho1 = numpy.einsum('pki,pi->kp', c0, ao)
+# *.5 because of mat + mat.T
+                wv = rho1 * (.5 * weight * v2rho2)
+                aow = numpy.einsum('pi,kp->pki', ao, wv)
+                ao0 = ao
+            else:
+                sigma = numpy.einsum('ip,ip->p', rho[1:], rho[1:])
+                vsigma = eval_xc(x_id, c_id, rho[0], sigma, 0, relativity,
+                                 verbose)[2]
+                v2rho2, v2rhosigma, v2sigma2 = \
+                        eval_fxc(x_id, c_id, rho[0], sigma, 0, relativity,
+                                 verbose)
+                c0 = pyscf.lib.dot(ao[0], dmcat).reshape(ng,nset,nao)
+                rho1 = numpy.empty((nset,4,ng))
+                rho1[:,0] = numpy.einsum('pki,pi->kp', c0, ao[0])
+                for i in range(1, 4):
+                    rho1[:,i] = numpy.einsum('pki,pi->kp', c0, ao[i]) * 2
+                sigma1 = numpy.einsum('xp,kxp->kp', rho[1:], rho1[:,1:]) * 2
+                wv = numpy.empty((nset,4,ng))
+                wv[:,0] = (v2rho2*rho1[:,0] + v2rhosigma*sigma1) * (.5*weight)
+                wv[:,1:] = numpy.einsum('kp,xp->kxp', (v2rhosigma*rho1[:,0] +
+                                                       v2sigma2*sigma1)*weight,
+                                        rho[1:]) * 2
+                wv[:,1:] += rho1[:,1:] * (weight * vsigma * 2)
+                aow = numpy.einsum('npi,knp->pki', ao, wv)
+                ao0 = ao[0]
+            c0 = rho1 = wv = None
+            mat = pyscf.lib.dot(ao0.T, aow.reshape(ng,nset*nao))
+            mat = mat.reshape(nao,nset,nao).transpose(1,0,2)
+            return (mat + mat.transpose(0,2,1),)
+        vmat = self.block_reduce(mol, grids, nao, isgga, blksize, kernel,
+                                 (numpy.zeros((nset,nao,nao)),))[0]
+        return _symmetrize_vxc(vmat, grids)
+
+def _grids_non0tab(grids, blksize):
+# The screening table precomputed by grids can be used if the blocks are
+# aligned to BLKSIZE
+    ngrids = len(grids.weights)
+    grids_non0tab = getattr(grids, 'non0tab', None)
+    if (grids_non0tab is None or
+        (blksize % BLKSIZE != 0 and blksize < ngrids) or
+        len(grids_non0tab) != (ngrids+BLKSIZE-1)//BLKSIZE):
+        grids_non0tab = None
+    return grids_non0tab
+
+def _thread_blksize(blksize, ngrids, nthreads):
+# Split the grids into a few blocks for each thread
+    if nthreads > 1:
+        n = (ngrids + nthreads*4 - 1) // (nthreads*4)
+        blksize = min(blksize, max((n+BLKSIZE-1)//BLKSIZE, 1) * BLKSIZE)
+    return blksize
+
+def _accumulate(out, x):
+    if out is None:
+        return list(x)
+    for i, v in enumerate(x):
+        out[i] += v
+    return out
+
+class _AOCache(object):
+    '''AO values and non0tab of the grid blocks.  The blocks are held in memory
+    until max_memory (MB) is used up.  The following blocks are saved in a
+    memory-mapped scratch file in tmpdir if spill is set, otherwise they are
+    not cached.
+    '''
+    def __init__(self, key, coords, max_memory, spill=True, tmpdir=None,
+                 log=None):
+        self.key = key
+        self.coords = coords
+        self.max_memory = max_memory
+        self.spill = spill
+        self.tmpdir = tmpdir
+        self.log = log
+        self.blocks = {}
+        self.mem = 0
+        self._swapfile = None
+        self._swap = None
+        self._swap_off = 0
+
+    def put(self, ip0, ao, non0tab, nleft):
+        '''nleft is the number of AO values of the rest blocks (including this
+        block), which is used to allocate the scratch file'''
+        non0tab = numpy.array(non0tab[:(ao.shape[-2]+BLKSIZE-1)//BLKSIZE])
+        if self.mem + ao.nbytes/1e6 <= self.max_memory:
+            self.blocks[ip0] = (ao, non0tab)
+            self.mem += ao.nbytes/1e6
+        elif self.spill:
+            if self._swap is None:
+                self._swapfile = tempfile.NamedTemporaryFile(dir=self.tmpdir)
+                self._swap = numpy.memmap(self._swapfile.name, dtype=ao.dtype,
+                                          mode='w+', shape=(nleft,))
+                if self.log is not None:
+                    self.log.info('AO values cache: %.8g MB in memory, '
+                                  '%.8g MB in scratch file %s', self.mem,
+                                  self._swap.nbytes/1e6, self._swapfile.name)
+            p0 = self._swap_off
+            p1 = p0 + ao.size
+            buf = self._swap[p0:p1].reshape(ao.shape)
+            buf[:] = ao
+            self._swap_off = p1
+            self.blocks[ip0] = (buf, non0tab)
+        return non0tab
 
-            nelec += den.sum()
-            excsum += (den*exc).sum()
-            vmat += eval_mat(mol, ao, weight, rho, vrho, vsigma, isgga=isgga,
-                             non0tab=self.non0tab, verbose=verbose)
-        return nelec, excsum, vmat
+    def close(self):
+        '''Release the cached blocks and remove the scratch file'''
+        self.blocks = {}
+        self.mem = 0
+        self._swap = None
+        self._swap_off = 0
+        if self._swapfile is not None:
+            self._swapfile.close()
+            self._swapfile = None
 
 def prange(start, end, step):
     for i in range(start, end, step):
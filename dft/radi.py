@@ -155,7 +155,10 @@ def becke_atomic_radii_adjust(mol, atomic_radii):
     a = .25 * (rr.T - rr)
     a[a<-.5] = -.5
     a[a>0.5] = 0.5
-    return lambda i,j,g: g + a[i,j]*(1-g**2)
+    fadjust = lambda i,j,g: g + a[i,j]*(1-g**2)
+# The coefficients are used by the C code of gen_grid.gen_partition
+    fadjust.a = a
+    return fadjust
 
 def treutler_atomic_radii_adjust(mol, atomic_radii):
     '''Treutler atomic radii adjust function: JCP, 102, 346'''
@@ -171,7 +174,10 @@ def treutler_atomic_radii_adjust(mol, atomic_radii):
     a = .25 * (rr.T - rr)
     a[a<-.5] = -.5
     a[a>0.5] = 0.5
-    return lambda i,j,g: g + a[i,j]*(1-g**2)
+    fadjust = lambda i,j,g: g + a[i,j]*(1-g**2)
+# The coefficients are used by the C code of gen_grid.gen_partition
+    fadjust.a = a
+    return fadjust
 
 def _inter_distance(mol):
 # see gto.mole.energy_nuc
@@ -8,6 +8,8 @@ Non-relativistic Kohn-Sham
 '''
 
 import time
+import copy
+from functools import reduce
 import numpy
 import pyscf.lib
 import pyscf.lib.logger as log
@@ -19,7 +21,17 @@ from pyscf.dft import numint
 
 
 class RKS(pyscf.scf.hf.RHF):
-    ''' Restricted Kohn-Sham '''
+    ''' Restricted Kohn-Sham
+
+    Attributes for the grid schedule:
+        coarse_grids_level : int
+            If given, the SCF iterations start on the grids of this level.
+            The grids are switched to self.grids when the DIIS error
+            |FDS-SDF| is smaller than coarse_grids_tol.  The final energy is
+            always computed on self.grids.  Default is None (no schedule).
+        coarse_grids_tol : float
+            DIIS error to switch from the coarse grids to self.grids
+    '''
     def __init__(self, mol):
         pyscf.scf.hf.RHF.__init__(self, mol)
         self._ecoul = 0
@@ -27,11 +39,19 @@ class RKS(pyscf.scf.hf.RHF):
         self.xc = 'LDA,VWN'
         self.grids = gen_grid.Grids(mol)
         self._numint = numint._NumInt()
-        self._keys = self._keys.union(['xc', 'grids'])
+        self._dm_mo = None
+        self.coarse_grids_level = None
+        self.coarse_grids_tol = 1e-3
+        self._fine_grids = None
+        self._keys = self._keys.union(['xc', 'grids', 'coarse_grids_level',
+                                       'coarse_grids_tol'])
 
     def dump_flags(self):
         pyscf.scf.hf.RHF.dump_flags(self)
         log.info(self, 'XC functionals = %s', self.xc)
+        if self.coarse_grids_level is not None:
+            log.info(self, 'start on grids level %d until DIIS error < %g',
+                     self.coarse_grids_level, self.coarse_grids_tol)
         try:
             log.info(self, 'DFT grids')
             self.grids.dump_flags()
@@ -50,26 +70,89 @@ class RKS(pyscf.scf.hf.RHF):
         #                              dm, spin=1, relativity=0)
         #n, self._exc, vx = numint.nr_vxc(mol, self.grids, x_code, c_code,
         #                                 dm, spin=mol.spin, relativity=0)
+        mo_coeff, mo_occ = self._mo_of_dm(dm)
         if self._numint is None:
             n, self._exc, vx = numint.nr_vxc(mol, self.grids, x_code, c_code,
-                                             dm, spin=mol.spin, relativity=0)
+                                             dm, spin=mol.spin, relativity=0,
+                                             mo_coeff=mo_coeff, mo_occ=mo_occ)
         else:
             n, self._exc, vx = \
                     self._numint.nr_vxc(mol, self.grids, x_code, c_code,
-                                        dm, spin=mol.spin, relativity=0)
+                                        dm, spin=mol.spin, relativity=0,
+                                        mo_coeff=mo_coeff, mo_occ=mo_occ)
         log.debug(self, 'nelec by numeric integration = %s', n)
         t0 = log.timer(self, 'vxc', *t0)
 
-        vj, vk = self.get_jk(mol, dm, hermi)
+        hyb = vxc.hybrid_coeff(x_code, spin=1)
+        if abs(hyb) > 1e-10:
+            vj, vk = self.get_jk(mol, dm, hermi)
+        else:
+# K is not needed by the pure functionals
+            vj = self.get_j(mol, dm, hermi)
         self._ecoul = numpy.einsum('ij,ji', dm, vj) * .5
 
-        hyb = vxc.hybrid_coeff(x_code, spin=1)
         if abs(hyb) > 1e-10:
             vk = vk * hyb * .5
             self._exc -= numpy.einsum('ij,ji', dm, vk) * .5
             vx -= vk
         return vj + vx
 
+    def scf(self, dm0=None):
+        if self.coarse_grids_level is None:
+            return pyscf.scf.hf.RHF.scf(self, dm0)
+
+        self._fine_grids = self.grids
+        self.grids = copy.copy(self.grids)
+        self.grids.level = self.coarse_grids_level
+        self.grids.coords = self.grids.weights = self.grids.non0tab = None
+        try:
+            pyscf.scf.hf.RHF.scf(self, dm0)
+            if self._fine_grids is not None:
+# SCF converged before the DIIS error reached coarse_grids_tol.  Continue on
+# the fine grids
+                self._switch_to_fine_grids()
+                pyscf.scf.hf.RHF.scf(self, self.make_rdm1())
+        finally:
+            if self._fine_grids is not None:
+                self._switch_to_fine_grids()
+        return self.hf_energy
+
+    def get_fock_(self, h1e, s1e, vhf, dm, cycle=-1, adiis=None):
+        if self._fine_grids is not None and cycle >= 0:
+            f = h1e + vhf
+            sdf = reduce(numpy.dot, (s1e, dm, f))
+            err = numpy.linalg.norm(sdf.T.conj() - sdf)
+            if err < self.coarse_grids_tol:
+                log.info(self, 'DIIS error = %g, switch to grids level %d',
+                         err, self._fine_grids.level)
+                self._switch_to_fine_grids()
+# The Fock matrices of the coarse grids should not be extrapolated
+                if hasattr(adiis, 'clear_diis_space'):
+                    adiis.clear_diis_space()
+        return pyscf.scf.hf.RHF.get_fock_(self, h1e, s1e, vhf, dm, cycle,
+                                          adiis)
+
+    def _switch_to_fine_grids(self):
+        self.grids = self._fine_grids
+        self._fine_grids = None
+        if self._numint is not None:
+            self._numint.clear_cache()
+
+    def make_rdm1(self, mo_coeff=None, mo_occ=None):
+        if mo_coeff is None: mo_coeff = self.mo_coeff
+        if mo_occ is None: mo_occ = self.mo_occ
+        dm = pyscf.scf.hf.RHF.make_rdm1(self, mo_coeff, mo_occ)
+# Keep the orbitals, so that get_veff evaluates the density on grids from the
+# occupied orbitals instead of diagonalizing dm
+        self._dm_mo = (dm, mo_coeff, mo_occ)
+        return dm
+
+    def _mo_of_dm(self, dm):
+        if self._dm_mo is not None and self._dm_mo[0] is dm:
+            return self._dm_mo[1:]
+        else:
+            return None, None
+
     def energy_elec(self, dm, h1e=None, vhf=None):
         if h1e is None:
             h1e = mf.get_hcore()
@@ -6,6 +6,7 @@ from pyscf import gto
 from pyscf import dft
 from pyscf.dft import gen_grid
 from pyscf.dft import radi
+from pyscf.dft import numint
 
 h2o = gto.Mole()
 h2o.verbose = 0
@@ -62,6 +63,106 @@ class KnowValues(unittest.TestCase):
         self.assertAlmostEqual(numpy.linalg.norm(coord), 151.01253616288849, 9)
         self.assertAlmostEqual(numpy.linalg.norm(weight), 586.59843503169827, 9)
 
+    def test_gen_partition(self):
+        atom_grids_tab = gen_grid.gen_atomic_grids(h2o, level=2)
+        adjust = radi.treutler_atomic_radii_adjust(h2o, radi.BRAGG_RADII)
+        adjust_py = lambda i,j,g: adjust(i, j, g)
+        for scheme in (gen_grid.original_becke, gen_grid.stratmann):
+            scheme_py = lambda g: scheme(g)
+            for f, f_py in ((None, None), (adjust, adjust_py)):
+                coord0, weight0 = gen_grid.gen_partition(h2o, atom_grids_tab,
+                                                         f, scheme)
+                coord1, weight1 = gen_grid.gen_partition(h2o, atom_grids_tab,
+                                                         f_py, scheme_py)
+                self.assertAlmostEqual(abs(coord0-coord1).max(), 0, 12)
+                self.assertAlmostEqual(abs(weight0-weight1).max(), 0, 12)
+
+    def test_sort_grids(self):
+        grid = gen_grid.Grids(h2o)
+        coord0, weight0 = grid.setup_grids()
+        grid.weight_cutoff = 1e-15
+        grid.sort_grids = True
+        coord1, weight1 = grid.setup_grids()
+        self.assertTrue(len(weight1) <= len(weight0))
+        self.assertAlmostEqual(weight0.sum(), weight1.sum(), 9)
+        self.assertAlmostEqual(numpy.dot(coord0[:,2], weight0),
+                               numpy.dot(coord1[:,2], weight1), 9)
+        self.assertEqual(grid.non0tab.shape,
+                         ((len(weight1)+numint.BLKSIZE-1)//numint.BLKSIZE,
+                          h2o.nbas))
+
+        idx = gen_grid.arg_group_grids(coord0)
+        self.assertEqual(sorted(idx), list(range(len(weight0))))
+
+    def test_grids_cache(self):
+        tab1 = gen_grid.gen_atomic_grids(h2o, level=1)
+        tab2 = gen_grid.gen_atomic_grids(h2o, level=1)
+        self.assertTrue(tab1['O'][0] is tab2['O'][0])
+
+        import os
+        import shutil
+        import tempfile
+        import pyscf.lib.parameters
+        cachedir = tempfile.mkdtemp()
+        pyscf.lib.parameters.INTCACHE_DIR = cachedir
+        try:
+            coord0, weight0 = gen_grid.Grids(h2o).setup_grids()
+            self.assertEqual(len(os.listdir(cachedir)), 1)
+            coord1, weight1 = gen_grid.Grids(h2o).setup_grids()
+            self.assertEqual(len(os.listdir(cachedir)), 1)
+            self.assertAlmostEqual(abs(coord0-coord1).max(), 0, 12)
+            self.assertAlmostEqual(abs(weight0-weight1).max(), 0, 12)
+        finally:
+            pyscf.lib.parameters.INTCACHE_DIR = None
+            shutil.rmtree(cachedir)
+
+    def test_symmetry_reduce(self):
+        mol = gto.M(atom=h2o.atom, basis='6-31g', symmetry=True, verbose=0,
+                    grids={"H": (20, 110), "O": (20, 110)})
+        grid = gen_grid.Grids(mol)
+        grid.symmetry = False
+        coord0, weight0 = grid.setup_grids()
+        grid.symmetry = True
+        coord1, weight1 = grid.setup_grids()
+        self.assertTrue(len(weight1) < len(weight0)//2)
+        f = lambda c: numpy.exp(-numpy.einsum('pi,pi->p', c, c))
+        self.assertAlmostEqual(numpy.dot(f(coord0), weight0),
+                               numpy.dot(f(coord1), weight1), 9)
+
+        self.assertAlmostEqual(weight0.sum(), weight1.sum(), 9)
+
+        mf = dft.rks.RKS(mol)
+        self.assertFalse(mf.grids.symmetry)
+        e0 = mf.scf()
+        mf = dft.rks.RKS(mol)
+        mf.grids.symmetry = True
+        e1 = mf.scf()
+        self.assertTrue(mf.grids.symm_orb is not None)
+        self.assertAlmostEqual(e0, e1, 8)
+
+    def test_symmetry_broken_dm(self):
+        mol = gto.M(atom=h2o.atom, basis='6-31g', symmetry=True, verbose=0,
+                    grids={"H": (20, 110), "O": (20, 110)})
+        grid = gen_grid.Grids(mol)
+        grid.symmetry = True
+        grid.setup_grids()
+        full = grid.unreduced()
+        self.assertTrue(full.symm_orb is None)
+        self.assertTrue(len(full.weights) > len(grid.weights))
+        ni = numint._NumInt()
+        numpy.random.seed(2)
+        nao = mol.nao_nr()
+        dm = numpy.random.random((nao,nao))
+        dm = dm + dm.T
+        self.assertTrue(numint.select_grids(grid, dm) is full)
+        x_id, c_id = dft.vxc.parse_xc_name('b88,lyp')
+        n0, e0, v0 = ni.nr_vxc(mol, full, x_id, c_id, dm)
+        n1, e1, v1 = ni.nr_vxc(mol, grid, x_id, c_id, dm)
+        self.assertAlmostEqual(e0, e1, 12)
+        self.assertAlmostEqual(abs(v0-v1).max(), 0, 12)
+        dm = numint.symmetrize_mat(dm, mol.symm_orb)
+        self.assertTrue(numint.select_grids(grid, dm) is grid)
+
 
 if __name__ == "__main__":
     print("Test Grids")
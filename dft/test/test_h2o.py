@@ -1,8 +1,13 @@
 #!/usr/bin/env python
 
+import os
 import unittest
+import tempfile
+import numpy
+import scipy.linalg
 from pyscf import gto
 from pyscf import lib
+from pyscf import scf
 from pyscf import dft
 
 h2o = gto.Mole()
@@ -19,6 +24,11 @@ h2o.basis = {"H": '6-31g',
              "O": '6-31g',}
 h2o.build()
 
+h2o_plus = h2o.copy()
+h2o_plus.charge = 1
+h2o_plus.spin = 1
+h2o_plus.build(False, False)
+
 
 class KnowValues(unittest.TestCase):
     def test_nr_lda(self):
@@ -62,6 +72,160 @@ class KnowValues(unittest.TestCase):
         method.direct_scf = False
         self.assertAlmostEqual(method.scf(), -76.384928891413438, 9)
 
+    def test_nr_ao_cache(self):
+        method = dft.RKS(h2o)
+        method.prune_scheme = dft.gen_grid.treutler_prune
+        method.xc = 'pw91, pw91'
+        self.assertEqual(method._numint.max_cache_memory, 0)
+        method._numint.max_cache_memory = 1e-3  # most blocks in scratch file
+        tmpdir = tempfile.mkdtemp()
+        method._numint.tmpdir = tmpdir
+        self.assertAlmostEqual(method.scf(), -76.355310330095563, 9)
+        self.assertTrue(method._numint._ao_cache._swap is not None)
+        self.assertEqual(len(os.listdir(tmpdir)), 1)
+        method._numint.clear_cache()
+        self.assertEqual(len(os.listdir(tmpdir)), 0)
+        os.rmdir(tmpdir)
+        method._numint.max_cache_memory = 0
+        self.assertAlmostEqual(method.scf(), -76.355310330095563, 9)
+        self.assertTrue(method._numint._ao_cache is None)
+
+    def test_nr_threads(self):
+        method = dft.RKS(h2o)
+        method.prune_scheme = dft.gen_grid.treutler_prune
+        method.xc = 'b88, vwn'
+        method._numint.nthreads = 4
+        self.assertAlmostEqual(method.scf(), -76.690247578608236, 9)
+        dm = method.make_rdm1()
+        ni = dft.numint._NumInt()
+        x_id, c_id = dft.vxc.parse_xc_name(method.xc)
+        r0 = ni.nr_vxc(h2o, method.grids, x_id, c_id, dm)
+        ni.nthreads = 4
+        r1 = ni.nr_vxc(h2o, method.grids, x_id, c_id, dm)
+        self.assertAlmostEqual(r0[1], r1[1], 9)
+        self.assertAlmostEqual(abs(r0[2]-r1[2]).max(), 0, 9)
+
+        grids = dft.gen_grid.Grids(h2o)
+        grids.coords = numpy.zeros((0,3))
+        grids.weights = numpy.zeros(0)
+        for nthreads in (1, 4):
+            ni.nthreads = nthreads
+            nelec, exc, vmat = ni.nr_vxc(h2o, grids, x_id, c_id, dm)
+            self.assertEqual(nelec, 0)
+            self.assertEqual(vmat.shape, dm.shape)
+            self.assertAlmostEqual(abs(vmat).max(), 0, 12)
+
+    def test_coarse_grids(self):
+        method = dft.RKS(h2o)
+        method.prune_scheme = dft.gen_grid.treutler_prune
+        method.xc = 'b3lyp'
+        method.coarse_grids_level = 0
+        self.assertAlmostEqual(method.scf(), -76.384928891413438, 8)
+        self.assertEqual(method.grids.level, 3)
+        method.coarse_grids_tol = 1e-12  # converge on coarse grids first
+        self.assertAlmostEqual(method.scf(), -76.384928891413438, 8)
+
+    def test_nr_uks_lda(self):
+        method = dft.UKS(h2o)
+        method.xc = 'lda, vwn_rpa'
+        self.assertAlmostEqual(method.scf(), -76.01330948329084, 9)
+
+    def test_nr_uks_b3lyp(self):
+        method = dft.UKS(h2o)
+        method.xc = 'b3lyp'
+        self.assertAlmostEqual(method.scf(), -76.384928891413438, 9)
+
+    def test_nr_uks_lda_open_shell(self):
+        method = dft.UKS(h2o_plus)
+        method.xc = 'lda, vwn_rpa'
+        self.assertAlmostEqual(method.scf(), -75.52678461072233, 8)
+
+    def test_nr_uks_b3lyp_open_shell(self):
+        method = dft.UKS(h2o_plus)
+        method.xc = 'b3lyp'
+        self.assertAlmostEqual(method.scf(), -75.92730401049005, 8)
+
+    def test_nr_uks_vxc_finite_diff(self):
+        grids = dft.gen_grid.Grids(h2o_plus)
+        grids.setup_grids()
+        h1e = scf.hf.get_hcore(h2o_plus)
+        s1e = scf.hf.get_ovlp(h2o_plus)
+        c = scipy.linalg.eigh(h1e, s1e)[1]
+        dm_a = numpy.dot(c[:,:5], c[:,:5].T)
+        dm_b = numpy.dot(c[:,:4], c[:,:4].T)
+# Perturb in the occupied space so that rho stays positive on all grids
+        numpy.random.seed(1)
+        x = numpy.random.random((4,4))
+        ddm = numpy.dot(c[:,:4], numpy.dot(x+x.T, c[:,:4].T))
+        step = 1e-4
+        for xc in ('lda, vwn_rpa', 'b88, lyp'):
+            x_id, c_id = dft.vxc.parse_xc_name(xc)
+            nelec, exc, vxc = dft.numint.nr_uks_vxc(h2o_plus, grids, x_id,
+                                                    c_id, (dm_a, dm_b))
+            self.assertAlmostEqual(nelec[0], 5, 4)
+            self.assertAlmostEqual(nelec[1], 4, 4)
+            for s in range(2):
+                dm1 = [dm_a, dm_b]
+                dm1[s] = dm1[s] + ddm * step
+                e1 = dft.numint.nr_uks_vxc(h2o_plus, grids, x_id, c_id, dm1)[1]
+                dm1[s] = dm1[s] - ddm * step * 2
+                e0 = dft.numint.nr_uks_vxc(h2o_plus, grids, x_id, c_id, dm1)[1]
+                self.assertAlmostEqual((e1-e0)/(step*2),
+                                       numpy.einsum('ij,ij', vxc[s], ddm), 6)
+
+    def test_eval_rho2(self):
+        numpy.random.seed(1)
+        nao = h2o.nao_nr()
+        coords = numpy.random.random((500,3)) * 2
+        ao = dft.numint.eval_ao(h2o, coords, isgga=True)[0]
+        mo_coeff = numpy.random.random((nao,nao))
+        mo_occ = numpy.zeros(nao)
+        mo_occ[:5] = 2
+        dm = numpy.dot(mo_coeff*mo_occ, mo_coeff.T)
+        rho0 = dft.numint.eval_rho(h2o, ao, dm, isgga=True)
+        rho1 = dft.numint.eval_rho2(h2o, ao, mo_coeff, mo_occ, isgga=True)
+        self.assertAlmostEqual(abs(rho0-rho1).max(), 0, 9)
+
+    def test_nr_fxc(self):
+        numpy.random.seed(1)
+        nao = h2o.nao_nr()
+        mf = dft.RKS(h2o)
+        mf.grids.setup_grids()
+        dm0 = mf.init_guess_by_minao()
+        dm1 = numpy.random.random((2,nao,nao)) * .01
+        dm1 = dm1 + dm1.transpose(0,2,1)
+        ni = dft.numint._NumInt()
+        for xc in ('lda,vwn', 'b88,lyp'):
+            x_id, c_id = dft.vxc.parse_xc_name(xc)
+            v1 = ni.nr_fxc(h2o, mf.grids, x_id, c_id, dm0, dm1)
+            for k in range(2):
+                vp = ni.nr_vxc(h2o, mf.grids, x_id, c_id, dm0+dm1[k]*1e-4)[2]
+                vm = ni.nr_vxc(h2o, mf.grids, x_id, c_id, dm0-dm1[k]*1e-4)[2]
+                self.assertAlmostEqual(abs(v1[k]-(vp-vm)/2e-4).max(), 0, 5)
+
+    def test_nr_fxc_symm(self):
+        mol = gto.M(atom=h2o.atom, basis='6-31g', symmetry=True, verbose=0,
+                    grids={"H": (30, 110), "O": (30, 110)})
+        mf = dft.RKS(mol)
+        mf.grids.symmetry = True
+        mf.grids.setup_grids()
+        self.assertTrue(mf.grids.symm_orb is not None)
+        full = mf.grids.unreduced()
+        dm0 = mf.init_guess_by_minao()
+        numpy.random.seed(1)
+        nao = mol.nao_nr()
+        dm1 = numpy.random.random((2,nao,nao)) * .01
+        dm1 = dm1 + dm1.transpose(0,2,1)
+# dm1[1] is totally symmetric, dm1[0] is not
+        dm1[1] = dft.numint.symmetrize_mat(dm1[1], mol.symm_orb)
+        ni = dft.numint._NumInt()
+        x_id, c_id = dft.vxc.parse_xc_name('b88,lyp')
+        v0 = ni.nr_fxc(mol, full, x_id, c_id, dm0, dm1)
+        v1 = ni.nr_fxc(mol, mf.grids, x_id, c_id, dm0, dm1)
+        self.assertAlmostEqual(abs(v1-v0).max(), 0, 12)
+        v1 = ni.nr_fxc(mol, mf.grids, x_id, c_id, dm0, dm1[1])
+        self.assertAlmostEqual(abs(v1-v0[1]).max(), 0, 7)
+
 
 if __name__ == "__main__":
     print("Full Tests for H2O")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+'''
+Non-relativistic unrestricted Kohn-Sham
+'''
+
+import time
+import numpy
+import pyscf.lib
+import pyscf.lib.logger as log
+import pyscf.scf
+from pyscf.dft import vxc
+from pyscf.dft import gen_grid
+from pyscf.dft import numint
+
+
+class UKS(pyscf.scf.uhf.UHF):
+    ''' Unrestricted Kohn-Sham '''
+    def __init__(self, mol):
+        pyscf.scf.uhf.UHF.__init__(self, mol)
+        self._ecoul = 0
+        self._exc = 0
+        self.xc = 'LDA,VWN'
+        self.grids = gen_grid.Grids(mol)
+        self._numint = numint._NumInt()
+        self._dm_mo = None
+        self._keys = self._keys.union(['xc', 'grids'])
+
+    def dump_flags(self):
+        pyscf.scf.uhf.UHF.dump_flags(self)
+        log.info(self, 'XC functionals = %s', self.xc)
+        try:
+            log.info(self, 'DFT grids')
+            self.grids.dump_flags()
+        except:
+            pass
+
+    def get_veff(self, mol=None, dm=None, dm_last=0, vhf_last=0, hermi=1):
+        '''Coulomb + XC functional for alpha and beta spins'''
+        if mol is None: mol = self.mol
+        if dm is None: dm = self.make_rdm1()
+        t0 = (time.clock(), time.time())
+        if isinstance(dm, numpy.ndarray) and dm.ndim == 2:
+            dm = numpy.array((dm*.5,dm*.5))
+        if self.grids.coords is None:
+            self.grids.setup_grids()
+            t0 = log.timer(self, 'seting up grids', *t0)
+
+        x_code, c_code = vxc.parse_xc_name(self.xc)
+        mo_coeff, mo_occ = self._mo_of_dm(dm)
+        if self._numint is None:
+            n, self._exc, vx = numint.nr_uks_vxc(mol, self.grids, x_code,
+                                                 c_code, dm, relativity=0,
+                                                 mo_coeff=mo_coeff,
+                                                 mo_occ=mo_occ)
+        else:
+            n, self._exc, vx = \
+                    self._numint.nr_uks_vxc(mol, self.grids, x_code, c_code,
+                                            dm, relativity=0,
+                                            mo_coeff=mo_coeff, mo_occ=mo_occ)
+        log.debug(self, 'nelec by numeric integration = %s', n)
+        t0 = log.timer(self, 'vxc', *t0)
+
+        hyb = vxc.hybrid_coeff(x_code, spin=1)
+        if abs(hyb) > 1e-10:
+            vj, vk = self.get_jk(mol, dm, hermi)
+        else:
+# K is not needed by the pure functionals
+            vj = self.get_j(mol, dm, hermi)
+        vj = vj[0] + vj[1]
+        self._ecoul = numpy.einsum('ij,ji', dm[0]+dm[1], vj) * .5
+
+        if abs(hyb) > 1e-10:
+            vk = vk * hyb
+            self._exc -= (numpy.einsum('ij,ji', dm[0], vk[0]) +
+                          numpy.einsum('ij,ji', dm[1], vk[1])) * .5
+            vx -= vk
+        return vj + vx
+
+    def make_rdm1(self, mo_coeff=None, mo_occ=None):
+        if mo_coeff is None: mo_coeff = self.mo_coeff
+        if mo_occ is None: mo_occ = self.mo_occ
+        dm = pyscf.scf.uhf.UHF.make_rdm1(self, mo_coeff, mo_occ)
+# Keep the orbitals, so that get_veff evaluates the density on grids from the
+# occupied orbitals instead of diagonalizing dm
+        self._dm_mo = (dm, mo_coeff, mo_occ)
+        return dm
+
+    def _mo_of_dm(self, dm):
+        if self._dm_mo is not None and self._dm_mo[0] is dm:
+            return self._dm_mo[1:]
+        else:
+            return None, None
+
+    def energy_elec(self, dm=None, h1e=None, vhf=None):
+        if dm is None: dm = self.make_rdm1()
+        if h1e is None:
+            h1e = self.get_hcore()
+        if isinstance(dm, numpy.ndarray) and dm.ndim == 2:
+            dm = numpy.array((dm*.5,dm*.5))
+        e1 = numpy.einsum('ji,ji', h1e.conj(), dm[0]+dm[1]).real
+        tot_e = e1 + self._ecoul + self._exc
+        log.debug(self, 'Ecoul = %s  Exc = %s', self._ecoul, self._exc)
+        return tot_e, self._ecoul+self._exc
+
+
+
+if __name__ == '__main__':
+    from pyscf import gto
+    mol = gto.Mole()
+    mol.verbose = 7
+    mol.output = 'out_uks'
+
+    mol.atom.extend([['O', (0.,0.,0.)], ])
+    mol.basis = {'O': 'cc-pvdz'}
+    mol.spin = 2
+    mol.build()
+
+    m = UKS(mol)
+    m.xc = 'b88,lyp'
+    print(m.scf())
@@ -4,10 +4,18 @@ from pyscf import lib
 from pyscf.scf import diis
 
 class DIIS(diis.DIIS):
+    def __init__(self, dev):
+        diis.DIIS.__init__(self, dev)
+# The error vectors x - v_i all refer to the latest x, they are not reusable
+# in the next iteration.  Cache the overlap matrix of the stored vectors v_i
+# instead, and assemble the error overlap matrix from it
+        self._vec_ovlp = None
+
     def update(self, x):
         self.push_vec(x)
 
         nd = self.get_num_diis_vec()
+        ovlp = self._update_vec_ovlp(nd+1, x.dtype)
         if nd <= self.min_space:
             return x
 
@@ -15,15 +23,10 @@ class DIIS(diis.DIIS):
         H[0,0] = 0
         G = numpy.zeros(nd+1, x.dtype)
         G[0] = 1
-        for i in range(nd):
-            #dti = self.get_err_vec(i)
-            dti = x - self.get_vec(i-1)
-            for j in range(i+1):
-                #dtj = self.get_err_vec(j)
-                dtj = x - self.get_vec(j-1)
-                H[i+1,j+1] = numpy.dot(numpy.array(dti).ravel(), \
-                                       numpy.array(dtj).ravel())
-                H[j+1,i+1] = H[i+1,j+1].conj()
+        # dti = x - self.get_vec(i-1)
+        # H[i+1,j+1] = (x - v_i, x - v_j)
+        xv = ovlp[nd,:nd]
+        H[1:,1:] = ovlp[:nd,:nd] - xv.reshape(-1,1) - xv + ovlp[nd,nd]
 
         try:
             c = numpy.linalg.solve(H, G)
@@ -44,3 +47,23 @@ class DIIS(diis.DIIS):
         for i, ci in enumerate(c[1:]):
             x += self.get_vec(i) * ci
         return x
+
+    def _update_vec_ovlp(self, nvec, dtype):
+        '''Overlap matrix of the nvec vectors in the DIIS space.  The rows and
+        columns of the vectors which were pushed out of the space are dropped.
+        Only the overlaps of the latest vector are computed.
+        '''
+        if self._vec_ovlp is None:
+            nkeep = 0
+        else:
+            nkeep = max(0, min(nvec-1, self._vec_ovlp.shape[0]))
+        ovlp = numpy.empty((nvec,nvec), dtype)
+        if nkeep > 0:
+            ovlp[:nkeep,:nkeep] = self._vec_ovlp[-nkeep:,-nkeep:]
+        for i in range(nkeep, nvec):
+            vi = numpy.asarray(self.get_vec(i-1)).ravel()
+            for j in range(i+1):
+                vj = numpy.asarray(self.get_vec(j-1)).ravel()
+                ovlp[i,j] = ovlp[j,i] = numpy.dot(vi, vj)
+        self._vec_ovlp = ovlp
+        return ovlp
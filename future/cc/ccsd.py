@@ -425,6 +425,10 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
         nocc = self.nocc
         nmo = self.nmo
         nvir = nmo - nocc
+        mem_incore = (nmo**4 + nmo**4) * 8/1e6
+        if self._scf._eri is None or mem_incore > self.max_memory:
+            return _make_eris_outcore(self, self._scf.mo_coeff)
+
         eri1 = pyscf.ao2mo.incore.full(self._scf._eri, self._scf.mo_coeff)
         eri1 = pyscf.ao2mo.restore(1, eri1, nmo)
         eris = lambda:None
@@ -499,6 +503,45 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
             return t1, t2
         return fupdate
 
+def _make_eris_outcore(cc, mo_coeff):
+    '''The MO integrals are generated by the outcore transformation and
+    distributed to the blocks of eris (ij|kl) row by row.  The full (ij|kl)
+    tensor is not stored.'''
+    cput0 = (time.clock(), time.time())
+    log = lib.logger.Logger(cc.stdout, cc.verbose)
+    nocc = cc.nocc
+    nmo = cc.nmo
+    nvir = nmo - nocc
+    eris = lambda:None
+    eris.oOoO = numpy.empty((nocc,nocc,nocc,nocc))
+    eris.ooov = numpy.empty((nocc,nocc,nocc,nvir))
+    eris.oovv = numpy.empty((nocc,nocc,nvir,nvir))
+    eris.oOVv = numpy.empty((nocc,nocc,nvir,nvir))
+    eris.ovvv = numpy.empty((nocc,nvir,nvir*(nvir+1)//2))
+    eris.vvvv = numpy.empty((nvir*(nvir+1)//2,nvir*(nvir+1)//2))
+
+# Each block is (pq|rs) of one p, for all q,r,s
+    blks = pyscf.ao2mo.outcore.general_iter(cc.mol, (mo_coeff,)*4, nmo,
+                                            max_memory=cc.max_memory,
+                                            verbose=log, compact=False)
+    for p, (i0, i1, buf) in enumerate(blks):
+        g = buf.reshape(nmo,nmo,nmo)
+        if p < nocc:
+            eris.oOoO[p] = g[:nocc,:nocc,:nocc].transpose(1,0,2)
+            eris.ooov[p] = g[:nocc,:nocc,nocc:]
+            eris.oovv[p] = g[:nocc,nocc:,nocc:]
+            eris.oOVv[p] = g[nocc:,:nocc,nocc:].transpose(1,2,0)
+            for j in range(nvir):
+                eris.ovvv[p,j] = lib.pack_tril(g[nocc+j,nocc:,nocc:])
+        else:
+            a = p - nocc
+            p0 = a*(a+1)//2
+            for b in range(a+1):
+                eris.vvvv[p0+b] = lib.pack_tril(g[nocc+b,nocc:,nocc:])
+    eris.fock = numpy.diag(cc._scf.mo_energy)
+    log.timer('CCSD integral transformation', *cput0)
+    return eris
+
 # assume nvir > nocc, minimal requirements on memory in loop of update_amps
 def _memory_usage_inloop(nmo, nocc):
     nvir = nmo - nocc
@@ -47,6 +47,15 @@ class KnowValues(unittest.TestCase):
         self.assertAlmostEqual(mcc.ecc, -0.2133432312951, 8)
         self.assertAlmostEqual(abs(mcc.t2).sum(), 5.63970279799556984, 6)
 
+    def test_ao2mo_outcore(self):
+        mcc = cc.ccsd.CC(rhf)
+        eris0 = mcc.ao2mo()
+        mcc.max_memory = 0
+        eris1 = mcc.ao2mo()
+        for key in ('oOoO', 'ooov', 'oovv', 'oOVv', 'ovvv', 'vvvv', 'fock'):
+            self.assertAlmostEqual(abs(getattr(eris0, key) -
+                                       getattr(eris1, key)).max(), 0, 11)
+
 
 if __name__ == "__main__":
     print("Full Tests for H2O")
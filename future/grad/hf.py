@@ -79,7 +79,8 @@ def get_coulomb_hf(mol, dm):
                                's2kl', # ip1_sph has k>=l,
                                ('kl->s1ij', 'kj->s1il'),
                                dm, 3, # xyz, 3 components
-                               mol._atm, mol._bas, mol._env)
+                               mol._atm, mol._bas, mol._env,
+                               _vhf.get_vhfopt(mol, 'cint2e_ip1_sph'))
     return vj - vk*.5
 
 def make_rdm1e(mo_energy, mo_coeff, mo_occ):
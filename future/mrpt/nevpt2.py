@@ -753,7 +753,7 @@ def trans_e1_outcore(mc, mo, max_memory=None, ioblk_size=256, tmpdir=None,
                                 max_memory=max_memory, ioblk_size=ioblk_size,
                                 verbose=log, compact=False)
 
-    fswap = h5py.File(swapfile.name, 'r')
+    fswap = pyscf.ao2mo.outcore.open_swap(swapfile.name)
     klaoblks = len(fswap['0'])
     def load_buf(bfn_id):
         if mol.verbose >= pyscf.lib.logger.DEBUG1:
@@ -88,7 +88,8 @@ def make_h10giao(mol, dm0):
     vj, vk = _vhf.direct_mapdm('cint2e_ig1_sph',  # (g i,j|k,l)
                                'a4ij', ('kl->s1ij', 'kj->s1il'),
                                dm0, 3, # xyz, 3 components
-                               mol._atm, mol._bas, mol._env)
+                               mol._atm, mol._bas, mol._env,
+                               _vhf.get_vhfopt(mol, 'cint2e_ig1_sph'))
 # J = i[(i i|\mu g\nu) + (i gi|\mu \nu)]
 # K = i[(\mu gi|i \nu) + (\mu i|i g\nu)]
 #   = (\mu g i|i \nu) - h.c.   anti-symm because of the factor i
@@ -431,6 +431,7 @@ def copy(mol):
     newmol.atom    = copy.deepcopy(mol.atom)
     newmol.basis   = copy.deepcopy(mol.basis)
     newmol._basis  = copy.deepcopy(mol._basis)
+    newmol._vhfopt_cache = {}
     return newmol
 
 def pack(mol):
@@ -914,6 +915,8 @@ class Mole(object):
         self.irrep_name = None
         self._basis = None
         self._built = False
+# VHFOpt objects shared by the SCF, gradients, response calculations
+        self._vhfopt_cache = {}
         self._keys = set(self.__dict__.keys())
 
     def check_sanity(self, obj):
@@ -6,6 +6,9 @@ from pyscf.lib import parameters
 from pyscf.lib import numpy_helper
 from pyscf.lib import linalg_helper
 from pyscf.lib import logger
+from pyscf.lib import memmap_helper
+from pyscf.lib import intcache
 from pyscf.lib.misc import *
 from pyscf.lib.numpy_helper import *
 from pyscf.lib.linalg_helper import *
+from pyscf.lib.memmap_helper import RingBuffer
@@ -0,0 +1,143 @@
+/*
+ * Author: Qiming Sun <osirpt.sun@gmail.com>
+ *
+ * Becke partition of the molecular grids
+ */
+
+#include <stdlib.h>
+#include <math.h>
+
+#define BECKE           0
+#define STRATMANN       1
+// Stratmann, Scuseria, Frisch. CPL, 257, 213 (1996), comment after eq. 14
+#define STRATMANN_A     .64
+// the cell function is treated as 0 once it is smaller than PCUTOFF
+#define PCUTOFF         1e-15
+
+static double becke_s(double g, int scheme)
+{
+        double ma, ma2;
+        switch (scheme) {
+        case STRATMANN:
+                if (g <= -STRATMANN_A) {
+                        return -1;
+                } else if (g >= STRATMANN_A) {
+                        return 1;
+                } else {
+                        ma = g / STRATMANN_A;
+                        ma2 = ma * ma;
+                        return (1/16.)*(ma*(35 + ma2*(-35 + ma2*(21 - 5*ma2))));
+                }
+        default:
+                g = (3 - g*g) * g * .5;
+                g = (3 - g*g) * g * .5;
+                g = (3 - g*g) * g * .5;
+                return g;
+        }
+}
+
+/*
+ * The cell function factor .5*(1-s(nu_ij)) of atom i due to atom j
+ */
+static double cell_factor(int i, int j, double *dist, double *inv_rab,
+                          double *radii_adjust, int scheme, int natm)
+{
+        double g = (dist[i] - dist[j]) * inv_rab[i*natm+j];
+        if (radii_adjust != NULL) {
+                g += radii_adjust[i*natm+j] * (1 - g*g);
+        }
+        return .5 * (1 - becke_s(g, scheme));
+}
+
+/*
+ * Becke weight factor P_ia/sum_i P_i for the grids of atom ia.
+ * radii_adjust[natm,natm] is the coefficient a_ij of the atomic radii
+ * adjustment nu_ij = mu_ij + a_ij (1-mu_ij^2).  It can be NULL.
+ *
+ * The cell function P_i is accumulated starting from the factor of the
+ * parent atom ia.  The product stops once it is negligible, which skips the
+ * atoms far from the grid point.  For the Stratmann scheme, the grids in the
+ * inner sphere of the parent atom are not partitioned.
+ */
+void VXCgen_grid_partition(double *out, double *coords, int ngrids, int ia,
+                           double *atm_coords, double *radii_adjust,
+                           int scheme, int natm)
+{
+        double *inv_rab = malloc(sizeof(double) * natm*natm);
+        double rmin = 1e200;
+        double dx, dy, dz, r;
+        int i, j;
+        for (i = 0; i < natm; i++) {
+                inv_rab[i*natm+i] = 0;
+                for (j = 0; j < i; j++) {
+                        dx = atm_coords[i*3+0] - atm_coords[j*3+0];
+                        dy = atm_coords[i*3+1] - atm_coords[j*3+1];
+                        dz = atm_coords[i*3+2] - atm_coords[j*3+2];
+                        r = sqrt(dx*dx + dy*dy + dz*dz);
+                        inv_rab[i*natm+j] = 1 / r;
+                        inv_rab[j*natm+i] = 1 / r;
+                }
+        }
+        for (j = 0; j < natm; j++) {
+                if (j != ia) {
+                        rmin = fmin(rmin, 1/inv_rab[ia*natm+j]);
+                }
+        }
+        // Stratmann, eq. 15
+        double rinner = -1;
+        if (scheme == STRATMANN && radii_adjust == NULL) {
+                rinner = .5 * (1 - STRATMANN_A) * rmin;
+        }
+
+#pragma omp parallel default(none) \
+        shared(out, coords, ngrids, ia, atm_coords, radii_adjust, scheme, \
+               natm, inv_rab, rinner) \
+        private(i, j, dx, dy, dz)
+{
+        double *dist = malloc(sizeof(double) * natm);
+        double p, psum;
+        int ig;
+#pragma omp for nowait schedule(static)
+        for (ig = 0; ig < ngrids; ig++) {
+                for (i = 0; i < natm; i++) {
+                        dx = coords[ig*3+0] - atm_coords[i*3+0];
+                        dy = coords[ig*3+1] - atm_coords[i*3+1];
+                        dz = coords[ig*3+2] - atm_coords[i*3+2];
+                        dist[i] = sqrt(dx*dx + dy*dy + dz*dz);
+                }
+                if (dist[ia] < rinner) {
+                        out[ig] = 1;
+                        continue;
+                }
+
+                psum = 0;
+                for (i = 0; i < natm; i++) {
+                        p = 1;
+                        if (i != ia) {
+                                p = cell_factor(i, ia, dist, inv_rab,
+                                                radii_adjust, scheme, natm);
+                        }
+                        for (j = 0; j < natm && p > PCUTOFF; j++) {
+                                if (j != i && j != ia) {
+                                        p *= cell_factor(i, j, dist, inv_rab,
+                                                         radii_adjust, scheme, natm);
+                                }
+                        }
+                        if (p <= PCUTOFF) {
+                                p = 0;
+                        }
+                        if (i == ia) {
+                                out[ig] = p;
+                        }
+                        psum += p;
+                }
+                if (psum > 0) {
+                        out[ig] /= psum;
+                } else {
+                        out[ig] = 0;
+                }
+        }
+        free(dist);
+}
+        free(inv_rab);
+}
@@ -98,6 +98,9 @@ void VXCnr_eval_xc(int x_id, int c_id, int spin, int relativity, int np,
         xc_func_type func_c = {};
         VXCinit_libxc(&func_x, &func_c, x_id, c_id, spin, relativity);
 
+        // spin == 2: rho, vrho are [np,2], sigma, vsigma are [np,3]
+        int nrho = np * spin;
+        int nsigma = (spin == 2) ? np*3 : np;
         int i;
         double *buf = malloc(sizeof(double) * np*6);
         double *vcrho = buf;
@@ -109,7 +112,7 @@ void VXCnr_eval_xc(int x_id, int c_id, int spin, int relativity, int np,
                 // exc is the energy density
                 // note libxc have added exc/ec to vrho/vcrho
                 xc_lda_exc_vxc(&func_x, np, rho, exc, vrho);
-                memset(vsigma, 0, sizeof(double)*np);
+                memset(vsigma, 0, sizeof(double)*nsigma);
                 break;
         case XC_FAMILY_GGA:
         case XC_FAMILY_HYB_GGA:
@@ -130,7 +133,7 @@ void VXCnr_eval_xc(int x_id, int c_id, int spin, int relativity, int np,
                 case XC_FAMILY_GGA:
                         xc_gga_exc_vxc(&func_c, np, rho, sigma, ec,
                                        vcrho, vcsigma);
-                        for (i = 0; i < np; i++) {
+                        for (i = 0; i < nsigma; i++) {
                                 vsigma[i] += vcsigma[i];
                         }
                         break;
@@ -142,6 +145,8 @@ void VXCnr_eval_xc(int x_id, int c_id, int spin, int relativity, int np,
                 }
                 for (i = 0; i < np; i++) {
                         exc[i] += ec[i];
+                }
+                for (i = 0; i < nrho; i++) {
                         vrho[i] += vcrho[i];
                 }
         }
@@ -150,6 +155,69 @@ void VXCnr_eval_xc(int x_id, int c_id, int spin, int relativity, int np,
         VXCdel_libxc(&func_x, &func_c);
 }
 
+/*
+ * Second derivatives of the spin-unpolarized XC functional
+ * (spin == 1).  For LDA, v2rhosigma and v2sigma2 are set to 0.
+ */
+void VXCnr_eval_fxc(int x_id, int c_id, int spin, int relativity, int np,
+                    double *rho, double *sigma,
+                    double *v2rho2, double *v2rhosigma, double *v2sigma2)
+{
+        xc_func_type func_x = {};
+        xc_func_type func_c = {};
+        VXCinit_libxc(&func_x, &func_c, x_id, c_id, spin, relativity);
+
+        int i;
+        double *buf = malloc(sizeof(double) * np*3);
+        double *c2rho2 = buf;
+        double *c2rhosigma = c2rho2 + np;
+        double *c2sigma2 = c2rhosigma + np;
+
+        switch (func_x.info->family) {
+        case XC_FAMILY_LDA:
+                xc_lda_fxc(&func_x, np, rho, v2rho2);
+                memset(v2rhosigma, 0, sizeof(double)*np);
+                memset(v2sigma2, 0, sizeof(double)*np);
+                break;
+        case XC_FAMILY_GGA:
+        case XC_FAMILY_HYB_GGA:
+                xc_gga_fxc(&func_x, np, rho, sigma,
+                           v2rho2, v2rhosigma, v2sigma2);
+                break;
+        default:
+                fprintf(stderr, "X functional %d '%s' is not implmented\n",
+                        func_x.info->number, func_x.info->name);
+                exit(1);
+        }
+
+        if (func_x.info->kind == XC_EXCHANGE) {
+                switch (func_c.info->family) {
+                case XC_FAMILY_LDA:
+                        xc_lda_fxc(&func_c, np, rho, c2rho2);
+                        break;
+                case XC_FAMILY_GGA:
+                        xc_gga_fxc(&func_c, np, rho, sigma,
+                                   c2rho2, c2rhosigma, c2sigma2);
+                        for (i = 0; i < np; i++) {
+                                v2rhosigma[i] += c2rhosigma[i];
+                                v2sigma2[i] += c2sigma2[i];
+                        }
+                        break;
+                default:
+                        fprintf(stderr, "C functional %d '%s' is not implmented\n",
+                                func_c.info->number,
+                                func_c.info->name);
+                        exit(1);
+                }
+                for (i = 0; i < np; i++) {
+                        v2rho2[i] += c2rho2[i];
+                }
+        }
+
+        free(buf);
+        VXCdel_libxc(&func_x, &func_c);
+}
+
 void VXCnr_eval_x(int x_id, int spin, int relativity, int np,
                   double *rho, double *sigma,
                   double *ex, double *vrho, double *vsigma)
@@ -165,7 +233,7 @@ void VXCnr_eval_x(int x_id, int spin, int relativity, int np,
                 // ex is the energy density
                 // note libxc have added ex/ec to vrho/vcrho
                 xc_lda_exc_vxc(&func_x, np, rho, ex, vrho);
-                memset(vsigma, 0, sizeof(double)*np);
+                memset(vsigma, 0, sizeof(double)*((spin == 2) ? np*3 : np));
                 break;
         case XC_FAMILY_GGA:
         case XC_FAMILY_HYB_GGA:
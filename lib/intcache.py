@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+'''
+Persistent cache of AO integrals
+
+The integrals are stored in the directory lib.parameters.INTCACHE_DIR, keyed
+by the fingerprint of mol._atm, mol._bas, mol._env and the kind of integrals.
+The cache is switched off when INTCACHE_DIR is None (the default).  When the
+total size of the cache exceeds lib.parameters.INTCACHE_MAX_SIZE (in MB), the
+least recently used files are removed.  The temporary files of the entries
+which are being written are not removed.
+
+Examples:
+
+>>> pyscf.lib.parameters.INTCACHE_DIR = '/scratch/intcache'
+>>> mf = scf.RHF(mol)
+>>> mf.scf()  # the 8-fold ERIs are computed and saved in /scratch/intcache
+>>> mf = scf.RHF(mol)
+>>> mf.scf()  # the ERIs are loaded from /scratch/intcache
+'''
+
+import os
+import hashlib
+import tempfile
+import numpy
+from pyscf.lib import parameters as param
+
+# Prefix of the files being written.  Keys are hex digests which never start
+# with it.
+TMP_PREFIX = 'tmp'
+
+def fingerprint(mol, *keys):
+    '''SHA1 hash of the molecule and the basis (mol._atm, mol._bas, mol._env)
+    and the additional keys which identify the integrals.
+    '''
+    h = hashlib.sha1()
+    h.update(numpy.asarray(mol._atm, dtype=numpy.int32).tostring())
+    h.update(numpy.asarray(mol._bas, dtype=numpy.int32).tostring())
+    h.update(numpy.asarray(mol._env, dtype=numpy.double).tostring())
+    h.update(str(keys).encode())
+    return h.hexdigest()
+
+
+class IntCache(object):
+    '''Files in cachedir, with LRU eviction under the disk quota max_size (MB)
+    '''
+    def __init__(self, cachedir, max_size=None):
+        self.cachedir = cachedir
+        if max_size is None:
+            max_size = param.INTCACHE_MAX_SIZE
+        self.max_size = max_size
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+
+    def path(self, key, suffix='.npy'):
+        return os.path.join(self.cachedir, key+suffix)
+
+    def load(self, key, mmap_mode=None):
+        '''Return the cached array or None'''
+        fname = self.path(key)
+        try:
+            eri = numpy.load(fname, mmap_mode=mmap_mode)
+        except (IOError, OSError, ValueError):
+            return None
+        self._touch(fname)
+        return eri
+
+    def save(self, key, eri):
+        if not self.evict_(eri.nbytes/1e6):
+            return None
+        fname = self.path(key)
+        tmpfile = tempfile.NamedTemporaryFile(dir=self.cachedir, suffix='.npy',
+                                              prefix=TMP_PREFIX, delete=False)
+        try:
+            numpy.save(tmpfile, eri)
+            tmpfile.close()
+# rename is atomic.  Other processes never see an incomplete file
+            os.rename(tmpfile.name, fname)
+        except (IOError, OSError):
+            tmpfile.close()
+            _remove(tmpfile.name)
+            return None
+        return fname
+
+    def load_file(self, key, suffix='.h5'):
+        '''Return the filename of the cached file or None'''
+        fname = self.path(key, suffix)
+        if os.path.isfile(fname):
+            self._touch(fname)
+            return fname
+        else:
+            return None
+
+    def save_file(self, key, fbuild, size, suffix='.h5'):
+        '''Call fbuild(filename) to write the integrals into the cache
+        directory.  size (MB) is the estimated size of the file.  Return None
+        without calling fbuild if the size exceeds the quota.'''
+        if not self.evict_(size):
+            return None
+        fname = self.path(key, suffix)
+        tmpfile = tempfile.NamedTemporaryFile(dir=self.cachedir, suffix=suffix,
+                                              prefix=TMP_PREFIX, delete=False)
+        tmpfile.close()
+        try:
+            fbuild(tmpfile.name)
+        except BaseException:
+            _remove(tmpfile.name)
+            raise
+        os.rename(tmpfile.name, fname)
+        return fname
+
+    def _touch(self, fname):
+        try:
+            os.utime(fname, None)
+        except OSError:
+            pass
+
+    def evict_(self, reserve=0):
+        '''Remove the least recently used files until the new data of size
+        reserve (MB) can be stored.  Return False if reserve exceeds the
+        quota.  The files being written (see TMP_PREFIX) are kept.'''
+        if reserve > self.max_size:
+            return False
+        files = []
+        size = 0
+        for f in os.listdir(self.cachedir):
+            if f.startswith(TMP_PREFIX):
+                continue
+            fname = os.path.join(self.cachedir, f)
+            try:
+                st = os.stat(fname)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size/1e6, fname))
+            size += st.st_size/1e6
+        files.sort()
+        for mtime, fsize, fname in files:
+            if size + reserve <= self.max_size:
+                break
+            _remove(fname)
+            size -= fsize
+        return True
+
+def _remove(fname):
+    try:
+        os.remove(fname)
+    except OSError:
+        pass
+
+
+def get_cache():
+    '''IntCache of lib.parameters.INTCACHE_DIR, or None if not enabled'''
+    if param.INTCACHE_DIR is None:
+        return None
+    else:
+        return IntCache(param.INTCACHE_DIR, param.INTCACHE_MAX_SIZE)
+
+def load_or_build(key, fbuild, mmap_mode=None):
+    '''Load the integrals from the cache.  If they do not exist, call
+    fbuild() to generate the integrals and store them in the cache.'''
+    cache = get_cache()
+    if cache is None:
+        return fbuild()
+    eri = cache.load(key, mmap_mode)
+    if eri is None:
+        eri = fbuild()
+        cache.save(key, eri)
+    return eri
+
+def load_or_build_file(key, fbuild, size, suffix='.h5'):
+    '''Similar to load_or_build, for the integrals stored in file.  fbuild
+    should take the filename as the argument.  size (MB) is the estimated size
+    of the file.  Return the filename of the integrals, or None if the cache
+    is not enabled or the file is too big for the cache.  The file may be
+    evicted later by other caches which share the directory.  The caller
+    should check that the file still exists before it is used.'''
+    cache = get_cache()
+    if cache is None:
+        return None
+    fname = cache.load_file(key, suffix)
+    if fname is None:
+        fname = cache.save_file(key, fbuild, size, suffix)
+    return fname
@@ -4,12 +4,11 @@
 #
 
 import sys
-import tempfile
 from functools import reduce
 import numpy
 import scipy.linalg
-import h5py
 from pyscf.lib import logger
+from pyscf.lib import memmap_helper
 
 # default max_memory 2000 MB
 
@@ -24,8 +23,8 @@ def davidson(a, x0, precond, tol=1e-14, max_cycle=50, maxspace=12, lindep=1e-16,
     # if trial vectors are held in memory, store as many as possible
     maxspace = max(int((max_memory-1e3)*1e6/x0.nbytes/2), maxspace)
 
-    xs = _TrialXs(x0.nbytes, maxspace, max_memory)
-    ax = _TrialXs(x0.nbytes, maxspace, max_memory)
+    xs = _TrialXs(x0, maxspace, max_memory)
+    ax = _TrialXs(x0, maxspace, max_memory)
     if eig_pick is None:
         eig_pick = lambda w, v: 0
     #e0_hist = []
@@ -67,8 +66,8 @@ def davidson(a, x0, precond, tol=1e-14, max_cycle=50, maxspace=12, lindep=1e-16,
 #        nprev = len(v_prev)
 #        sim = reduce(numpy.dot,(v_prev, ovlp[:nprev,:subspace+1],v[:,index]))
 #        if abs(sim) < .8:
-#            xs = _TrialXs(x0.nbytes, maxspace, max_memory)
-#            ax = _TrialXs(x0.nbytes, maxspace, max_memory)
+#            xs = _TrialXs(x0, maxspace, max_memory)
+#            ax = _TrialXs(x0, maxspace, max_memory)
 #            e = 0
 #            continue
 
@@ -97,8 +96,8 @@ def davidson(a, x0, precond, tol=1e-14, max_cycle=50, maxspace=12, lindep=1e-16,
 # linear dependent which seems reducing the accuracy. Removing all trial
 # vectors and restarting iteration with better initial guess gives better
 # accuracy, though more iterations are required.
-            xs = _TrialXs(x0.nbytes, maxspace, max_memory)
-            ax = _TrialXs(x0.nbytes, maxspace, max_memory)
+            xs = _TrialXs(x0, maxspace, max_memory)
+            ax = _TrialXs(x0, maxspace, max_memory)
             e = 0
         v_prev = v[:,index]
 
@@ -114,37 +113,37 @@ dsyev = davidson
 
 
 class _TrialXs(list):
-    def __init__(self, xbytes, maxspace, max_memory):
-        if xbytes*maxspace*2 > max_memory*1e6:
-            _fd = tempfile.NamedTemporaryFile()
-            self.scr_h5 = h5py.File(_fd.name, 'w')
+    def __init__(self, x0, maxspace, max_memory):
+        if x0.nbytes*maxspace*2 > max_memory*1e6:
+# davidson may hold up to maxspace+2 trial vectors, see the floating size of
+# subspace in davidson
+            self.scr = memmap_helper.RingBuffer(x0.shape, x0.dtype, maxspace+2)
         else:
-            self.scr_h5 = None
+            self.scr = None
 
     def __getitem__(self, n):
-        if self.scr_h5 is None:
+        if self.scr is None:
             return list.__getitem__(self, n)
         else:
-            return self.scr_h5[str(n)]
+            return self.scr[n]
 
     def append(self, x):
-        if self.scr_h5 is None:
+        if self.scr is None:
             list.append(self, x)
         else:
-            n = len(self.scr_h5)
-            self.scr_h5[str(n)] = x
+            self.scr.append(x)
 
     def __setitem__(self, n, x):
-        if self.scr_h5 is None:
+        if self.scr is None:
             list.__setitem__(self, n, x)
         else:
-            self.scr_h5[str(n)] = x
+            self.scr[n] = x
 
     def __len__(self):
-        if self.scr_h5 is None:
+        if self.scr is None:
             return list.__len__(self)
         else:
-            return len(self.scr_h5)
+            return len(self.scr)
 
 # Krylov subspace method
 # ref: J. A. Pople, R. Krishnan, H. B. Schlegel, and J. S. Binkley,
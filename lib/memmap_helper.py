@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+'''
+Out-of-core storage based on numpy.memmap
+'''
+
+import tempfile
+import numpy
+
+
+class RingBuffer(object):
+    '''Store a sequence of vectors of the same shape in a preallocated
+    memory-mapped file.  The file has nslots fixed slots.  When the buffer is
+    full, the next append overwrites the oldest vector.  Item n counts from
+    the oldest vector in the buffer.  Items are returned as views of the
+    memmap, no data are copied.
+
+    Args:
+        shape : tuple
+            The shape of each vector
+        dtype : numpy dtype
+        nslots : int
+            Max number of vectors held in the buffer
+
+    Kwargs:
+        filename : str
+            Memory-mapped file.  If not given, a temporary file is created in
+            dir, which is removed when the buffer is released.
+
+    Examples:
+
+    >>> buf = RingBuffer((4,4), numpy.double, 3)
+    >>> for i in range(5): buf.append(numpy.ones((4,4))*i)
+    >>> len(buf), buf[0][0,0], buf[-1][0,0]
+    (3, 2.0, 4.0)
+    '''
+    def __init__(self, shape, dtype, nslots, filename=None, dir=None):
+        if isinstance(shape, (int, numpy.integer)):
+            shape = (shape,)
+        self.shape = tuple(shape)
+        self.dtype = numpy.dtype(dtype)
+        self.nslots = nslots
+        if filename is None:
+            self._tmpfile = tempfile.NamedTemporaryFile(dir=dir)
+            filename = self._tmpfile.name
+        self.filename = filename
+        self._buf = numpy.memmap(filename, self.dtype, 'w+',
+                                 shape=(nslots,)+self.shape)
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.nslots)
+
+    def _slot(self, n):
+        nvec = len(self)
+        if n < 0:
+            n += nvec
+        if not 0 <= n < nvec:
+            raise IndexError('RingBuffer index %d out of range' % n)
+        return (self._count - nvec + n) % self.nslots
+
+    def __getitem__(self, n):
+        return self._buf[self._slot(n)]
+
+    def __setitem__(self, n, x):
+        self._buf[self._slot(n)] = x
+
+    def append(self, x):
+        self._buf[self._count % self.nslots] = x
+        self._count += 1
+
+    def clear(self):
+        self._count = 0
+
+    def flush(self):
+        self._buf.flush()
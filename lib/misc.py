@@ -9,6 +9,7 @@ import shutil
 import functools
 import math
 import ctypes
+import threading
 import numpy
 
 c_double_p = ctypes.POINTER(ctypes.c_double)
@@ -193,6 +194,35 @@ class omnimethod(object):
     def __get__(self, instance, owner):
         return functools.partial(self.func, instance)
 
+def call_in_background(fn, *args):
+    '''Call fn(*args) in a background thread.  Return a function which waits
+    until fn finishes and returns the result of fn.  The exception raised in
+    fn is re-raised by the returned function.
+
+    Examples:
+
+    >>> wait = call_in_background(numpy.dot, a, b)
+    >>> c = numpy.dot(d, e)  # computed while the background thread is running
+    >>> ab = wait()
+    '''
+    result = []
+    def run():
+        try:
+            result.append((True, fn(*args)))
+        except BaseException as err:
+            result.append((False, err))
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    def wait():
+        thread.join()
+        ok, val = result[0]
+        if ok:
+            return val
+        else:
+            raise val
+    return wait
+
 if __name__ == '__main__':
     for i,j in tril_equal_pace(90, 30):
         print('base=30', i, j, j*(j+1)//2-i*(i+1)//2)
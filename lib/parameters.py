@@ -5,6 +5,28 @@
 L_MAX      = 8
 MEMORY_MAX = 4000 # MB
 
+# Persistent cache of AO integrals and DFT grids, see lib.intcache.  Set
+# INTCACHE_DIR to a scratch directory to enable the cache
+INTCACHE_DIR = None
+INTCACHE_MAX_SIZE = 20000 # MB
+
+# Checkpoint file writer (scf.chkfile.AsyncWriter) sends the data to disk
+# every CHK_FLUSH_CYCLES updates or CHK_FLUSH_TIME seconds.  0 disables the
+# criterion.
+CHK_FLUSH_CYCLES = 1
+CHK_FLUSH_TIME = 0 # second
+
+# AO values on DFT grids can be cached by dft.numint._NumInt across SCF
+# cycles.  The memory is not counted in the max_memory of the DFT objects.
+# The blocks beyond NUMINT_AO_CACHE_MEMORY are saved in a memory-mapped
+# scratch file in NUMINT_AO_CACHE_TMPDIR (None for the system default) if
+# NUMINT_AO_CACHE_SPILL is set.  0 disables the cache
+NUMINT_AO_CACHE_MEMORY = 0 # MB
+NUMINT_AO_CACHE_SPILL = True
+NUMINT_AO_CACHE_TMPDIR = None
+# Number of threads to integrate the DFT grid blocks concurrently
+NUMINT_THREADS = 1
+
 #LIGHTSPEED = 137.035 999 679 94    #http://physics.nist.gov/cgi-bin/cuu/Value?alph
 LIGHTSPEED = 137.0359895
 # BOHR = .529 177 210 92(17) e-10m  #http://physics.nist.gov/cgi-bin/cuu/Value?bohrrada0
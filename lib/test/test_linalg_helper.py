@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+import unittest
+import numpy
+import scipy.linalg
+from pyscf import lib
+
+class KnowValues(unittest.TestCase):
+    def test_davidson_outcore(self):
+        numpy.random.seed(12)
+        n = 200
+        a = numpy.random.random((n,n))
+        a = a + a.T + numpy.diag(numpy.arange(n)) * 10
+        e, u = scipy.linalg.eigh(a)
+
+        aop = lambda x: numpy.dot(a, x)
+        precond = lambda r, e0, x0: r / (a.diagonal() - e0 + 1e-6)
+        x0 = u[:,0] + numpy.random.random(n) * .1
+        x0 /= numpy.linalg.norm(x0)
+
+        # trial vectors do not fit in max_memory and go to the ring buffer
+        xs = lib.linalg_helper._TrialXs(x0, 6, .0001)
+        self.assertTrue(xs.scr is not None)
+        self.assertEqual(xs.scr.nslots, 8)
+
+        outcore = []
+        def callback(istep, xs, ax):
+            outcore.append(xs.scr is not None and ax.scr is not None)
+        e0, x1 = lib.davidson(aop, x0, precond, tol=1e-12, max_cycle=100,
+                              maxspace=6, max_memory=.0001, callback=callback)
+        self.assertTrue(len(outcore) > 6 and all(outcore))
+        self.assertAlmostEqual(e0, e[0], 8)
+        self.assertAlmostEqual(abs(numpy.dot(x1, u[:,0])), 1, 6)
+
+
+if __name__ == "__main__":
+    print("Full Tests for linalg_helper")
+    unittest.main()
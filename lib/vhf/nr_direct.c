@@ -287,6 +287,11 @@ static void filldot_kgtl(int (*intor)(), void (*funpack)(), int (*fill)(),
 
         if (vhfopt) {
                 fprescreen = vhfopt->fprescreen;
+                if (fprescreen == &CVHFnrs8_vk_prescreen &&
+                    !CVHFnrs8_vk_klscreen(ksh, lsh, vhfopt)) {
+                        free(eri);
+                        return;
+                }
         } else {
                 fprescreen = CVHFnoscreen;
         }
@@ -331,6 +336,11 @@ static void filldot_keql(int (*intor)(), void (*funpack)(), int (*fill)(),
 
         if (vhfopt) {
                 fprescreen = vhfopt->fprescreen;
+                if (fprescreen == &CVHFnrs8_vk_prescreen &&
+                    !CVHFnrs8_vk_klscreen(ksh, lsh, vhfopt)) {
+                        free(eri);
+                        return;
+                }
         } else {
                 fprescreen = CVHFnoscreen;
         }
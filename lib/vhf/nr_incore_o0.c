@@ -595,20 +595,22 @@ void CVHFnrs2kl_il_s1jk(double *eri, double *dm, double *vk,
  * s2kl 2-fold symmetry: k>=l
  * s1   no permutation symmetry
  **************************************************/
-void CVHFnrs8_incore_drv(double *eri, double *dmj, double *vj,
-                         double *dmk, double *vk,
-                         int n, void (*const fvj)(), void (*const fvk)())
+/*
+ * Accumulate vj, vk for the rows ij0 <= ij < ij1 of the 8-fold ERIs.
+ * eri points to the beginning of row ij0.  vj, vk are not initialized.
+ * vk is not computed if fvk is NULL.
+ */
+void CVHFnrs8_incore_blk_drv(double *eri, double *dmj, double *vj,
+                             double *dmk, double *vk, int n, int ij0, int ij1,
+                             void (*const fvj)(), void (*const fvk)())
 {
-        const int npair = n*(n+1)/2;
+        const size_t off0 = (size_t)ij0*(ij0+1)/2;
         double *vj_priv, *vk_priv;
         int i, j;
         size_t ij, off;
 
-        memset(vj, 0, sizeof(double)*n*n);
-        memset(vk, 0, sizeof(double)*n*n);
-
 #pragma omp parallel default(none) \
-        shared(eri, dmj, dmk, vj, vk, n) \
+        shared(eri, dmj, dmk, vj, vk, n, ij0, ij1) \
         private(ij, i, j, off, vj_priv, vk_priv)
         {
                 vj_priv = malloc(sizeof(double)*n*n);
@@ -616,12 +618,14 @@ void CVHFnrs8_incore_drv(double *eri, double *dmj, double *vj,
                 memset(vj_priv, 0, sizeof(double)*n*n);
                 memset(vk_priv, 0, sizeof(double)*n*n);
 #pragma omp for nowait schedule(dynamic, 4)
-                for (ij = 0; ij < npair; ij++) {
+                for (ij = ij0; ij < ij1; ij++) {
                         i = (int)(sqrt(2*ij+.25) - .5 + 1e-7);
                         j = ij - i*(i+1)/2;
-                        off = ij*(ij+1)/2;
+                        off = ij*(ij+1)/2 - off0;
                         (*fvj)(eri+off, dmj, vj_priv, n, i, j);
-                        (*fvk)(eri+off, dmk, vk_priv, n, i, j);
+                        if (fvk) {
+                                (*fvk)(eri+off, dmk, vk_priv, n, i, j);
+                        }
                 }
 #pragma omp critical
                 {
@@ -635,6 +639,17 @@ void CVHFnrs8_incore_drv(double *eri, double *dmj, double *vj,
         }
 }
 
+void CVHFnrs8_incore_drv(double *eri, double *dmj, double *vj,
+                         double *dmk, double *vk,
+                         int n, void (*const fvj)(), void (*const fvk)())
+{
+        const int npair = n*(n+1)/2;
+
+        memset(vj, 0, sizeof(double)*n*n);
+        memset(vk, 0, sizeof(double)*n*n);
+        CVHFnrs8_incore_blk_drv(eri, dmj, vj, dmk, vk, n, 0, npair, fvj, fvk);
+}
+
 void CVHFnrs4_incore_drv(double *eri, double *dmj, double *vj,
                          double *dmk, double *vk,
                          int n, void (*const fvj)(), void (*const fvk)())
@@ -661,7 +676,9 @@ void CVHFnrs4_incore_drv(double *eri, double *dmj, double *vj,
                         j = ij - i*(i+1)/2;
                         off = ij * npair;
                         (*fvj)(eri+off, dmj, vj_priv, n, i, j);
-                        (*fvk)(eri+off, dmk, vk_priv, n, i, j);
+                        if (fvk) {
+                                (*fvk)(eri+off, dmk, vk_priv, n, i, j);
+                        }
                 }
 #pragma omp critical
                 {
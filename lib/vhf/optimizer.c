@@ -11,6 +11,7 @@
 #include "optimizer.h"
 
 #define MAX(I,J)        ((I) > (J) ? (I) : (J))
+#define MIN(I,J)        ((I) < (J) ? (I) : (J))
 
 
 void CVHFinit_optimizer(CVHFOpt **opt, int *atm, int natm,
@@ -99,6 +100,69 @@ int CVHFnrs8_prescreen(int *shls, CVHFOpt *opt,
              | (  opt->dm_cond[i*n+l] > dmin);
 }
 
+/*
+ * Coulomb part of CVHFnrs8_prescreen, for J-only builds
+ */
+int CVHFnrs8_vj_prescreen(int *shls, CVHFOpt *opt,
+                          int *atm, int *bas, double *env)
+{
+        if (!opt) {
+                return 1; // no screen
+        }
+        int i = shls[0];
+        int j = shls[1];
+        int k = shls[2];
+        int l = shls[3];
+        int n = opt->nbas;
+        assert(opt->q_cond);
+        assert(opt->dm_cond);
+        double qijkl = opt->q_cond[i*n+j] * opt->q_cond[k*n+l];
+        double dmin = opt->direct_scf_cutoff * qijkl;
+        return (4*opt->dm_cond[j*n+i] > dmin)
+             | (4*opt->dm_cond[l*n+k] > dmin);
+}
+
+/*
+ * Exchange part of CVHFnrs8_prescreen, for K-only builds.  The shell quartet
+ * is bounded by its contribution to K, (ij|ij)^{1/2} (kl|kl)^{1/2} max|D|
+ * of the exchange-type density blocks (LinK-style screening).
+ */
+int CVHFnrs8_vk_prescreen(int *shls, CVHFOpt *opt,
+                          int *atm, int *bas, double *env)
+{
+        if (!opt) {
+                return 1; // no screen
+        }
+        int i = shls[0];
+        int j = shls[1];
+        int k = shls[2];
+        int l = shls[3];
+        int n = opt->nbas;
+        assert(opt->q_cond);
+        assert(opt->dm_cond);
+        double qijkl = opt->q_cond[i*n+j] * opt->q_cond[k*n+l];
+        double dmin = opt->direct_scf_cutoff * qijkl;
+        return (opt->dm_cond[j*n+k] > dmin)
+             | (opt->dm_cond[j*n+l] > dmin)
+             | (opt->dm_cond[i*n+k] > dmin)
+             | (opt->dm_cond[i*n+l] > dmin);
+}
+
+/*
+ * Screen the shell pair kl for all ij with CVHFnrs8_vk_prescreen.  Return 0
+ * if none of (ij|kl) contributes to K.  It needs the minimum of q_cond
+ * (the largest (ij|ij)), stored in q_cond[nbas*nbas], and the maximum of each
+ * row/column of dm_cond, stored in dm_cond[nbas*nbas:nbas*nbas+nbas].
+ */
+int CVHFnrs8_vk_klscreen(int ksh, int lsh, CVHFOpt *opt)
+{
+        int n = opt->nbas;
+        double *dmax = opt->dm_cond + n*n;
+        double dmin = opt->direct_scf_cutoff
+                    * opt->q_cond[ksh*n+lsh] * opt->q_cond[n*n];
+        return MAX(dmax[ksh], dmax[lsh]) > dmin;
+}
+
 // return flag to decide whether transpose01324
 int CVHFr_vknoscreen(int *shls, CVHFOpt *opt,
                      double **dms_cond, int n_dm, double *dm_atleast,
@@ -130,12 +194,14 @@ void CVHFsetnr_direct_scf(CVHFOpt *opt, int *atm, int natm,
         if (opt->q_cond) {
                 free(opt->q_cond);
         }
-        opt->q_cond = (double *)malloc(sizeof(double) * nbas*nbas);
+        // the last element saves the min of q_cond
+        opt->q_cond = (double *)malloc(sizeof(double) * (nbas*nbas+1));
 
         double *buf;
-        double qtmp;
+        double qtmp, qmin;
         int i, j, di, dj, ish, jsh;
         int shls[4];
+        qmin = 1e200;
         for (ish = 0; ish < nbas; ish++) {
                 di = CINTcgto_spheric(ish, bas);
                 for (jsh = 0; jsh <= ish; jsh++) {
@@ -155,10 +221,12 @@ void CVHFsetnr_direct_scf(CVHFOpt *opt, int *atm, int natm,
                         qtmp = 1./sqrt(qtmp);
                         opt->q_cond[ish*nbas+jsh] = qtmp;
                         opt->q_cond[jsh*nbas+ish] = qtmp;
+                        qmin = MIN(qmin, qtmp);
                         free(buf);
 
                 }
         }
+        opt->q_cond[nbas*nbas] = qmin;
 }
 
 void CVHFsetnr_direct_scf_dm(CVHFOpt *opt, double *dm, int nset,
@@ -167,8 +235,9 @@ void CVHFsetnr_direct_scf_dm(CVHFOpt *opt, double *dm, int nset,
         if (opt->dm_cond) { // NOT reuse opt->dm_cond because nset may be diff in different call
                 free(opt->dm_cond);
         }
-        opt->dm_cond = (double *)malloc(sizeof(double) * nbas*nbas);
-        memset(opt->dm_cond, 0, sizeof(double)*nbas*nbas);
+        // dm_cond[nbas*nbas:] saves the max of each row and column
+        opt->dm_cond = (double *)malloc(sizeof(double) * (nbas*nbas+nbas));
+        memset(opt->dm_cond, 0, sizeof(double)*(nbas*nbas+nbas));
 
         int *ao_loc = malloc(sizeof(int) * (nbas+1));
         CINTshells_spheric_offset(ao_loc, bas, nbas);
@@ -191,6 +260,14 @@ void CVHFsetnr_direct_scf_dm(CVHFOpt *opt, double *dm, int nset,
                 }
                 opt->dm_cond[ish*nbas+jsh] = dmax;
         } }
+
+        double *rowmax = opt->dm_cond + nbas*nbas;
+        for (ish = 0; ish < nbas; ish++) {
+        for (jsh = 0; jsh < nbas; jsh++) {
+                dmax = opt->dm_cond[ish*nbas+jsh];
+                rowmax[ish] = MAX(rowmax[ish], dmax);
+                rowmax[jsh] = MAX(rowmax[jsh], dmax);
+        } }
         free(ao_loc);
 }
 
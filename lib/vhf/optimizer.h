@@ -29,6 +29,11 @@ int CVHFnr_schwarz_cond(int *shls, CVHFOpt *opt,
                         int *atm, int *bas, double *env);
 int CVHFnrs8_prescreen(int *shls, CVHFOpt *opt,
                        int *atm, int *bas, double *env);
+int CVHFnrs8_vj_prescreen(int *shls, CVHFOpt *opt,
+                          int *atm, int *bas, double *env);
+int CVHFnrs8_vk_prescreen(int *shls, CVHFOpt *opt,
+                          int *atm, int *bas, double *env);
+int CVHFnrs8_vk_klscreen(int ksh, int lsh, CVHFOpt *opt);
 
 int CVHFr_vknoscreen(int *shls, CVHFOpt *opt,
                      double **dms_cond, int n_dm, double *dm_atleast,
@@ -37,5 +37,24 @@ def dump_mcscf(mol, chkfile, mo_coeff,
     store('mcscf/iter_micro_tot', iter_micro_tot)
     store('mcscf/converged', converged)
     fh5.close()
-  
 
+def update_mcscf(writer, mol, mo_coeff,
+                 mcscf_energy=None, e_cas=None,
+                 ci_vector=None,
+                 iter_micro_tot=None, iter_macro=None,
+                 converged=None,
+                ):
+    """Same to dump_mcscf, but sends the data to the background checkpoint
+    writer :class:`pyscf.scf.chkfile.AsyncWriter`.
+    """
+    dic = {'mol': format(mol.pack()),
+           'mcscf/mo_coeff': mo_coeff}
+    def store(key, val):
+      if val is not None: dic[key] = val
+    store('mcscf/mcscf_energy', mcscf_energy)
+    store('mcscf/e_cas', e_cas)
+    store('mcscf/ci_vector', ci_vector)
+    store('mcscf/iter_macro', iter_macro)
+    store('mcscf/iter_micro_tot', iter_micro_tot)
+    store('mcscf/converged', converged)
+    writer.update(dic)
@@ -66,8 +66,9 @@ def density_fit(casscf, auxbasis='weigend', level=1):
             fdrv = _ao2mo.libao2mo.AO2MOnr_e2_drv
             ftrans = _ao2mo._fpointer('AO2MOtranse2_nr_s2kl')
             with df.load(self._cderi) as feri:
-                for b0, b1 in dfhf.prange(0, self._naoaux, dfhf.BLOCKDIM):
-                    eri1 = numpy.array(feri[b0:b1], copy=False)
+                blocks = dfhf.prange(0, self._naoaux, dfhf.BLOCKDIM)
+                for b0, b1, eri1 in df.prefetch_blocks(feri, blocks,
+                                                       self.max_memory):
                     buf = numpy.empty((b1-b0,nmo,nmo))
                     fdrv(ftrans, fmmm,
                          buf.ctypes.data_as(ctypes.c_void_p),
@@ -474,6 +474,7 @@ class CASSCF(casci_uhf.CASCI):
         self.ci = None
         self.mo_coeff = mf.mo_coeff
         self.converged = False
+        self._chkwriter = None
 
         self._keys = set(self.__dict__.keys())
 
@@ -524,10 +525,16 @@ class CASSCF(casci_uhf.CASCI):
 
         self.dump_flags()
 
-        self.converged, self.e_tot, e_cas, self.ci, self.mo_coeff = \
-                kernel(self, mo_coeff, \
-                       tol=self.conv_tol, macro=macro, micro=micro, \
-                       ci0=ci0, verbose=self.verbose, **cikwargs)
+# The checkpoint data are written in background during the iterations
+        if self.chkfile:
+            self._get_chkwriter()
+        try:
+            self.converged, self.e_tot, e_cas, self.ci, self.mo_coeff = \
+                    kernel(self, mo_coeff, \
+                           tol=self.conv_tol, macro=macro, micro=micro, \
+                           ci0=ci0, verbose=self.verbose, **cikwargs)
+        finally:
+            self.close_chk()
         #if self.verbose >= logger.INFO:
         #    self.analyze(mo_coeff, self.ci, verbose=self.verbose)
         return self.e_tot, e_cas, self.ci, self.mo_coeff
@@ -547,10 +554,16 @@ class CASSCF(casci_uhf.CASCI):
 
         self.dump_flags()
 
-        self.converged, self.e_tot, e_cas, self.ci, self.mo_coeff = \
-                mc2step_uhf.kernel(self, mo_coeff, \
-                                   tol=self.conv_tol, macro=macro, micro=micro, \
-                                   ci0=ci0, verbose=self.verbose, **cikwargs)
+# The checkpoint data are written in background during the iterations
+        if self.chkfile:
+            self._get_chkwriter()
+        try:
+            self.converged, self.e_tot, e_cas, self.ci, self.mo_coeff = \
+                    mc2step_uhf.kernel(self, mo_coeff, \
+                                       tol=self.conv_tol, macro=macro, micro=micro, \
+                                       ci0=ci0, verbose=self.verbose, **cikwargs)
+        finally:
+            self.close_chk()
         #if self.verbose >= logger.INFO:
         #    self.analyze(mo_coeff, self.ci, verbose=self.verbose)
         return self.e_tot, e_cas, self.ci, self.mo_coeff
@@ -707,11 +720,29 @@ class CASSCF(casci_uhf.CASCI):
         return casdm1, casdm2, g
 
     def save_mo_coeff(self, mo_coeff, *args):
-        pyscf.scf.chkfile.dump(self.chkfile, 'mcscf/mo_coeff', mo_coeff)
+        if self._chkwriter is None:
+            pyscf.scf.chkfile.dump(self.chkfile, 'mcscf/mo_coeff', mo_coeff)
+        else:
+            self._chkwriter.update({'mcscf/mo_coeff': mo_coeff})
 
     def dump_chk(self, *args, **kwargs):
+        '''Save the CASSCF intermediates in chkfile.  In the iterations of
+        :func:`mc1step` and :func:`mc2step`, the data are written in
+        background and they are on disk after :func:`close_chk`.  Otherwise,
+        the data are written before return.
+        '''
         from pyscf.mcscf import chkfile
-        chkfile.dump_mcscf(self.mol, self.chkfile, *args, **kwargs)
+        if self._chkwriter is None:
+            chkfile.dump_mcscf(self.mol, self.chkfile, *args, **kwargs)
+        else:
+            chkfile.update_mcscf(self._chkwriter, self.mol, *args, **kwargs)
+
+    def _get_chkwriter(self):
+        return pyscf.scf.chkfile.get_writer(self, reset=('mcscf',))
+
+    def close_chk(self):
+        '''Write the pending checkpoint data and close the chkfile'''
+        pyscf.scf.chkfile.close_writer(self)
 
 
 # to avoid calculating AO integrals
@@ -7,7 +7,6 @@ import time
 import tempfile
 from functools import reduce
 import numpy
-import h5py
 import pyscf.lib
 import pyscf.lib.numpy_helper
 from pyscf.lib import logger
@@ -57,7 +56,7 @@ def trans_e1_outcore(mol, mo, ncore, ncas,
                                 max_memory=max_memory, ioblk_size=ioblk_size,
                                 verbose=log, compact=False)
 
-    fswap = h5py.File(swapfile.name, 'r')
+    fswap = outcore.open_swap(swapfile.name)
     klaoblks = len(fswap['0'])
     def load_buf(bfn_id):
         if log.verbose >= logger.DEBUG1:
@@ -5,7 +5,6 @@ import ctypes
 import time
 import tempfile
 import numpy
-import h5py
 import pyscf.lib
 import pyscf.lib.numpy_helper
 from pyscf.lib import logger
@@ -72,7 +71,7 @@ def trans_e1_outcore(mol, mo, ncore, ncas,
     pyscf.ao2mo.outcore.half_e1(mol, (mo[1][:,:nocc[1]],mo[1]), swapfile.name,
                                 verbose=log, compact=False)
 
-    fswap = h5py.File(swapfile.name, 'r')
+    fswap = pyscf.ao2mo.outcore.open_swap(swapfile.name)
     klaoblks = len(fswap['0'])
     def load_buf(bfn_id):
         if log.verbose >= logger.DEBUG1:
@@ -107,7 +106,7 @@ def trans_e1_outcore(mol, mo, ncore, ncas,
     pyscf.ao2mo.outcore.half_e1(mol, (mo[0][:,:nocc[0]],mo[0]), swapfile.name,
                                 verbose=log, compact=False)
 
-    fswap = h5py.File(swapfile.name, 'r')
+    fswap = pyscf.ao2mo.outcore.open_swap(swapfile.name)
     klaoblks = len(fswap['0'])
     def load_buf(bfn_id):
         if log.verbose >= logger.DEBUG1:
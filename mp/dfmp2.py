@@ -35,9 +35,10 @@ def kernel(mp, mo_energy, mo_coeff, nocc, ioblk=256, verbose=None):
     t2 = None
     emp2 = 0
     with mp.ao2mo(mo_coeff, nocc) as fov:
-        for p0, p1 in prange(0, naoaux, iolen):
+# (P|ov) of the next block is read while the present one is contracted
+        blocks = prange(0, naoaux, iolen)
+        for p0, p1, qov in df.prefetch_blocks(fov, blocks, ioblk*2):
             logger.debug(mp, 'Load cderi block %d:%d', p0, p1)
-            qov = numpy.array(fov[p0:p1], copy=False)
             for i in range(nocc):
                 buf = numpy.dot(qov[:,i*nvir:(i+1)*nvir].T,
                                 qov).reshape(nvir,nocc,nvir)
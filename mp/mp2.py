@@ -27,15 +27,13 @@ def kernel(mp, mo_energy, mo_coeff, nocc, verbose=None):
     t2 = numpy.empty((nocc,nocc,nvir,nvir))
     emp2 = 0
 
-    with mp.ao2mo(mo_coeff, nocc) as ovov:
-        for i in range(nocc):
-            djba = (eia.reshape(-1,1) + eia[i].reshape(1,-1)).ravel()
-            gi = numpy.array(ovov[i*nvir:(i+1)*nvir], copy=False)
-            gi = gi.reshape(nvir,nocc,nvir).transpose(1,2,0)
-            t2[i] = (gi.ravel()/djba).reshape(nocc,nvir,nvir)
-            # 2*ijab-ijba
-            theta = gi*2 - gi.transpose(0,2,1)
-            emp2 += numpy.einsum('jab,jab', t2[i], theta)
+    for i, gi in enumerate(mp.ao2mo_iter(mo_coeff, nocc)):
+        djba = (eia.reshape(-1,1) + eia[i].reshape(1,-1)).ravel()
+        gi = gi.reshape(nvir,nocc,nvir).transpose(1,2,0)
+        t2[i] = (gi.ravel()/djba).reshape(nocc,nvir,nvir)
+        # 2*ijab-ijba
+        theta = gi*2 - gi.transpose(0,2,1)
+        emp2 += numpy.einsum('jab,jab', t2[i], theta)
 
     return emp2, t2
 
@@ -46,20 +44,18 @@ def make_rdm1(mp, mo_energy, mo_coeff, nocc, verbose=None):
     dm1vir = numpy.zeros((nvir,nvir))
     eia = mo_energy[:nocc,None] - mo_energy[None,nocc:]
     emp2 = 0
-    with mp.ao2mo(mo_coeff, nocc) as ovov:
-        for i in range(nocc):
-            djba = (eia.reshape(-1,1) + eia[i].reshape(1,-1)).ravel()
-            gi = numpy.array(ovov[i*nvir:(i+1)*nvir]).reshape(nvir,nocc,nvir)
-            gi = gi.transpose(1,2,0)
-            t2i = (gi.ravel()/djba).reshape(nocc,nvir,nvir)
-            # 2*ijab-ijba
-            theta = gi*2 - gi.transpose(0,2,1)
-            emp2 += numpy.einsum('jab,jab', t2i, theta)
-
-            dm1vir += numpy.einsum('jca,jcb->ab', t2i, t2i) * 2 \
-                    - numpy.einsum('jca,jbc->ab', t2i, t2i)
-            dm1occ += numpy.einsum('iab,jab->ij', t2i, t2i) * 2 \
-                    - numpy.einsum('iab,jba->ij', t2i, t2i)
+    for i, gi in enumerate(mp.ao2mo_iter(mo_coeff, nocc)):
+        djba = (eia.reshape(-1,1) + eia[i].reshape(1,-1)).ravel()
+        gi = gi.reshape(nvir,nocc,nvir).transpose(1,2,0)
+        t2i = (gi.ravel()/djba).reshape(nocc,nvir,nvir)
+        # 2*ijab-ijba
+        theta = gi*2 - gi.transpose(0,2,1)
+        emp2 += numpy.einsum('jab,jab', t2i, theta)
+
+        dm1vir += numpy.einsum('jca,jcb->ab', t2i, t2i) * 2 \
+                - numpy.einsum('jca,jbc->ab', t2i, t2i)
+        dm1occ += numpy.einsum('iab,jab->ij', t2i, t2i) * 2 \
+                - numpy.einsum('iab,jba->ij', t2i, t2i)
 
     rdm1 = numpy.zeros((nmo,nmo))
 # *2 for beta electron
@@ -114,6 +110,30 @@ class MP2(object):
         time1 = log.timer('Integral transformation', *time0)
         return ao2mo.load(eri)
 
+    # yield (ia|jb) of each i, array[nvir,nocc*nvir].  The integrals are not
+    # stored if they are generated by the outcore transformation
+    def ao2mo_iter(self, mo_coeff, nocc):
+        log = logger.Logger(self.stdout, self.verbose)
+        time0 = (time.clock(), time.time())
+        log.debug('transform (ia|jb)')
+        nmo = mo_coeff.shape[1]
+        nvir = nmo - nocc
+        co = mo_coeff[:,:nocc]
+        cv = mo_coeff[:,nocc:]
+        if self._scf._eri is not None and \
+           (nocc*nvir*nmo**2/2*8 + (nocc*nvir)**2*8 \
+            + self._scf._eri.nbytes)/1e6 < self.max_memory:
+            eri = ao2mo.incore.general(self._scf._eri, (co,cv,co,cv))
+            for i in range(nocc):
+                yield eri[i*nvir:(i+1)*nvir]
+        else:
+            blks = ao2mo.outcore.general_iter(self.mol, (co,cv,co,cv), nvir,
+                                              max_memory=self.max_memory,
+                                              verbose=self.verbose)
+            for i0, i1, eri in blks:
+                yield eri
+        time1 = log.timer('Integral transformation', *time0)
+
 
 if __name__ == '__main__':
     from pyscf import scf
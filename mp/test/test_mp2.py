@@ -77,6 +77,13 @@ class KnowValues(unittest.TestCase):
         self.assertAlmostEqual(e, -0.20401996728747132, 11)
         self.assertAlmostEqual(numpy.linalg.norm(t2), 0.19379397642098622, 9)
 
+        nocc = mol.nelectron//2
+        rdm1 = mp.mp2.make_rdm1(pt, mf.mo_energy, mf.mo_coeff, nocc)
+        mf._eri = scf._vhf.int2e_sph_cached(mol)
+        pt.max_memory = 2000
+        dm1ref = mp.mp2.make_rdm1(pt, mf.mo_energy, mf.mo_coeff, nocc)
+        self.assertTrue(numpy.allclose(rdm1, dm1ref))
+
 
 
 if __name__ == "__main__":
@@ -60,6 +60,16 @@ to control the SCF method.
 
         Density fitting can be applied to all non-relativistic HF class.
 
+    cosx_grids : :class:`dft.gen_grid.Grids`, for seminumerical exchange only
+        Grids to integrate the exchange matrix.  It is effective when the SCF
+        class is decorated by :func:`cosx`::
+
+        >>> mf = scf.cosx(scf.RHF(mol))
+        >>> mf.scf()
+
+        Seminumerical exchange can be applied to all non-relativistic HF and
+        KS classes.
+
     with_ssss : bool, for Dirac-Hartree-Fock only
         If False, ignore small component integrals (SS|SS).  Default is True.
     with_gaunt : bool, for Dirac-Hartree-Fock only
@@ -91,6 +101,7 @@ from pyscf.scf import chkfile
 from pyscf.scf import diis
 from pyscf.scf import addons
 from pyscf.scf.dfhf import density_fit, density_fit_
+from pyscf.scf.cosx import cosx, cosx_
 from pyscf.scf.uhf import spin_square
 from pyscf.scf.hf import get_init_guess
 from pyscf.scf.addons import *
@@ -75,6 +75,29 @@ class VHFOpt(object):
                    c_bas.ctypes.data_as(ctypes.c_void_p), nbas,
                    c_env.ctypes.data_as(ctypes.c_void_p))
 
+def get_vhfopt(mol, intor='cint2e_sph', prescreen='CVHFnoscreen',
+               qcondname=None, dmcondname=None):
+    '''VHFOpt of the given integral and screening functions.  The VHFOpt
+    objects are cached in mol and reused by all SCF, gradients and response
+    calculations of the same molecule.  The cached VHFOpt is rebuilt when
+    mol._atm, mol._bas or mol._env are changed.
+
+    Note the direct_scf_tol and the density matrix screening condition of the
+    cached VHFOpt are shared by all callers.  They should be reset before
+    computing J, K matrices.
+    '''
+    key = (intor, prescreen, qcondname, dmcondname)
+    fp = pyscf.lib.intcache.fingerprint(mol)
+    if not hasattr(mol, '_vhfopt_cache'):
+        mol._vhfopt_cache = {}
+    if key in mol._vhfopt_cache:
+        fp0, vhfopt = mol._vhfopt_cache[key]
+        if fp0 == fp:
+            return vhfopt
+    vhfopt = VHFOpt(mol, intor, prescreen, qcondname, dmcondname)
+    mol._vhfopt_cache[key] = (fp, vhfopt)
+    return vhfopt
+
 class _CVHFOpt(ctypes.Structure):
     _fields_ = [('nbas', ctypes.c_int),
                 ('_padding', ctypes.c_int),
@@ -104,7 +127,12 @@ def make_cintopt(atm, bas, env, intor):
 # hermi = 1 : hermitian
 # hermi = 2 : anti-hermitian
 ################################################
-def incore(eri, dm, hermi=0):
+def incore(eri, dm, hermi=0, with_k=True):
+    '''J, K matrices of the in-core 8-fold or 4-fold ERIs.  If with_k is
+    False, only J is computed and None is returned for K.
+    '''
+    if isinstance(eri, numpy.memmap):
+        return incore_mmap(eri, dm, hermi, with_k=with_k)
     eri = numpy.ascontiguousarray(eri)
     dm = numpy.ascontiguousarray(dm)
     nao = dm.shape[0]
@@ -134,12 +162,55 @@ def incore(eri, dm, hermi=0):
         tridm = pyscf.lib.pack_tril(pyscf.lib.transpose_sum(dm))
         for i in range(nao):
             tridm[i*(i+1)//2+i] *= .5
+    if not with_k:
+        fvk = ctypes.c_void_p()
     fdrv(eri.ctypes.data_as(ctypes.c_void_p),
          tridm.ctypes.data_as(ctypes.c_void_p),
          vj.ctypes.data_as(ctypes.c_void_p),
          dm.ctypes.data_as(ctypes.c_void_p),
          vk.ctypes.data_as(ctypes.c_void_p),
          ctypes.c_int(nao), fvj, fvk)
+    if not with_k:
+        return pyscf.lib.hermi_triu(vj, 1), None
+    if hermi != 0:
+        vj = pyscf.lib.hermi_triu(vj, hermi)
+        vk = pyscf.lib.hermi_triu(vk, hermi)
+    else:
+        vj = pyscf.lib.hermi_triu(vj, 1)
+    return vj, vk
+
+def incore_mmap(eri, dm, hermi=0, ioblk_size=256, with_k=True):
+    '''Same to incore, for the 8-fold ERIs in a memory-mapped file.  The ERIs
+    are loaded in blocks of rows.  Each block takes ioblk_size MB memory.
+    '''
+    dm = numpy.ascontiguousarray(dm)
+    nao = dm.shape[0]
+    npair = nao*(nao+1)//2
+    assert(eri.size == npair*(npair+1)//2)
+    vj = numpy.zeros((nao,nao))
+    vk = numpy.zeros((nao,nao))
+    fdrv = getattr(libcvhf, 'CVHFnrs8_incore_blk_drv')
+    fvj = _fpointer('CVHFnrs8_tridm_vj')
+    if not with_k:
+        fvk = ctypes.c_void_p()
+    elif hermi == 1:
+        fvk = _fpointer('CVHFnrs8_jk_s2il')
+    else:
+        fvk = _fpointer('CVHFnrs8_jk_s1il')
+    tridm = pyscf.lib.pack_tril(pyscf.lib.transpose_sum(dm))
+    for i in range(nao):
+        tridm[i*(i+1)//2+i] *= .5
+    base = int(numpy.sqrt(ioblk_size*1e6/8*2))
+    for ij0, ij1 in pyscf.lib.tril_equal_pace(npair, base):
+        buf = numpy.array(eri[ij0*(ij0+1)//2:ij1*(ij1+1)//2])
+        fdrv(buf.ctypes.data_as(ctypes.c_void_p),
+             tridm.ctypes.data_as(ctypes.c_void_p),
+             vj.ctypes.data_as(ctypes.c_void_p),
+             dm.ctypes.data_as(ctypes.c_void_p),
+             vk.ctypes.data_as(ctypes.c_void_p),
+             ctypes.c_int(nao), ctypes.c_int(ij0), ctypes.c_int(ij1), fvj, fvk)
+    if not with_k:
+        return pyscf.lib.hermi_triu(vj, 1), None
     if hermi != 0:
         vj = pyscf.lib.hermi_triu(vj, hermi)
         vk = pyscf.lib.hermi_triu(vk, hermi)
@@ -149,7 +220,17 @@ def incore(eri, dm, hermi=0):
 
 # use cint2e_sph as cintor, CVHFnrs8_ij_s2kl, CVHFnrs8_jk_s2il as fjk to call
 # direct_mapdm
-def direct(dms, atm, bas, env, vhfopt=None, hermi=0):
+def direct(dms, atm, bas, env, vhfopt=None, hermi=0, with_k=True, with_j=True):
+    '''J, K matrices of integral-direct algorithm.  If with_k is False, only
+    the J matrices are computed (CVHFnrs8_tridm_vj) and None is returned for K.
+    Similarly, None is returned for J if with_j is False.
+
+    When only one of J and K is computed with the CVHFnrs8_prescreen
+    optimizer, the integrals are screened by the Coulomb bound
+    (CVHFnrs8_vj_prescreen) or the density weighted exchange bound
+    (CVHFnrs8_vk_prescreen) instead of both.
+    '''
+    assert(with_j or with_k)
     c_atm = numpy.array(atm, dtype=numpy.int32)
     c_bas = numpy.array(bas, dtype=numpy.int32)
     c_env = numpy.array(env)
@@ -179,6 +260,12 @@ def direct(dms, atm, bas, env, vhfopt=None, hermi=0):
         cvhfopt = vhfopt._this
         cintopt = vhfopt._cintopt
         cintor = vhfopt._intor
+        fprescreen = vhfopt._this.contents.fprescreen
+        if fprescreen == _fpointer('CVHFnrs8_prescreen').value:
+            if not with_k:
+                vhfopt._this.contents.fprescreen = _fpointer('CVHFnrs8_vj_prescreen')
+            elif not with_j:
+                vhfopt._this.contents.fprescreen = _fpointer('CVHFnrs8_vk_prescreen')
 
     fdrv = getattr(libcvhf, 'CVHFnr_direct_drv')
     funpack = _fpointer('CVHFunpack_nrblock2tril')
@@ -188,20 +275,24 @@ def direct(dms, atm, bas, env, vhfopt=None, hermi=0):
         fvk = _fpointer('CVHFnrs8_jk_s2il')
     else:
         fvk = _fpointer('CVHFnrs8_jk_s1il')
-    fjk = (ctypes.c_void_p*(2*n_dm))()
-    dm1 = (ctypes.c_void_p*(2*n_dm))()
-    for i in range(n_dm):
-        dm1[i] = tridm[i].ctypes.data_as(ctypes.c_void_p)
-        fjk[i] = fvj
-    for i in range(n_dm):
-        assert(dms[i].flags.c_contiguous)
-        dm1[n_dm+i] = dms[i].ctypes.data_as(ctypes.c_void_p)
-        fjk[n_dm+i] = fvk
-    vjk = numpy.empty((2,n_dm,nao,nao))
+    njk = int(with_j) + int(with_k)
+    fjk = (ctypes.c_void_p*(njk*n_dm))()
+    dm1 = (ctypes.c_void_p*(njk*n_dm))()
+    if with_j:
+        for i in range(n_dm):
+            dm1[i] = tridm[i].ctypes.data_as(ctypes.c_void_p)
+            fjk[i] = fvj
+    if with_k:
+        off = (njk-1) * n_dm
+        for i in range(n_dm):
+            assert(dms[i].flags.c_contiguous)
+            dm1[off+i] = dms[i].ctypes.data_as(ctypes.c_void_p)
+            fjk[off+i] = fvk
+    vjk = numpy.empty((njk,n_dm,nao,nao))
 
     fdrv(cintor, fdot, funpack, fjk, dm1,
          vjk.ctypes.data_as(ctypes.c_void_p),
-         ctypes.c_int(n_dm*2), ctypes.c_int(1),
+         ctypes.c_int(n_dm*njk), ctypes.c_int(1),
          cintopt, cvhfopt,
          c_atm.ctypes.data_as(ctypes.c_void_p), natm,
          c_bas.ctypes.data_as(ctypes.c_void_p), nbas,
@@ -209,15 +300,22 @@ def direct(dms, atm, bas, env, vhfopt=None, hermi=0):
 
     if vhfopt is None:
         libcvhf.CINTdel_optimizer(ctypes.byref(cintopt))
+    else:
+        vhfopt._this.contents.fprescreen = fprescreen
 
-    # vj must be symmetric
-    for idm in range(n_dm):
-        vjk[0,idm] = pyscf.lib.hermi_triu(vjk[0,idm], 1)
-    if hermi != 0: # vk depends
+    if with_j:
+        # vj must be symmetric
         for idm in range(n_dm):
-            vjk[1,idm] = pyscf.lib.hermi_triu(vjk[1,idm], hermi)
+            vjk[0,idm] = pyscf.lib.hermi_triu(vjk[0,idm], 1)
+    if with_k and hermi != 0: # vk depends
+        for idm in range(n_dm):
+            vjk[-1,idm] = pyscf.lib.hermi_triu(vjk[-1,idm], hermi)
     if n_dm == 1:
-        vjk = vjk.reshape(2,nao,nao)
+        vjk = vjk.reshape(njk,nao,nao)
+    if not with_k:
+        return vjk[0], None
+    elif not with_j:
+        return None, vjk[0]
     return vjk
 
 # call all fjk for each dm, the return array has len(dms)*len(jkdescript)*ncomp components
@@ -383,7 +481,8 @@ def direct_bindm(intor, intsymm, jkdescript,
 
 
 # 8-fold permutation symmetry
-def int2e_sph(atm, bas, env):
+# If out is given, the integrals are written to it, e.g. a numpy.memmap
+def int2e_sph(atm, bas, env, out=None):
     c_atm = numpy.array(atm, dtype=numpy.int32)
     c_bas = numpy.array(bas, dtype=numpy.int32)
     c_env = numpy.array(env)
@@ -392,13 +491,46 @@ def int2e_sph(atm, bas, env):
     libcvhf.CINTtot_cgto_spheric.restype = ctypes.c_int
     nao = libcvhf.CINTtot_cgto_spheric(c_bas.ctypes.data_as(ctypes.c_void_p), nbas)
     nao_pair = nao*(nao+1)//2
-    eri = numpy.empty((nao_pair*(nao_pair+1)//2))
+    if out is None:
+        eri = numpy.empty((nao_pair*(nao_pair+1)//2))
+    else:
+        assert(out.size == nao_pair*(nao_pair+1)//2 and out.flags.c_contiguous)
+        eri = out
     libcvhf.int2e_sph_o5(eri.ctypes.data_as(ctypes.c_void_p),
                          c_atm.ctypes.data_as(ctypes.c_void_p), natm,
                          c_bas.ctypes.data_as(ctypes.c_void_p), nbas,
                          c_env.ctypes.data_as(ctypes.c_void_p))
     return eri
 
+def int2e_sph_mmap(mol, filename):
+    '''8-fold ERIs in the memory-mapped file'''
+    nao = mol.nao_nr()
+    nao_pair = nao*(nao+1)//2
+    eri = numpy.memmap(filename, numpy.double, 'w+',
+                       shape=(nao_pair*(nao_pair+1)//2,))
+    int2e_sph(mol._atm, mol._bas, mol._env, out=eri)
+    eri.flush()
+    return eri
+
+def eri_mem_usage(nao, aosym='s8'):
+    '''Memory (in MB) to hold the ERIs with the given permutation symmetry'''
+    nao_pair = nao*(nao+1)//2
+    if aosym in ('s8', 8):
+        return nao_pair*(nao_pair+1)//2 * 8/1e6
+    elif aosym in ('s4', 4):
+        return nao_pair**2 * 8/1e6
+    elif aosym in ('s2ij', 's2kl'):
+        return nao_pair*nao**2 * 8/1e6
+    else:
+        return nao**4 * 8/1e6
+
+def int2e_sph_cached(mol):
+    '''8-fold ERIs.  They are loaded from the persistent integral cache
+    (see :mod:`lib.intcache`) if the cache is enabled.'''
+    key = pyscf.lib.intcache.fingerprint(mol, 'cint2e_sph', 's8')
+    return pyscf.lib.intcache.load_or_build(key,
+            lambda: int2e_sph(mol._atm, mol._bas, mol._env))
+
 
 def incore_o2(eri, dm, hermi=1):
     '''use 4-fold symmetry for eri, ijkl=ijlk=jikl=jilk'''
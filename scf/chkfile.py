@@ -3,9 +3,18 @@
 # Author: Qiming Sun <osirpt.sun@gmail.com>
 #
 
+import time
+import atexit
+import weakref
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 import numpy
 import h5py
 import pyscf.gto
+import pyscf.lib.parameters as param
 
 def load_chkfile_key(chkfile, key):
     return load(chkfile, key)
@@ -66,3 +75,164 @@ def dump_scf(mol, chkfile, hf_energy, mo_energy, mo_coeff, mo_occ):
             fh5['scf/mo_occ'   ] = mo_occ
             fh5['scf/mo_coeff' ] = mo_coeff
 
+
+class AsyncWriter(object):
+    '''Checkpoint writer which keeps the chkfile open and writes the
+    datasets in a background thread.
+
+    The datasets given to :func:`update` are buffered.  The buffered data are
+    sent to the writer thread every flush_cycles updates or every flush_time
+    seconds (whichever comes first, 0 to disable either criterion).  Only the
+    last value of each key is written.  Existing datasets of the same shape
+    and type are overwritten in place.  The groups listed in reset are removed
+    when the file is opened for the first time.  The datasets {key: value} of
+    defaults are written at the same time if they do not exist in the file.
+
+    Examples:
+
+    >>> w = AsyncWriter('h2o.chk', reset=('scf',))
+    >>> for cycle in range(10):
+    ...     w.update({'scf/mo_coeff': mo_coeff, 'scf/hf_energy': e})
+    >>> w.close()  # the data are on disk after close
+    '''
+    def __init__(self, chkfile, reset=(), flush_cycles=None, flush_time=None,
+                 max_queue=2, defaults=None):
+        self.chkfile = chkfile
+        self.reset = reset
+        self.defaults = defaults
+        if flush_cycles is None:
+            flush_cycles = param.CHK_FLUSH_CYCLES
+        if flush_time is None:
+            flush_time = param.CHK_FLUSH_TIME
+        self.flush_cycles = flush_cycles
+        self.flush_time = flush_time
+        self.max_queue = max_queue
+
+        self._pending = {}
+        self._ncycle = 0
+        self._last_flush = time.time()
+        self._queue = None
+        self._thread = None
+        self._error = None
+        self._reset_done = False
+
+    def update(self, dic):
+        '''Buffer the datasets {key: value} and send them to the writer
+        thread when the flush policy is met.'''
+        for key, val in dic.items():
+            if isinstance(val, numpy.ndarray):
+                val = val.copy()
+            self._pending[key] = val
+        self._ncycle += 1
+        if ((self.flush_cycles > 0 and self._ncycle >= self.flush_cycles) or
+            (self.flush_time > 0 and
+             time.time() - self._last_flush >= self.flush_time)):
+            self._submit()
+
+    def _submit(self):
+        if self._pending:
+            if self._thread is None:
+                self._start()
+            self._queue.put(self._pending)  # blocks when the queue is full
+        self._pending = {}
+        self._ncycle = 0
+        self._last_flush = time.time()
+
+    def _start(self):
+        self._queue = queue.Queue(self.max_queue)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        _live_writers.add(self)
+
+    def _run(self):
+        fh5 = None
+        while True:
+            dic = self._queue.get()
+            if dic is None:
+                self._queue.task_done()
+                break
+            try:
+                if fh5 is None:
+                    fh5 = h5py.File(self.chkfile, 'a')
+                    if not self._reset_done:
+                        for key in self.reset:
+                            if key in fh5:
+                                del(fh5[key])
+                        if self.defaults:
+                            for key, val in self.defaults.items():
+                                if key not in fh5:
+                                    fh5[key] = val
+                        self._reset_done = True
+                _write_inplace(fh5, dic)
+                fh5.flush()
+            except Exception as err:
+                self._error = err
+            self._queue.task_done()
+        if fh5 is not None:
+            fh5.close()
+
+    def flush(self):
+        '''Send the buffered data to the writer thread and wait until all
+        data are written.'''
+        self._submit()
+        if self._thread is not None:
+            self._queue.join()
+        self._check_error()
+
+    def close(self):
+        '''Write the buffered data and close the chkfile.  The writer can be
+        used again after close.  The file will be reopened on demand.'''
+        self._submit()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+            self._queue = None
+        _live_writers.discard(self)
+        self._check_error()
+
+    def _check_error(self):
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise err
+
+# Writers with a running thread.  They are closed at exit so that no queued
+# data are lost.  The weak references do not keep the closed writers alive.
+_live_writers = weakref.WeakSet()
+def _close_live_writers():
+    for writer in list(_live_writers):
+        try:
+            writer.close()
+        except Exception:
+            pass
+atexit.register(_close_live_writers)
+
+def get_writer(obj, reset=(), defaults=None):
+    '''The :class:`AsyncWriter` of obj.chkfile, kept in obj._chkwriter.  A
+    new writer is created if obj.chkfile was changed.'''
+    if obj._chkwriter is not None and obj._chkwriter.chkfile != obj.chkfile:
+        close_writer(obj)
+    if obj._chkwriter is None:
+        obj._chkwriter = AsyncWriter(obj.chkfile, reset=reset,
+                                     defaults=defaults)
+    return obj._chkwriter
+
+def close_writer(obj):
+    '''Write the pending data of obj._chkwriter and close the chkfile'''
+    if obj._chkwriter is not None:
+        obj._chkwriter.close()
+        obj._chkwriter = None
+
+def _write_inplace(fh5, dic):
+    for key, val in dic.items():
+        if key in fh5:
+            dset = fh5[key]
+# Only the arrays are updated in place.  Scalars and strings are cheap to
+# rewrite
+            if (isinstance(val, numpy.ndarray) and
+                dset.shape == val.shape and dset.dtype == val.dtype):
+                dset[...] = val
+                continue
+            del(fh5[key])
+        fh5[key] = val
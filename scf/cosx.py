@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+
+r'''
+Seminumerical exchange (chain-of-spheres, COSX)
+
+The exchange matrix is integrated numerically on one electron coordinate and
+analytically on the other
+
+.. math::
+
+    K_{il} = \sum_g w_g \phi_l(g) \sum_j A_{ij}(g) \sum_k D_{jk} \phi_k(g)
+
+    A_{ij}(g) = \int \frac{\phi_i(r)\phi_j(r)}{|r-g|} dr
+
+The grids are the DFT grids of :class:`dft.gen_grid.Grids`.  The potential
+integrals :math:`A_{ij}(g)` are the 3-center 2-electron integrals of the
+point charges at the grid points.  Grid points on which the density matrix
+vanishes are screened.  J matrix is computed by the J builder of the
+underlying SCF object.
+'''
+
+import time
+import numpy
+import pyscf.lib
+from pyscf.lib import logger
+
+GRIDS_LEVEL = 1
+SCREEN_TOL = 1e-11
+
+def cosx(mf, grids=None):
+    '''For the given SCF object, update the K matrix constructor with the
+    seminumerical exchange.
+
+    Args:
+        mf : an SCF object
+
+    Kwargs:
+        grids : an instance of :class:`dft.gen_grid.Grids`
+            The grids to integrate the exchange.  By default, the DFT grids
+            of level GRIDS_LEVEL.
+
+    Returns:
+        An SCF object with a modified J, K matrix constructor which computes
+        K with the seminumerical integration
+
+    Examples:
+
+    >>> mol = gto.M(atom='H 0 0 0; F 0 0 1', basis='ccpvdz', verbose=0)
+    >>> mf = scf.cosx(scf.RHF(mol))
+    >>> e = mf.scf()
+
+    >>> mf = scf.cosx(dft.RKS(mol))
+    >>> mf.xc = 'b3lyp'
+    >>> e = mf.scf()
+    '''
+    import pyscf.scf
+    assert(not isinstance(mf, pyscf.scf.dhf.UHF))
+    mf_class = mf.__class__
+    class HF(mf_class):
+        def __init__(self):
+            self.__dict__.update(mf.__dict__)
+            self.cosx_grids = _default_grids(mf.mol, grids)
+            self._keys = self._keys.union(['cosx_grids'])
+
+        def dump_flags(self):
+            mf_class.dump_flags(self)
+            logger.info(self, 'seminumerical exchange, grids level = %d',
+                        self.cosx_grids.level)
+
+        def get_jk(self, mol=None, dm=None, hermi=1):
+            if mol is None: mol = self.mol
+            if dm is None: dm = self.make_rdm1()
+            vj = mf_class.get_j(self, mol, dm, hermi)
+            vk = get_k_(self, mol, dm, hermi)
+            return vj, vk
+    return HF()
+
+def cosx_(mf, grids=None):
+    '''Replace K constructor of HF object.  See the usage of :func:`cosx`
+    '''
+    import pyscf.scf
+    assert(not isinstance(mf, pyscf.scf.dhf.UHF))
+    get_j = mf.get_j
+    def get_jk(mol=None, dm=None, hermi=1):
+        if mol is None: mol = mf.mol
+        if dm is None: dm = mf.make_rdm1()
+        return get_j(mol, dm, hermi), get_k_(mf, mol, dm, hermi)
+    mf.get_jk = get_jk
+    mf.cosx_grids = _default_grids(mf.mol, grids)
+    mf._keys = mf._keys.union(['cosx_grids'])
+    return mf
+
+
+def get_k_(mf, mol, dms, hermi=1):
+    '''K matrices of the seminumerical exchange on the grids mf.cosx_grids'''
+    from pyscf.dft import numint
+    t0 = (time.clock(), time.time())
+    grids = mf.cosx_grids
+    if grids.coords is None:
+        grids.setup_grids()
+    grids = numint.select_grids(grids, dms)
+
+    if isinstance(dms, numpy.ndarray) and dms.ndim == 2:
+        dms = [dms]
+        nset = 1
+        single = True
+    else:
+        nset = len(dms)
+        single = False
+    nao = mol.nao_nr()
+    vk = numpy.zeros((nset,nao,nao))
+
+    ngrids = len(grids.weights)
+# (ij|g) of a block of grids, ao values and intermediates
+    blksize = int(mf.max_memory*.5e6/8/(nao*nao+nao*(nset+2)))
+    blksize = min(ngrids, max(numint.BLKSIZE, blksize))
+    nskip = 0
+    for p0, p1 in numint.prange(0, ngrids, blksize):
+        coords = numpy.asarray(grids.coords[p0:p1], order='C')
+        weights = grids.weights[p0:p1]
+        ao = numint.eval_ao(mol, coords)[0]
+        fg = [pyscf.lib.dot(ao, numpy.asarray(dm).T) for dm in dms]
+
+# Screen the grids on which ao*w and dm*ao are negligible
+        amax = abs(ao).max(axis=1) * abs(weights)
+        fmax = numpy.max([abs(f).max(axis=1) for f in fg], axis=0)
+        mask = amax * fmax > SCREEN_TOL
+        nskip += (p1-p0) - mask.sum()
+        if not mask.any():
+            continue
+
+        vg = grid_e1(mol, coords[mask])
+        wao = ao[mask] * weights[mask,None]
+        for k in range(nset):
+            gv = numpy.einsum('ijg,gj->gi', vg, fg[k][mask])
+            vk[k] += pyscf.lib.dot(gv.T, wao)
+        vg = ao = fg = None
+    logger.debug(mf, 'COSX %d of %d grids are screened', nskip, ngrids)
+    if getattr(grids, 'symm_orb', None) is not None:
+        vk = numint.symmetrize_mat(vk, grids.symm_orb)
+
+    if hermi == 1:
+        vk = (vk + vk.transpose(0,2,1)) * .5
+    elif hermi == 2:
+        vk = (vk - vk.transpose(0,2,1)) * .5
+    if single:
+        vk = vk[0]
+    logger.timer(mf, 'vk (COSX)', *t0)
+    return vk
+
+def grid_e1(mol, coords):
+    '''Potential integrals A_ij(g) = (ij|1/|r-g|) of the point charges at the
+    given coords.  The returned array has the shape (nao,nao,ngrids).
+    '''
+    from pyscf import df
+    fakemol = fake_mol_for_charges(coords)
+    nao = mol.nao_nr()
+    return df.incore.aux_e2(mol, fakemol, 'cint3c2e_sph',
+                            aosym='s1').reshape(nao,nao,-1)
+
+def fake_mol_for_charges(coords, expnt=1e16):
+    '''A Mole object of s-type Gaussians which approximates the unit point
+    charges at the given coords.
+    '''
+    import pyscf.gto
+    from pyscf.gto import mole
+    coords = numpy.asarray(coords).reshape(-1,3)
+    nbas = len(coords)
+    fakeatm = numpy.zeros((nbas,mole.ATM_SLOTS), dtype=numpy.int32)
+    fakebas = numpy.zeros((nbas,mole.BAS_SLOTS), dtype=numpy.int32)
+    fakeenv = numpy.empty(mole.PTR_ENV_START + nbas*3 + 2)
+    ptr = mole.PTR_ENV_START
+    fakeatm[:,mole.PTR_COORD] = numpy.arange(ptr, ptr+nbas*3, 3)
+    fakeenv[ptr:ptr+nbas*3] = coords.ravel()
+    ptr += nbas*3
+    fakebas[:,mole.ATOM_OF] = numpy.arange(nbas)
+    fakebas[:,mole.NPRIM_OF] = 1
+    fakebas[:,mole.NCTR_OF] = 1
+    fakebas[:,mole.PTR_EXP] = ptr
+    fakebas[:,mole.PTR_COEFF] = ptr+1
+# normalize the s-type Gaussian (with the angular factor 1/sqrt(4pi)) to 1
+    fakeenv[ptr] = expnt
+    fakeenv[ptr+1] = 2 * expnt**1.5 / numpy.pi
+    fakeenv[:mole.PTR_ENV_START] = 0
+    fakemol = pyscf.gto.Mole()
+    fakemol._atm = fakeatm
+    fakemol._bas = fakebas
+    fakemol._env = fakeenv
+    fakemol.natm = nbas
+    fakemol.nbas = nbas
+    fakemol._built = True
+    return fakemol
+
+def _default_grids(mol, grids=None):
+    if grids is None:
+        from pyscf.dft import gen_grid
+        grids = gen_grid.Grids(mol)
+        grids.level = GRIDS_LEVEL
+    return grids
+
+
+if __name__ == '__main__':
+    import pyscf.gto
+    import pyscf.scf
+    mol = pyscf.gto.Mole()
+    mol.build(
+        verbose = 0,
+        atom = [["O" , (0. , 0.     , 0.)],
+                [1   , (0. , -0.757 , 0.587)],
+                [1   , (0. , 0.757  , 0.587)] ],
+        basis = 'ccpvdz',
+    )
+
+    mf = cosx(pyscf.scf.RHF(mol))
+    print(mf.scf() - -76.026765673119627)
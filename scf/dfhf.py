@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import os
 import time
 import ctypes
 import tempfile
@@ -54,6 +55,14 @@ def density_fit(mf, auxbasis='weigend'):
                 return r_get_jk_(self, mol, dm, hermi)
             else:
                 return get_jk_(self, mol, dm, hermi)
+
+        def get_j(self, mol=None, dm=None, hermi=1):
+            if mol is None: mol = self.mol
+            if dm is None: dm = self.make_rdm1()
+            if isinstance(self, pyscf.scf.dhf.UHF):
+                return r_get_jk_(self, mol, dm, hermi)[0]
+            else:
+                return get_jk_(self, mol, dm, hermi, with_k=False)[0]
     return HF()
 
 def density_fit_(mf, auxbasis='weigend'):
@@ -67,7 +76,15 @@ def density_fit_(mf, auxbasis='weigend'):
             return r_get_jk_(mf, mol, dm, hermi)
         else:
             return get_jk_(mf, mol, dm, hermi)
+    def get_j(mol, dm, hermi=1):
+        if mol is None: mol = mf.mol
+        if dm is None: dm = mf.make_rdm1()
+        if isinstance(mf, pyscf.scf.dhf.UHF):
+            return r_get_jk_(mf, mol, dm, hermi)[0]
+        else:
+            return get_jk_(mf, mol, dm, hermi, with_k=False)[0]
     mf.get_jk = get_jk
+    mf.get_j = get_j
     mf.auxbasis = auxbasis
     mf._cderi = None
     mf.direct_scf = False
@@ -78,19 +95,34 @@ def density_fit_(mf, auxbasis='weigend'):
 OCCDROP = 1e-12
 BLOCKDIM = 120
 _call_count = 0
-def get_jk_(mf, mol, dms, hermi=1):
+def get_jk_(mf, mol, dms, hermi=1, with_k=True):
+    '''J, K matrices with the density fitting integrals.  If with_k is
+    False, only the J matrices are computed and K is None.'''
     from pyscf import df
     from pyscf.ao2mo import _ao2mo
     t0 = (time.clock(), time.time())
     log = logger.Logger(mf.stdout, mf.verbose)
+    if (isinstance(getattr(mf, '_cderi', None), str) and
+        not os.path.isfile(mf._cderi)):
+# The file in lib.intcache can be evicted by other caches
+        log.debug('%s was removed, rebuild the DF integrals', mf._cderi)
+        mf._cderi = None
     if not hasattr(mf, '_cderi') or mf._cderi is None:
         nao = mol.nao_nr()
         auxmol = df.incore.format_aux_basis(mol, mf.auxbasis)
         mf._naoaux = auxmol.nao_nr()
+        key = pyscf.lib.intcache.fingerprint(mol, 'cderi', mf.auxbasis)
         if nao*(nao+1)/2*mf._naoaux*8 < mf.max_memory*1e6:
-            mf._cderi = df.incore.cholesky_eri(mol, auxbasis=mf.auxbasis,
-                                               verbose=log)
+            mf._cderi = pyscf.lib.intcache.load_or_build(key,
+                    lambda: df.incore.cholesky_eri(mol, auxbasis=mf.auxbasis,
+                                                   verbose=log))
         else:
+            mf._cderi = pyscf.lib.intcache.load_or_build_file(key,
+                    lambda erifile: df.outcore.cholesky_eri(mol, erifile,
+                                                            auxbasis=mf.auxbasis,
+                                                            verbose=log),
+                    nao*(nao+1)/2*mf._naoaux*8/1e6)
+        if mf._cderi is None:
             mf._cderi_file = tempfile.NamedTemporaryFile()
             mf._cderi = mf._cderi_file.name
             mf._cderi = df.outcore.cholesky_eri(mol, mf._cderi,
@@ -114,106 +146,132 @@ def get_jk_(mf, mol, dms, hermi=1):
         nset = 1
     else:
         nset = len(dms)
-    vj = numpy.zeros((nset,nao,nao))
-    vk = numpy.zeros((nset,nao,nao))
+# All densities are contracted together in one GEMM per aux block
+    dmtril = numpy.empty((nao*(nao+1)//2,nset))
+    for k, dm in enumerate(dms):
+        dmtril[:,k] = pyscf.lib.pack_tril(dm+dm.T)
+        for i in range(nao):
+            dmtril[i*(i+1)//2+i,k] *= .5
+    vjtril = numpy.zeros((nset,nao*(nao+1)//2))
+
+    if not with_k:
+        with df.load(cderi) as feri:
+            blocks = prange(0, mf._naoaux, BLOCKDIM)
+            for b0, b1, eri1 in df.prefetch_blocks(feri, blocks, mf.max_memory):
+                rho = numpy.dot(eri1, dmtril)
+                vjtril += numpy.dot(rho.T, eri1)
+        vj = numpy.array([pyscf.lib.unpack_tril(v, 1) for v in vjtril])
+        if len(dms) == 1:
+            vj = vj[0]
+        logger.timer(mf, 'vj', *t0)
+        return vj, None
 
+    vk = numpy.zeros((nset,nao,nao))
     #:vj = reduce(numpy.dot, (cderi.reshape(-1,nao*nao), dm.reshape(-1),
     #:                        cderi.reshape(-1,nao*nao))).reshape(nao,nao)
     if hermi == 1:
 # I cannot assume dm is positive definite because it might be the density
 # matrix difference when the mf.direct_scf flag is set.
-        dmtril = []
-        cpos = []
-        cneg = []
+# The eigenvectors of all densities are stacked as the columns of one matrix.
+# cols[k] = (start, number of positive eigenvalues, end) of the k-th dm
+        cfac = []
+        cols = []
+        ncol = 0
         for k, dm in enumerate(dms):
-            dmtril.append(pyscf.lib.pack_tril(dm+dm.T))
-            for i in range(nao):
-                dmtril[k][i*(i+1)//2+i] *= .5
-
             e, c = scipy.linalg.eigh(dm)
             pos = e > OCCDROP
             neg = e < -OCCDROP
 
             #:vk = numpy.einsum('pij,jk->kpi', cderi, c[:,abs(e)>OCCDROP])
             #:vk = numpy.einsum('kpi,kpj->ij', vk, vk)
-            cpos.append(numpy.asarray(numpy.einsum('ij,j->ij', c[:,pos],
-                                                   numpy.sqrt(e[pos])), order='F'))
-            cneg.append(numpy.asarray(numpy.einsum('ij,j->ij', c[:,neg],
-                                                   numpy.sqrt(-e[neg])),order='F'))
-        if mf.verbose >= logger.DEBUG1:
-            t1 = log.timer('Initialization', *t0)
-        with df.load(cderi) as feri:
-            for b0, b1 in prange(0, mf._naoaux, BLOCKDIM):
-                eri1 = numpy.array(feri[b0:b1], copy=False)
-                if mf.verbose >= logger.DEBUG1:
-                    t1 = log.timer('load buf %d:%d'%(b0,b1), *t1)
-                for k in range(nset):
-                    buf = reduce(numpy.dot, (eri1, dmtril[k], eri1))
-                    vj[k] += pyscf.lib.unpack_tril(buf, hermi)
-                    if cpos[k].shape[1] > 0:
-                        buf = numpy.empty(((b1-b0)*cpos[k].shape[1],nao))
-                        fdrv(ftrans, fmmm,
-                             buf.ctypes.data_as(ctypes.c_void_p),
-                             eri1.ctypes.data_as(ctypes.c_void_p),
-                             cpos[k].ctypes.data_as(ctypes.c_void_p),
-                             ctypes.c_int(b1-b0), ctypes.c_int(nao),
-                             ctypes.c_int(0), ctypes.c_int(cpos[k].shape[1]),
-                             ctypes.c_int(0), ctypes.c_int(0))
-                        vk[k] += pyscf.lib.dot(buf.T, buf)
-                    if cneg[k].shape[1] > 0:
-                        buf = numpy.empty(((b1-b0)*cneg[k].shape[1],nao))
-                        fdrv(ftrans, fmmm,
-                             buf.ctypes.data_as(ctypes.c_void_p),
-                             eri1.ctypes.data_as(ctypes.c_void_p),
-                             cneg[k].ctypes.data_as(ctypes.c_void_p),
-                             ctypes.c_int(b1-b0), ctypes.c_int(nao),
-                             ctypes.c_int(0), ctypes.c_int(cneg[k].shape[1]),
-                             ctypes.c_int(0), ctypes.c_int(0))
-                        vk[k] -= pyscf.lib.dot(buf.T, buf)
-                if mf.verbose >= logger.DEBUG1:
-                    t1 = log.timer('jk', *t1)
+            cfac.append(numpy.einsum('ij,j->ij', c[:,pos], numpy.sqrt(e[pos])))
+            cfac.append(numpy.einsum('ij,j->ij', c[:,neg], numpy.sqrt(-e[neg])))
+            cols.append((ncol, ncol+pos.sum(), ncol+pos.sum()+neg.sum()))
+            ncol = cols[-1][2]
+        cfac = numpy.asarray(numpy.hstack(cfac), order='F')
+        colseg = _split_columns(mf, cols, nao)
     else:
         #:vk = numpy.einsum('pij,jk->pki', cderi, dm)
         #:vk = numpy.einsum('pki,pkj->ij', cderi, vk)
         fcopy = df.incore._fpointer('RImmm_nr_s2_copy')
-        rargs = (ctypes.c_int(nao),
-                 ctypes.c_int(0), ctypes.c_int(nao),
-                 ctypes.c_int(0), ctypes.c_int(0))
-        dms = [numpy.asarray(dm, order='F') for dm in dms]
-        if mf.verbose >= logger.DEBUG1:
-            t1 = log.timer('Initialization', *t0)
-        with df.load(cderi) as feri:
-            for b0, b1 in prange(0, mf._naoaux, BLOCKDIM):
-                eri1 = numpy.array(feri[b0:b1], copy=False)
-                if mf.verbose >= logger.DEBUG1:
-                    t1 = log.timer('load buf %d:%d'%(b0,b1), *t1)
-                for k in range(nset):
-                    buf = numpy.empty((b1-b0,nao,nao))
-                    fdrv(ftrans, fmmm,
-                         buf.ctypes.data_as(ctypes.c_void_p),
-                         eri1.ctypes.data_as(ctypes.c_void_p),
-                         dms[k].ctypes.data_as(ctypes.c_void_p),
-                         ctypes.c_int(b1-b0), *rargs)
-                    rho = numpy.einsum('kii->k', buf)
-                    vj[k] += pyscf.lib.unpack_tril(numpy.dot(rho, eri1), 1)
-
-                    buf1 = numpy.empty((b1-b0,nao,nao))
-                    fdrv(ftrans, fcopy,
-                         buf1.ctypes.data_as(ctypes.c_void_p),
-                         eri1.ctypes.data_as(ctypes.c_void_p),
-                         dms[k].ctypes.data_as(ctypes.c_void_p),
-                         ctypes.c_int(b1-b0), *rargs)
-                    vk[k] += pyscf.lib.dot(buf.reshape(-1,nao).T,
-                                           buf1.reshape(-1,nao))
-                if mf.verbose >= logger.DEBUG1:
-                    t1 = log.timer('jk', *t1)
-
+        cfac = numpy.asarray(numpy.hstack(dms), order='F')
+        cols = [(k*nao, (k+1)*nao, (k+1)*nao) for k in range(nset)]
+        colseg = _split_columns(mf, cols, nao)
+    if mf.verbose >= logger.DEBUG1:
+        t1 = log.timer('Initialization', *t0)
+
+    with df.load(cderi) as feri:
+        blocks = prange(0, mf._naoaux, BLOCKDIM)
+        for b0, b1, eri1 in df.prefetch_blocks(feri, blocks, mf.max_memory):
+            if mf.verbose >= logger.DEBUG1:
+                t1 = log.timer('load buf %d:%d'%(b0,b1), *t1)
+            naux = b1 - b0
+            rho = numpy.dot(eri1, dmtril)
+            vjtril += numpy.dot(rho.T, eri1)
+
+            if hermi != 1:
+                buf1 = numpy.empty((naux,nao,nao))
+                fdrv(ftrans, fcopy,
+                     buf1.ctypes.data_as(ctypes.c_void_p),
+                     eri1.ctypes.data_as(ctypes.c_void_p),
+                     cfac.ctypes.data_as(ctypes.c_void_p),
+                     ctypes.c_int(naux), ctypes.c_int(nao),
+                     ctypes.c_int(0), ctypes.c_int(nao),
+                     ctypes.c_int(0), ctypes.c_int(0))
+                buf1 = buf1.reshape(-1,nao)
+
+            for c0, c1, kset in colseg:
+                if c1 == c0:
+                    continue
+                buf = numpy.empty((naux,c1-c0,nao))
+                fdrv(ftrans, fmmm,
+                     buf.ctypes.data_as(ctypes.c_void_p),
+                     eri1.ctypes.data_as(ctypes.c_void_p),
+                     cfac.ctypes.data_as(ctypes.c_void_p),
+                     ctypes.c_int(naux), ctypes.c_int(nao),
+                     ctypes.c_int(c0), ctypes.c_int(c1-c0),
+                     ctypes.c_int(0), ctypes.c_int(0))
+                for k in kset:
+                    p0, p1, p2 = [x-c0 for x in cols[k]]
+                    if hermi == 1:
+                        if p1 > p0:
+                            v = buf[:,p0:p1].reshape(-1,nao)
+                            vk[k] += pyscf.lib.dot(v.T, v)
+                        if p2 > p1:
+                            v = buf[:,p1:p2].reshape(-1,nao)
+                            vk[k] -= pyscf.lib.dot(v.T, v)
+                    else:
+                        v = buf[:,p0:p1].reshape(-1,nao)
+                        vk[k] += pyscf.lib.dot(v.T, buf1)
+            if mf.verbose >= logger.DEBUG1:
+                t1 = log.timer('jk', *t1)
+
+    vj = numpy.array([pyscf.lib.unpack_tril(v, 1) for v in vjtril])
     if len(dms) == 1:
         vj = vj[0]
         vk = vk[0]
     logger.timer(mf, 'vj and vk', *t0)
     return vj, vk
 
+def _split_columns(mf, cols, nao):
+    '''Group the densities so that the half-transformed integrals of each
+    group fit in memory.  Return [(first column, last column, [dm ids]), ...]
+    '''
+    maxcol = max(nao, int(mf.max_memory*.25e6/8/(BLOCKDIM*nao)))
+    segs = []
+    c0 = c1 = 0
+    kset = []
+    for k, (p0, p1, p2) in enumerate(cols):
+        if kset and p2 - c0 > maxcol:
+            segs.append((c0, c1, kset))
+            c0 = p0
+            kset = []
+        kset.append(k)
+        c1 = p2
+    if kset:
+        segs.append((c0, c1, kset))
+    return segs
+
 
 def r_get_jk_(mf, mol, dms, hermi=1):
     '''Relativistic density fitting JK'''
@@ -8,9 +8,9 @@ DIIS
 """
 
 import os
-import tempfile
 from functools import reduce
 import numpy
+import pyscf.lib
 import pyscf.lib.logger as log
 
 
@@ -32,6 +32,9 @@ diis.min_space is the minimal number of vectors to store before damping'''
         self.conv_tol = 1e-6
         self.space = 6
         self.min_space = 1
+# overlap matrix of the error vectors held in the DIIS space.  It is updated
+# incrementally, see _update_err_ovlp
+        self._err_ovlp = None
 
     def push_vec(self, x):
         self._vec_stack.append(x)
@@ -52,20 +55,15 @@ diis.min_space is the minimal number of vectors to store before damping'''
         self.push_vec(x)
 
         nd = self.get_num_diis_vec()
+        self._update_err_ovlp(nd, x.dtype)
         if nd <= self.min_space:
             return x
 
         H = numpy.ones((nd+1,nd+1), x.dtype)
         H[0,0] = 0
+        H[1:,1:] = self._err_ovlp
         G = numpy.zeros(nd+1, x.dtype)
         G[0] = 1
-        for i in range(nd):
-            dti = self.get_err_vec(i)
-            for j in range(i+1):
-                dtj = self.get_err_vec(j)
-                H[i+1,j+1] = numpy.dot(numpy.array(dti).ravel(), \
-                                       numpy.array(dtj).ravel())
-                H[j+1,i+1] = H[i+1,j+1].conj()
 
         try:
             c = numpy.linalg.solve(H, G)
@@ -87,44 +85,50 @@ diis.min_space is the minimal number of vectors to store before damping'''
             x += self.get_vec(i) * ci
         return x
 
+    def _update_err_ovlp(self, nd, dtype):
+        '''Update the overlap matrix of the nd error vectors in the DIIS space.
+        Rows and columns of the error vectors which were pushed out of the
+        space are dropped.  Only the overlaps with the newly pushed error
+        vectors are computed.
+        '''
+        if self._err_ovlp is None:
+            nkeep = 0
+        else:
+            # every call brings one new error vector
+            nkeep = max(0, min(nd-1, self._err_ovlp.shape[0]))
+        ovlp = numpy.empty((nd,nd), dtype)
+        if nkeep > 0:
+            ovlp[:nkeep,:nkeep] = self._err_ovlp[-nkeep:,-nkeep:]
+        for i in range(nkeep, nd):
+            dti = numpy.asarray(self.get_err_vec(i)).ravel()
+            for j in range(i+1):
+                dtj = numpy.asarray(self.get_err_vec(j)).ravel()
+                ovlp[i,j] = numpy.dot(dti, dtj)
+                ovlp[j,i] = ovlp[i,j].conj()
+        self._err_ovlp = ovlp
+        return ovlp
+
 class DIISLarge(DIIS):
+    '''DIIS vectors are held in a memory-mapped ring buffer on disk'''
     def __init__(self, dev, filename=None):
-        import h5py
         DIIS.__init__(self, dev)
-        if filename is None:
-            self._tmpfile = tempfile.NamedTemporaryFile(suffix='.h5')
-            filename = self._tmpfile.name
-        self.diisfile = h5py.File(filename, 'w')
-        self._count = 0
-        self._head = 0
-        self._is_tmpfile_reused = False
+        self.filename = filename
+        self._buf = None
 
     def push_vec(self, x):
-        key = 'x%d' % (self._count % self.space)
-        if self._count < self.space:
-            self.diisfile[key] = x
-        else:
-            self.diisfile[key][:] = x
-        self._count += 1
+        if self._buf is None:
+            self._buf = pyscf.lib.RingBuffer(x.shape, x.dtype, self.space,
+                                             self.filename)
+        self._buf.append(x)
 
     def get_err_vec(self, idx):
-        if self._count < self.space:
-            return numpy.array(self.diisfile['x%d'%(idx+1)]) \
-                 - numpy.array(self.diisfile['x%d'%idx])
-        else:
-# the previous vector may refer to the last one in circular store
-            last_id = (idx+self.space-1) % self.space
-            return numpy.array(self.diisfile['x%d'%idx]) \
-                 - numpy.array(self.diisfile['x%d'%last_id])
+        return self._buf[idx+1] - self._buf[idx]
 
     def get_vec(self, idx):
-        if self._count < self.space:
-            return numpy.array(self.diisfile['x%d'%(idx+1)])
-        else:
-            return numpy.array(self.diisfile['x%d'%idx])
+        return self._buf[idx+1]
 
     def get_num_diis_vec(self):
-        return len(self.diisfile.keys()) - 1
+        return len(self._buf) - 1
 
 
 # error vector = SDF-FDS
@@ -139,6 +143,7 @@ class SCF_DIIS(DIIS):
     def clear_diis_space(self):
         self._vec_stack = []
         self.err_vec_stack = []
+        self._err_ovlp = None
 
     def push_err_vec(self, s, d, f):
         sdf = reduce(numpy.dot, (s,d,f))
@@ -39,6 +39,7 @@ def kernel(mf, conv_tol=1e-10, dump_chk=True, dm0=None, callback=None,
             | mf.energy_tot
             | mf.check_dm_conv
             | mf.dump_chk
+            | mf.close_chk
 
     Kwargs:
         conv_tol : float
@@ -82,6 +83,14 @@ Keyword argument "init_dm" is replaced by "dm0"''')
     except:
         adiis = None
 
+    adaptive = mf.direct_scf_adaptive and mf.direct_scf and mf.opt is not None
+    if adaptive:
+        mf._direct_scf_tol = mf.direct_scf_tol_loose
+        mf._direct_scf_rebuild_at = (0, mf._direct_scf_tol)
+        log.info(mf, 'adaptive direct_scf_tol, start from %g',
+                 mf._direct_scf_tol)
+    rebuild = False
+
     vhf = mf.get_veff(mol, dm)
     hf_energy = mf.energy_tot(dm, h1e, vhf)
     log.info(mf, 'init E=%.15g', hf_energy)
@@ -93,23 +102,36 @@ Keyword argument "init_dm" is replaced by "dm0"''')
     scf_conv = False
     cycle = 0
     cput1 = log.timer(mf, 'initialize scf', *cput0)
-    while not scf_conv and cycle < max(1, mf.max_cycle):
-        dm_last = dm
-        last_hf_e = hf_energy
-
-        fock = mf.get_fock(h1e, s1e, vhf, dm, cycle, adiis)
-        mo_energy, mo_coeff = mf.eig(fock, s1e)
-        mo_occ = mf.get_occ(mo_energy, mo_coeff)
-        dm = mf.make_rdm1(mo_coeff, mo_occ)
-        vhf = mf.get_veff(mol, dm, dm_last=dm_last, vhf_last=vhf)
-        hf_energy = mf.energy_tot(dm, h1e, vhf)
+# The checkpoint data are written in background during the SCF iterations
+    if dump_chk and mf.chkfile:
+        chkfile.get_writer(mf, reset=('scf',),
+                           defaults={'mol': format(mol.pack())})
+    try:
+        while not scf_conv and cycle < max(1, mf.max_cycle):
+            dm_last = dm
+            last_hf_e = hf_energy
+
+            fock = mf.get_fock(h1e, s1e, vhf, dm, cycle, adiis)
+            mo_energy, mo_coeff = mf.eig(fock, s1e)
+            mo_occ = mf.get_occ(mo_energy, mo_coeff)
+            dm = mf.make_rdm1(mo_coeff, mo_occ)
+            if rebuild:
+                log.debug(mf, 'rebuild HF potential, direct_scf_tol = %g',
+                          mf._direct_scf_tol)
+                vhf = mf.get_veff(mol, dm)
+            else:
+                vhf = mf.get_veff(mol, dm, dm_last=dm_last, vhf_last=vhf)
+            hf_energy = mf.energy_tot(dm, h1e, vhf)
 
-        log.info(mf, 'cycle= %d E=%.15g, delta_E= %g', \
-                 cycle+1, hf_energy, hf_energy-last_hf_e)
+            log.info(mf, 'cycle= %d E=%.15g, delta_E= %g', \
+                     cycle+1, hf_energy, hf_energy-last_hf_e)
 
-        if abs((hf_energy-last_hf_e)/hf_energy)*1e2 < conv_tol \
-           and mf.check_dm_conv(dm, dm_last, conv_tol):
-            scf_conv = True
+            if abs((hf_energy-last_hf_e)/hf_energy)*1e2 < conv_tol \
+               and mf.check_dm_conv(dm, dm_last, conv_tol):
+                scf_conv = True
+            if adaptive:
+                scf_conv, rebuild = \
+                        adapt_direct_scf_tol(mf, s1e, dm, h1e+vhf, cycle, scf_conv)
 
 #TODO        if callback is not None:
 #TODO            try:
@@ -117,15 +139,63 @@ Keyword argument "init_dm" is replaced by "dm0"''')
 #TODO            except:
 #TODO                import traceback
 #TODO                traceback.print_exc(file=sys.stderr)
+            if dump_chk:
+                mf.dump_chk(hf_energy, mo_energy, mo_coeff, mo_occ)
+            cput1 = log.timer(mf, 'cycle= %d'%(cycle+1), *cput1)
+            cycle += 1
+    finally:
         if dump_chk:
-            mf.dump_chk(hf_energy, mo_energy, mo_coeff, mo_occ)
-        cput1 = log.timer(mf, 'cycle= %d'%(cycle+1), *cput1)
-        cycle += 1
-
+            mf.close_chk()
+        if adaptive:
+            mf._direct_scf_tol = None
     log.timer(mf, 'scf_cycle', *cput0)
 
     return scf_conv, hf_energy, mo_energy, mo_coeff, mo_occ
 
+def adapt_direct_scf_tol(mf, s1e, dm, fock, cycle, scf_conv):
+    '''Update the integral screening threshold of the adaptive direct SCF.
+
+    The threshold is 1e-4 times the DIIS error max|FDS-SDF|, bounded by
+    mf.direct_scf_tol_loose and mf.direct_scf_tol.  It is never loosened
+    during the SCF iterations.  The SCF cannot converge before the threshold
+    reaches mf.direct_scf_tol.
+
+    Returns:
+        scf_conv : bool
+            scf_conv is set to False if the threshold was not tight enough.
+        rebuild : bool
+            Whether to rebuild the HF potential with the full density matrix
+            in the next cycle.  It is required when the threshold is tightened
+            by 10 times since the last rebuild, when it reaches
+            mf.direct_scf_tol, or every mf.direct_scf_rebuild_cycle cycles,
+            to remove the errors accumulated in the incremental Fock build.
+    '''
+    tol0 = mf._direct_scf_tol
+    if scf_conv:
+        tol = mf.direct_scf_tol
+        scf_conv = tol0 <= mf.direct_scf_tol
+    else:
+        if isinstance(dm, numpy.ndarray) and dm.ndim == 2:
+            dm = (dm,)
+            fock = (fock,)
+        err = 0
+        for d, f in zip(dm, fock):
+            fds = reduce(numpy.dot, (f, d, s1e))
+            err = max(err, abs(fds - fds.T.conj()).max())
+        tol = min(mf.direct_scf_tol_loose, max(mf.direct_scf_tol, err*1e-4))
+        tol = min(tol0, tol)
+        log.debug(mf, 'max|FDS-SDF| = %g, direct_scf_tol = %g', err, tol)
+    mf._direct_scf_tol = tol
+
+    cycle0, tol_rebuild = mf._direct_scf_rebuild_at
+    rebuild = (tol < tol_rebuild*.1 or
+               (tol <= mf.direct_scf_tol and tol < tol_rebuild) or
+               (mf.direct_scf_rebuild_cycle > 0 and
+                cycle+1 - cycle0 >= mf.direct_scf_rebuild_cycle))
+    if rebuild:
+        mf._direct_scf_rebuild_at = (cycle+1, tol)
+    return scf_conv, rebuild
+
 def energy_elec(mf, dm, h1e=None, vhf=None):
     r'''Electronic part of Hartree-Fock energy, for given core hamiltonian and
     HF potential
@@ -391,13 +461,14 @@ def make_rdm1(mo_coeff, mo_occ):
 # hermi = 1 : hermitian
 # hermi = 2 : anti-hermitian
 ################################################
-def dot_eri_dm(eri, dm, hermi=0):
+def dot_eri_dm(eri, dm, hermi=0, with_k=True):
     '''Compute J, K matrices in terms of the given 2-electron integrals and
     density matrix
 
     Args:
         eri : ndarray
-            8-fold or 4-fold ERIs
+            8-fold or 4-fold ERIs.  8-fold ERIs in numpy.memmap are loaded
+            and contracted block by block.
         dm : ndarray or list of ndarrays
             A density matrix or a list of density matrices
 
@@ -409,6 +480,9 @@ def dot_eri_dm(eri, dm, hermi=0):
             | 1 : hermitian
             | 2 : anti-hermitian
 
+        with_k : bool
+            If False, only J is computed and K is None
+
     Returns:
         Depending on the given dm, the function returns one J and one K matrix,
         or a list of J matrices and a list of K matrices, corresponding to the
@@ -426,14 +500,17 @@ def dot_eri_dm(eri, dm, hermi=0):
     (3, 2, 2)
     '''
     if isinstance(dm, numpy.ndarray) and dm.ndim == 2:
-        vj, vk = _vhf.incore(eri, dm, hermi=hermi)
+        vj, vk = _vhf.incore(eri, dm, hermi=hermi, with_k=with_k)
     else:
-        vjk = [_vhf.incore(eri, dmi, hermi=hermi) for dmi in dm]
+        vjk = [_vhf.incore(eri, dmi, hermi=hermi, with_k=with_k) for dmi in dm]
         vj = numpy.array([v[0] for v in vjk])
-        vk = numpy.array([v[1] for v in vjk])
+        if with_k:
+            vk = numpy.array([v[1] for v in vjk])
+        else:
+            vk = None
     return vj, vk
 
-def get_jk(mol, dm, hermi=1, vhfopt=None):
+def get_jk(mol, dm, hermi=1, vhfopt=None, with_k=True, with_j=True):
     '''Compute J, K matrices for the given density matrix
 
     Args:
@@ -452,7 +529,14 @@ def get_jk(mol, dm, hermi=1, vhfopt=None):
 
         vhfopt :
             A class which holds precomputed quantities to optimize the
-            computation of J, K matrices
+            computation of J, K matrices.  If not given, the libcint optimizer
+            cached in mol (see :func:`_vhf.get_vhfopt`) is used.
+
+        with_k : bool
+            If False, only J is computed and K is None
+
+        with_j : bool
+            If False, only K is computed and J is None
 
     Returns:
         Depending on the given dm, the function returns one J and one K matrix,
@@ -469,11 +553,49 @@ def get_jk(mol, dm, hermi=1, vhfopt=None):
     >>> print(j.shape)
     (3, 2, 2)
     '''
+    if vhfopt is None:
+        vhfopt = _vhf.get_vhfopt(mol, 'cint2e_sph')
     vj, vk = _vhf.direct(numpy.array(dm, copy=False),
                          mol._atm, mol._bas, mol._env,
-                         vhfopt=vhfopt, hermi=hermi)
+                         vhfopt=vhfopt, hermi=hermi, with_k=with_k,
+                         with_j=with_j)
     return vj, vk
 
+def get_jk_link(mol, dm, hermi=1, vhfopt=None):
+    '''Compute J and K matrices in two separated passes of the integral-direct
+    algorithm.  With the CVHFnrs8_prescreen optimizer, the integrals for J
+    are screened by the Coulomb bound and the integrals for K are screened by
+    the density weighted exchange bound (LinK-style).  For large insulating
+    molecules, most shell quartets do not contribute to K and are skipped in
+    the second pass.
+
+    See :func:`get_jk` for the arguments.
+    '''
+    vj = get_jk(mol, dm, hermi, vhfopt, with_k=False)[0]
+    vk = get_jk(mol, dm, hermi, vhfopt, with_j=False)[1]
+    return vj, vk
+
+def _get_jk_direct(mf, mol, dm, hermi=1, with_k=True):
+    '''J (and K if with_k) by the integral-direct algorithm with the
+    screening settings of mf.  vk is None if with_k is False'''
+    if mf.opt is not None:  # shared by other SCF objects
+        mf.opt.direct_scf_tol = mf.get_direct_scf_tol()
+    if with_k and mf.direct_scf_link:
+        return get_jk_link(mol, dm, hermi, mf.opt)
+    else:
+        return get_jk(mol, dm, hermi, mf.opt, with_k=with_k)
+
+def _get_jk(mf, mol, dm, hermi=1, with_k=True):
+    '''J (and K if with_k) from mf._eri if the ERIs are held in memory or in
+    the memory-mapped file, otherwise by the integral-direct algorithm'''
+    mf._init_mmap_eri(mol)
+    if mf._eri is not None or mf._is_mem_enough():
+        if mf._eri is None:
+            mf._eri = _vhf.int2e_sph_cached(mol)
+        return dot_eri_dm(mf._eri, dm, hermi, with_k=with_k)
+    else:
+        return _get_jk_direct(mf, mol, dm, hermi, with_k)
+
 def get_veff(mol, dm, dm_last=0, vhf_last=0, hermi=1, vhfopt=None):
     '''Hartree-Fock potential matrix for the given density matrix
 
@@ -655,6 +777,26 @@ class SCF(object):
             Direct SCF is used by default.
         direct_scf_tol : float
             Direct SCF cutoff threshold.  Default is 1e-13.
+        direct_scf_link : bool
+            Whether to compute J and K separately in direct SCF, to screen
+            the integrals of K with the density weighted exchange bound.  See
+            :func:`get_jk_link`.  Default is False.
+        direct_scf_adaptive : bool
+            Whether to adjust the direct SCF cutoff during the SCF iterations.
+            The cutoff starts from direct_scf_tol_loose and is tightened
+            with the DIIS error until it reaches direct_scf_tol.  See
+            :func:`adapt_direct_scf_tol`.  Default is False.
+        direct_scf_tol_loose : float
+            The cutoff of the first cycles in the adaptive direct SCF.
+            Default is 1e-8.
+        direct_scf_rebuild_cycle : int
+            In the adaptive direct SCF, rebuild the HF potential with the
+            full density matrix every direct_scf_rebuild_cycle cycles.  0 to
+            rebuild only when the cutoff is tightened.  Default is 8.
+        mmap_eri : bool
+            If the 8-fold ERIs do not fit in max_memory, store them in a
+            memory-mapped scratch file instead of switching to direct SCF.
+            Default is False.
 
     Saved results
 
@@ -701,6 +843,11 @@ class SCF(object):
         self.level_shift_factor = 0
         self.direct_scf = True
         self.direct_scf_tol = 1e-13
+        self.direct_scf_link = False
+        self.direct_scf_adaptive = False
+        self.direct_scf_tol_loose = 1e-8
+        self.direct_scf_rebuild_cycle = 8
+        self.mmap_eri = False
 ##################################################
 # don't modify the following attributes, they are not input options
         self.mo_energy = None
@@ -710,6 +857,10 @@ class SCF(object):
         self.converged = False
 
         self.opt = None
+        self._chkwriter = None
+# cutoff of adaptive direct SCF and the (cycle, cutoff) of the last rebuild
+        self._direct_scf_tol = None
+        self._direct_scf_rebuild_at = None
 
         self._keys = set(self.__dict__.keys())
 
@@ -720,11 +871,11 @@ class SCF(object):
             mol = self.mol
         mol.check_sanity(self)
 
-        if not self._is_mem_enough() and self.direct_scf:
-            self.opt = _vhf.VHFOpt(mol, 'cint2e_sph', 'CVHFnrs8_prescreen',
-                                   'CVHFsetnr_direct_scf',
-                                   'CVHFsetnr_direct_scf_dm')
-            self.opt.direct_scf_tol = self.direct_scf_tol
+        if not self._is_mem_enough() and self.direct_scf and not self.mmap_eri:
+            self.opt = _vhf.get_vhfopt(mol, 'cint2e_sph', 'CVHFnrs8_prescreen',
+                                       'CVHFsetnr_direct_scf',
+                                       'CVHFsetnr_direct_scf_dm')
+            self.opt.direct_scf_tol = self.get_direct_scf_tol()
 
     def dump_flags(self):
         log.info(self, '\n')
@@ -741,6 +892,15 @@ class SCF(object):
         if self.direct_scf:
             log.info(self, 'direct_scf_tol = %g', \
                      self.direct_scf_tol)
+            if self.direct_scf_link:
+                log.info(self, 'direct_scf_link = %s', self.direct_scf_link)
+            if self.direct_scf_adaptive:
+                log.info(self, 'adaptive direct_scf_tol from %g, '
+                         'rebuild HF potential every %d cycles',
+                         self.direct_scf_tol_loose,
+                         self.direct_scf_rebuild_cycle)
+        if self.mmap_eri:
+            log.info(self, 'mmap_eri = %s', self.mmap_eri)
         if self.chkfile:
             log.info(self, 'chkfile to save SCF result = %s', self.chkfile)
 
@@ -797,9 +957,28 @@ class SCF(object):
             f = adiis.update(s1e, dm, f)
         return f
 
-    def dump_chk(self, *args):
-        if self.chkfile:
-            chkfile.dump_scf(self.mol, self.chkfile, *args)
+    def dump_chk(self, hf_energy, mo_energy, mo_coeff, mo_occ):
+        '''Save the SCF intermediates in chkfile.  In the SCF iterations of
+        :func:`kernel`, the data are written in background by
+        :class:`chkfile.AsyncWriter` and they are on disk after
+        :func:`close_chk`.  Otherwise, the data are written before return.
+        '''
+        if not self.chkfile:
+            return
+        if self._chkwriter is None:
+            chkfile.dump_scf(self.mol, self.chkfile,
+                             hf_energy, mo_energy, mo_coeff, mo_occ)
+        else:
+            writer = chkfile.get_writer(self, reset=('scf',),
+                                        defaults={'mol': format(self.mol.pack())})
+            writer.update({'scf/hf_energy': hf_energy,
+                           'scf/mo_energy': mo_energy,
+                           'scf/mo_occ'   : mo_occ,
+                           'scf/mo_coeff' : mo_coeff})
+
+    def close_chk(self):
+        '''Write the pending data of dump_chk and close the chkfile'''
+        chkfile.close_writer(self)
 
     def init_guess_by_minao(self, mol=None):
         if mol is None: mol = self.mol
@@ -928,16 +1107,34 @@ class SCF(object):
         #    self.analyze(self.verbose)
         return self.hf_energy
 
+    def get_direct_scf_tol(self):
+        '''The integral screening threshold of the present SCF cycle'''
+        if self._direct_scf_tol is None:
+            return self.direct_scf_tol
+        else:
+            return self._direct_scf_tol
+
     def get_jk(self, mol=None, dm=None, hermi=1):
         '''Compute J, K matrices for the given density matrix.  See :func:`scf.hf.get_jk`
         '''
         if mol is None: mol = self.mol
         if dm is None: dm = self.make_rdm1()
         t0 = (time.clock(), time.time())
-        vj, vk = get_jk(mol, dm, hermi, self.opt)
+        vj, vk = _get_jk_direct(self, mol, dm, hermi)
         log.timer(self, 'vj and vk', *t0)
         return vj, vk
 
+    def get_j(self, mol=None, dm=None, hermi=1):
+        '''Compute J matrix only, for the methods without exact exchange.
+        See :func:`scf.hf.get_jk`
+        '''
+        if mol is None: mol = self.mol
+        if dm is None: dm = self.make_rdm1()
+        t0 = (time.clock(), time.time())
+        vj = _get_jk_direct(self, mol, dm, hermi, with_k=False)[0]
+        log.timer(self, 'vj', *t0)
+        return vj
+
     def get_veff(self, mol=None, dm=None, dm_last=0, vhf_last=0, hermi=1):
         '''Hartree-Fock potential matrix for the given density matrix.
         See :func:`scf.hf.get_veff`
@@ -983,7 +1180,17 @@ class SCF(object):
 
     def _is_mem_enough(self):
         nbf = self.mol.nao_nr()
-        return nbf**4/1e6 < self.max_memory*.95
+        # 8-fold ERIs plus dm, vj, vk and the intermediates of dot_eri_dm
+        return _vhf.eri_mem_usage(nbf, 's8') + nbf**2*8*8/1e6 \
+                < self.max_memory*.95
+
+    def _init_mmap_eri(self, mol):
+        '''Store the 8-fold ERIs in a memory-mapped scratch file if they do
+        not fit in memory.  See the attribute mmap_eri'''
+        if self._eri is None and self.mmap_eri and not self._is_mem_enough():
+            self._eri_file = tempfile.NamedTemporaryFile()
+            self._eri = _vhf.int2e_sph_mmap(mol, self._eri_file.name)
+            log.debug(self, '8-fold ERIs are stored in %s', self._eri_file.name)
 
 
 ############
@@ -1020,15 +1227,20 @@ class RHF(SCF):
         if mol is None: mol = self.mol
         if dm is None: dm = self.make_rdm1()
         t0 = (time.clock(), time.time())
-        if self._eri is not None or self._is_mem_enough():
-            if self._eri is None:
-                self._eri = _vhf.int2e_sph(mol._atm, mol._bas, mol._env)
-            vj, vk = dot_eri_dm(self._eri, dm, hermi)
-        else:
-            vj, vk = get_jk(mol, dm, hermi, self.opt)
+        vj, vk = _get_jk(self, mol, dm, hermi)
         log.timer(self, 'vj and vk', *t0)
         return vj, vk
 
+    def get_j(self, mol=None, dm=None, hermi=1):
+        '''J matrix only.  See :func:`scf.hf.get_jk`
+        '''
+        if mol is None: mol = self.mol
+        if dm is None: dm = self.make_rdm1()
+        t0 = (time.clock(), time.time())
+        vj = _get_jk(self, mol, dm, hermi, with_k=False)[0]
+        log.timer(self, 'vj', *t0)
+        return vj
+
     def get_veff(self, mol=None, dm=None, dm_last=0, vhf_last=0, hermi=1):
         '''Hartree-Fock potential matrix for the given density matrix.
         See :func:`scf.hf.get_veff`
@@ -0,0 +1,93 @@
+#
+# Author: Qiming Sun <osirpt.sun@gmail.com>
+#
+
+import numpy
+import unittest
+from pyscf import gto
+from pyscf import scf
+from pyscf import dft
+from pyscf.scf import cosx
+
+mol = gto.M(
+    verbose = 5,
+    output = '/dev/null',
+    atom = '''
+        O     0    0        0
+        H     0    -0.757   0.587
+        H     0    0.757    0.587''',
+    basis = '631g',
+)
+
+mf0 = scf.RHF(mol)
+mf0.conv_tol = 1e-10
+ehf = mf0.scf()
+
+
+class KnowValues(unittest.TestCase):
+    def test_fake_mol(self):
+        coords = numpy.array([[0., 0., .5], [.3, .2, .1]])
+        vg = cosx.grid_e1(mol, coords)
+        for i, c in enumerate(coords):
+            mol.set_rinv_origin_(c)
+            v = mol.intor('cint1e_rinv_sph')
+            self.assertTrue(numpy.allclose(vg[:,:,i], v, atol=1e-8))
+        mol.set_rinv_origin_((0,0,0))
+
+    def test_get_k(self):
+        dm = mf0.make_rdm1()
+        vk0 = mf0.get_jk(mol, dm)[1]
+        grids = dft.gen_grid.Grids(mol)
+        grids.level = 3
+        mf = cosx.cosx(scf.RHF(mol), grids)
+        vk1 = mf.get_jk(mol, dm)[1]
+        self.assertTrue(numpy.allclose(vk0, vk1, atol=1e-2))
+        vk1 = mf.get_jk(mol, (dm,dm))[1]
+        self.assertEqual(vk1.shape, (2,)+dm.shape)
+
+    def test_get_k_ref(self):
+# K on a subset of the grids, against the quadrature of the analytic
+# potential integrals A_ij(g) = (ij|1/|r-g|)
+        grids = dft.gen_grid.Grids(mol)
+        grids.level = 1
+        grids.setup_grids()
+        grids.coords = grids.coords[::40].copy()
+        grids.weights = grids.weights[::40].copy()
+        numpy.random.seed(1)
+        nao = mol.nao_nr()
+        dm = numpy.random.random((nao,nao))
+        dm = dm + dm.T
+        ao = dft.numint.eval_ao(mol, grids.coords)[0]
+        vkref = numpy.zeros((nao,nao))
+        for g, c in enumerate(grids.coords):
+            mol.set_rinv_origin_(c)
+            v = mol.intor('cint1e_rinv_sph')
+            vkref += numpy.einsum('ij,jk,k,l->il', v, dm, ao[g], ao[g]) * \
+                    grids.weights[g]
+        mol.set_rinv_origin_((0,0,0))
+        vkref = (vkref + vkref.T) * .5
+        mf = cosx.cosx(scf.RHF(mol), grids)
+        cosx.SCREEN_TOL, tol0 = 0, cosx.SCREEN_TOL
+        try:
+            vk = mf.get_jk(mol, dm)[1]
+        finally:
+            cosx.SCREEN_TOL = tol0
+        self.assertAlmostEqual(abs(vk-vkref).max(), 0, 8)
+
+    def test_rhf_uhf(self):
+        mf = scf.cosx(scf.RHF(mol))
+        mf.cosx_grids.level = 3
+        mf.conv_tol = 1e-11
+        e_rhf = mf.scf()
+# The grid error of COSX is ~1e-4 Hartree at level 3
+        self.assertAlmostEqual(e_rhf, ehf, 3)
+
+        mf = scf.cosx_(scf.UHF(mol))
+        mf.cosx_grids.level = 3
+        mf.conv_tol = 1e-11
+        self.assertAlmostEqual(mf.scf(), e_rhf, 7)
+
+
+if __name__ == "__main__":
+    print("Full Tests for seminumerical exchange")
+    unittest.main()
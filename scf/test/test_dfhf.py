@@ -39,6 +39,58 @@ class KnowValues(unittest.TestCase):
         mf = scf.density_fit(scf.UHF(mol))
         self.assertAlmostEqual(mf.scf(), -76.025936299702536, 9)
 
+    def test_get_j(self):
+        mf = scf.density_fit(scf.RHF(mol))
+        numpy.random.seed(1)
+        nao = mol.nao_nr()
+        dm = numpy.random.random((2,nao,nao))
+        vj0, vk0 = mf.get_jk(mol, dm, hermi=0)
+        vj1 = mf.get_j(mol, dm, hermi=0)
+        self.assertTrue(numpy.allclose(vj0, vj1))
+        dm = dm[0] + dm[0].T
+        vj0, vk0 = mf.get_jk(mol, dm, hermi=1)
+        vj1 = mf.get_j(mol, dm, hermi=1)
+        self.assertTrue(numpy.allclose(vj0, vj1))
+
+    def test_get_jk_batch(self):
+        mf = scf.density_fit(scf.RHF(mol))
+        numpy.random.seed(1)
+        nao = mol.nao_nr()
+        dm = numpy.random.random((5,nao,nao))
+        for hermi in (0, 1):
+            if hermi == 1:
+                dm = dm + dm.transpose(0,2,1)
+            vj1, vk1 = mf.get_jk(mol, dm, hermi=hermi)
+            for i in range(len(dm)):
+                vj0, vk0 = mf.get_jk(mol, dm[i], hermi=hermi)
+                self.assertTrue(numpy.allclose(vj0, vj1[i]))
+                self.assertTrue(numpy.allclose(vk0, vk1[i]))
+        mf.max_memory = 1e-3  # one density per batch
+        vj2, vk2 = mf.get_jk(mol, dm, hermi=1)
+        self.assertTrue(numpy.allclose(vj2, vj1))
+        self.assertTrue(numpy.allclose(vk2, vk1))
+
+    def test_cderi_cache_evicted(self):
+        import os, shutil, tempfile
+        cachedir = tempfile.mkdtemp()
+        lib.parameters.INTCACHE_DIR = cachedir
+        try:
+            mf = scf.density_fit(scf.RHF(mol))
+            mf.max_memory = 1e-3  # the integrals are cached in file
+            numpy.random.seed(1)
+            dm = numpy.random.random((mol.nao_nr(),)*2)
+            dm = dm + dm.T
+            vj0, vk0 = mf.get_jk(mol, dm)
+            self.assertTrue(mf._cderi.startswith(cachedir))
+            for f in os.listdir(cachedir):
+                os.remove(os.path.join(cachedir, f))
+            vj1, vk1 = mf.get_jk(mol, dm)
+            self.assertTrue(numpy.allclose(vj0, vj1))
+            self.assertTrue(numpy.allclose(vk0, vk1))
+        finally:
+            lib.parameters.INTCACHE_DIR = None
+            shutil.rmtree(cachedir)
+
     def test_rohf(self):
         pmol = mol.copy()
         pmol.charge = 1
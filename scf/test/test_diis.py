@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+import unittest
+import numpy
+from pyscf import scf
+
+class Dev:
+    verbose = 0
+    stdout = None
+
+def diis_ref(xs, space):
+    xs = xs[-space:]
+    errs = [xs[i+1]-xs[i] for i in range(len(xs)-1)]
+    nd = len(errs)
+    H = numpy.ones((nd+1,nd+1))
+    H[0,0] = 0
+    for i in range(nd):
+        for j in range(nd):
+            H[i+1,j+1] = numpy.dot(errs[i], errs[j])
+    G = numpy.zeros(nd+1)
+    G[0] = 1
+    c = numpy.linalg.solve(H, G)
+    return numpy.einsum('i,ij->j', c[1:], xs[1:])
+
+class KnowValues(unittest.TestCase):
+    def test_diis(self):
+        numpy.random.seed(1)
+        adiis = scf.diis.DIIS(Dev())
+        adiis.space = 4
+        xs = []
+        for k in range(10):
+            xs.append(numpy.random.random(12))
+            x = adiis.update(xs[-1])
+            if k > 1:
+                self.assertTrue(numpy.allclose(x, diis_ref(xs, 4)))
+        self.assertEqual(adiis._err_ovlp.shape, (3,3))
+
+    def test_diis_large(self):
+        numpy.random.seed(1)
+        adiis = scf.diis.DIISLarge(Dev())
+        adiis.space = 4
+        xs = []
+        for k in range(10):
+            xs.append(numpy.random.random(12))
+            x = adiis.update(xs[-1])
+            if k > 1:
+                self.assertTrue(numpy.allclose(x, diis_ref(xs, 4)))
+
+
+if __name__ == "__main__":
+    print("Full Tests for DIIS")
+    unittest.main()
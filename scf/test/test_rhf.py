@@ -2,6 +2,7 @@
 # Author: Qiming Sun <osirpt.sun@gmail.com>
 #
 
+import os
 import numpy
 import unittest
 from pyscf import gto
@@ -60,6 +61,20 @@ class KnowValues(unittest.TestCase):
     def test_scf(self):
         self.assertAlmostEqual(mf.hf_energy, -76.026765673119627, 9)
 
+    def test_adaptive_direct_scf(self):
+        mf1 = scf.RHF(mol)
+        mf1.max_memory = 0
+        mf1.direct_scf_adaptive = True
+        mf1.direct_scf_rebuild_cycle = 4
+        self.assertAlmostEqual(mf1.scf(), -76.026765673119627, 9)
+        self.assertTrue(mf1.get_direct_scf_tol() == mf1.direct_scf_tol)
+
+    def test_chkfile(self):
+        mo_coeff = scf.chkfile.load(mf.chkfile, 'scf/mo_coeff')
+        self.assertTrue(numpy.allclose(mo_coeff, mf.mo_coeff))
+        e = scf.chkfile.load(mf.chkfile, 'scf/hf_energy')
+        self.assertAlmostEqual(e, mf.hf_energy, 12)
+
     def test_nr_rohf(self):
         pmol = mol.copy()
         pmol.charge = 1
@@ -140,6 +155,63 @@ class KnowValues(unittest.TestCase):
         j1, k1 = scf.hf.dot_eri_dm(mf._eri, dm, hermi=0)
         self.assertAlmostEqual(numpy.linalg.norm(j1), 48.395346241533758, 0)
         self.assertAlmostEqual(numpy.linalg.norm(k1), 26.760108454035048, 0)
+    def test_mmap_eri(self):
+        mf1 = scf.RHF(mol)
+        mf1.max_memory = .3  # 8-fold ERIs of H2O/cc-pVDZ take ~.4 MB
+        mf1.mmap_eri = True
+        self.assertAlmostEqual(mf1.scf(), -76.026765673119627, 9)
+        self.assertTrue(isinstance(mf1._eri, numpy.memmap))
+
+        numpy.random.seed(1)
+        nao = mol.nao_nr()
+        dm = numpy.random.random((nao,nao))
+        j0, k0 = scf.hf.dot_eri_dm(mf._eri, dm, hermi=0)
+        j1, k1 = scf.hf.dot_eri_dm(mf1._eri, dm, hermi=0)
+        self.assertTrue(numpy.allclose(j0,j1))
+        self.assertTrue(numpy.allclose(k0,k1))
+
+    def test_eri_cache(self):
+        import tempfile, shutil
+        from pyscf import lib
+        cachedir = tempfile.mkdtemp()
+        lib.parameters.INTCACHE_DIR = cachedir
+        int2e_sph = scf._vhf.int2e_sph
+        ncall = []
+        def count_int2e_sph(*args):
+            ncall.append(1)
+            return int2e_sph(*args)
+        scf._vhf.int2e_sph = count_int2e_sph
+        try:
+            mf1 = scf.RHF(mol)
+            self.assertAlmostEqual(mf1.scf(), -76.026765673119627, 9)
+            self.assertEqual(len(ncall), 1)
+            mf1 = scf.RHF(mol)
+            self.assertAlmostEqual(mf1.scf(), -76.026765673119627, 9)
+            self.assertEqual(len(ncall), 1)
+            self.assertEqual(len(os.listdir(cachedir)), 1)
+        finally:
+            scf._vhf.int2e_sph = int2e_sph
+            lib.parameters.INTCACHE_DIR = None
+            shutil.rmtree(cachedir)
+
+    def test_intcache_evict(self):
+        import tempfile, shutil
+        from pyscf import lib
+        cachedir = tempfile.mkdtemp()
+        try:
+            cache = lib.intcache.IntCache(cachedir, max_size=1e-3)
+            cache.save('a', numpy.zeros(60))
+            ftmp = tempfile.NamedTemporaryFile(dir=cachedir,
+                                               prefix=lib.intcache.TMP_PREFIX)
+            ftmp.write(b'0' * 600)
+            ftmp.flush()
+            cache.save('b', numpy.zeros(60))
+            self.assertTrue(cache.load('a') is None)
+            self.assertTrue(cache.load('b') is not None)
+            self.assertTrue(os.path.isfile(ftmp.name))
+            ftmp.close()
+        finally:
+            shutil.rmtree(cachedir)
 
 if __name__ == "__main__":
     print("Full Tests for rhf")
@@ -34,6 +34,52 @@ class KnowValues(unittest.TestCase):
         self.assertTrue(numpy.allclose(vj0,vj1))
         self.assertTrue(numpy.allclose(vk0,vk1))
 
+    def test_vhfopt_cache(self):
+        mol1 = mol.copy()
+        opt1 = _vhf.get_vhfopt(mol1, 'cint2e_sph', 'CVHFnrs8_prescreen',
+                               'CVHFsetnr_direct_scf', 'CVHFsetnr_direct_scf_dm')
+        opt2 = _vhf.get_vhfopt(mol1, 'cint2e_sph', 'CVHFnrs8_prescreen',
+                               'CVHFsetnr_direct_scf', 'CVHFsetnr_direct_scf_dm')
+        self.assertTrue(opt1 is opt2)
+        self.assertTrue(_vhf.get_vhfopt(mol1, 'cint2e_sph') is not opt1)
+
+        mol1._env[mol1._atm[0,gto.PTR_COORD]] += .1
+        opt3 = _vhf.get_vhfopt(mol1, 'cint2e_sph', 'CVHFnrs8_prescreen',
+                               'CVHFsetnr_direct_scf', 'CVHFsetnr_direct_scf_dm')
+        self.assertTrue(opt3 is not opt1)
+
+        dm = mf.make_rdm1()
+        vj0, vk0 = _vhf.direct(dm, mol._atm, mol._bas, mol._env)
+        vj1, vk1 = scf.hf.get_jk(mol, dm, hermi=1)
+        self.assertTrue(numpy.allclose(vj0,vj1))
+        self.assertTrue(numpy.allclose(vk0,vk1))
+
+    def test_j_only(self):
+        numpy.random.seed(1)
+        dm = numpy.random.random((nao,nao))
+        vj0, vk0 = _vhf.incore(mf._eri, dm, hermi=0)
+        vj1, vk1 = _vhf.incore(mf._eri, dm, hermi=0, with_k=False)
+        self.assertTrue(vk1 is None)
+        self.assertTrue(numpy.allclose(vj0,vj1))
+        vj1, vk1 = _vhf.direct(dm, mol._atm, mol._bas, mol._env, with_k=False)
+        self.assertTrue(vk1 is None)
+        self.assertTrue(numpy.allclose(vj0,vj1))
+        vj1 = mf.get_j(mol, (dm,dm), hermi=0)
+        self.assertTrue(numpy.allclose(vj0,vj1[1]))
+
+    def test_direct_link(self):
+        dm = mf.make_rdm1()
+        vhfopt = _vhf.VHFOpt(mol, 'cint2e_sph', 'CVHFnrs8_prescreen',
+                             'CVHFsetnr_direct_scf', 'CVHFsetnr_direct_scf_dm')
+        vhfopt.direct_scf_tol = 1e-13
+        vj0, vk0 = scf.hf.get_jk(mol, dm, hermi=1)
+        vj1, vk1 = scf.hf.get_jk(mol, dm, hermi=1, vhfopt=vhfopt, with_j=False)
+        self.assertTrue(vj1 is None)
+        self.assertTrue(numpy.allclose(vk0,vk1))
+        vj1, vk1 = scf.hf.get_jk_link(mol, dm, hermi=1, vhfopt=vhfopt)
+        self.assertTrue(numpy.allclose(vj0,vj1))
+        self.assertTrue(numpy.allclose(vk0,vk1))
+
     def test_direct_mapdm(self):
         numpy.random.seed(1)
         dm = numpy.random.random((nao,nao))
@@ -473,15 +473,18 @@ class UHF(hf.SCF):
         if mol is None: mol = self.mol
         if dm is None: dm = self.make_rdm1()
         t0 = (time.clock(), time.time())
-        if self._is_mem_enough() or self._eri is not None:
-            if self._eri is None:
-                self._eri = _vhf.int2e_sph(mol._atm, mol._bas, mol._env)
-            vj, vk = hf.dot_eri_dm(self._eri, dm, hermi)
-        else:
-            vj, vk = hf.get_jk(mol, dm, hermi, self.opt)
+        vj, vk = hf._get_jk(self, mol, dm, hermi)
         log.timer(self, 'vj and vk', *t0)
         return vj, vk
 
+    def get_j(self, mol=None, dm=None, hermi=1):
+        if mol is None: mol = self.mol
+        if dm is None: dm = self.make_rdm1()
+        t0 = (time.clock(), time.time())
+        vj = hf._get_jk(self, mol, dm, hermi, with_k=False)[0]
+        log.timer(self, 'vj', *t0)
+        return vj
+
     def get_veff(self, mol=None, dm=None, dm_last=0, vhf_last=0, hermi=1):
         '''Hartree-Fock potential matrix for the given density matrices.
         See :func:`scf.uhf.get_veff`
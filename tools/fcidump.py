@@ -46,6 +46,19 @@ def write_eri(fout, eri, nmo, tol=1e-15):
                         kl += 1
                 ij += 1
 
+# 8-fold symmetry, the integrals are the row blocks (row0, row1, eri[row0:row1])
+# of the 4-fold symmetric (ij|kl), e.g. generated by ao2mo.outcore.general_iter
+def write_eri_blocks(fout, blocks, nmo, tol=1e-15):
+    idx, idy = numpy.tril_indices(nmo)
+    for row0, row1, eri in blocks:
+        for ij in range(row0, row1):
+            i, j = idx[ij], idy[ij]
+            row = eri[ij-row0]
+            for kl in range(ij+1):
+                if abs(row[kl]) > tol:
+                    fout.write(' %.16g %4d %4d %4d %4d\n' \
+                               % (row[kl], i+1, j+1, idx[kl]+1, idy[kl]+1))
+
 def write_hcore(fout, h, nmo, tol=1e-15):
     h = h.reshape(nmo,nmo)
     for i in range(nmo):
@@ -69,8 +82,9 @@ def from_chkfile(output, chkfile, tol=1e-15):
         else:
             write_head(fout, nmo, mol.nelectron, mol.spin)
 
-        eri = pyscf.ao2mo.outcore.full_iofree(mol, mo_coeff, verbose=0)
-        write_eri(fout, pyscf.ao2mo.restore(8, eri, nmo), nmo, tol=tol)
+        blocks = pyscf.ao2mo.outcore.general_iter(mol, (mo_coeff,)*4,
+                                                  verbose=0)
+        write_eri_blocks(fout, blocks, nmo, tol=tol)
 
         t = mol.intor_symmetric('cint1e_kin_sph')
         v = mol.intor_symmetric('cint1e_nuc_sph')